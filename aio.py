@@ -0,0 +1,251 @@
+"""
+asyncio front end. Encoding, masking and rendering are CPU bound and block the event loop for tens of milliseconds
+on large versions, so the coroutines here run them in an executor and only await the results. A semaphore caps the
+number of symbols in flight, which pushes back on producers once the executor is saturated, and files are written
+from a thread.
+
+    qr = await async_make("https://example.com", "M")
+    await async_save(qr, "example.png", ecc="M")
+
+Cancelling a coroutine cancels its executor job when it hasn't started yet. A job already running finishes in the
+background and its result is dropped. Its semaphore slot is only released once the job finished, so the number of
+jobs in the executor never exceeds the limit.
+"""
+
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    BinaryIO,
+    Deque,
+    Iterable,
+    Optional,
+    Tuple,
+)
+from weakref import WeakKeyDictionary
+
+from qr import QrCode, make, render_bytes
+
+
+class AsyncQrMaker:
+    """
+    Runs `make` and the renderers in an executor with bounded concurrency. One instance can be shared by every
+    event loop of the process, each loop gets its own semaphore.
+
+    :param executor: Thread or process executor for the CPU work, a thread pool owned by the maker when omitted
+    :param limit: Maximum number of symbols being made or rendered at once
+    """
+
+    def __init__(
+        self, executor: Optional[Executor] = None, limit: Optional[int] = None
+    ):
+        self.executor = executor
+        self.limit = limit or os.cpu_count() or 1
+        self._semaphores: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = WeakKeyDictionary()
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(thread_name_prefix="qrcodey")
+        return self.executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+        # released when the job finished or was cancelled before it started, not when the awaiting task is cancelled
+        future.add_done_callback(lambda _: _release(loop, semaphore))
+        return await asyncio.wrap_future(future)
+
+    async def make(self, data: str, ecc: str = "H") -> QrCode:
+        """
+        :param data: The data to be encoded
+        :param ecc: Error Correction Code
+        :return: The QR code
+        """
+        return await self._run(make, data, ecc)
+
+    async def render(
+        self,
+        qr: QrCode,
+        suffix: str = ".png",
+        scale=10,
+        bg_color=(255, 255, 255),
+        data_color=(0, 0, 0),
+        ecc: str = "H",
+        border: int = 4,
+        compress_level: int = 6,
+    ) -> bytes:
+        """
+        Mask and render a QR code in the executor.
+
+        :return: Encoded file contents, see `render_bytes`
+        """
+        return await self._run(
+            _render_qr,
+            qr,
+            suffix,
+            scale,
+            bg_color,
+            data_color,
+            ecc,
+            border,
+            compress_level,
+        )
+
+    async def save(
+        self,
+        qr: QrCode,
+        path: Path | str | BinaryIO,
+        scale=10,
+        bg_color=(255, 255, 255),
+        data_color=(0, 0, 0),
+        ecc: str = "H",
+        border: int = 4,
+        compress_level: int = 6,
+        image_format: str = ".png",
+    ):
+        """
+        Async counterpart of `QrCode.save`. The file is only written once rendering completed, so a cancelled save
+        leaves no partial output behind.
+
+        :param path: Path or binary file object, the format is inferred from the suffix of paths
+        :param image_format: Suffix of the format used for file objects
+        """
+        suffix = Path(path).suffix if isinstance(path, (str, Path)) else image_format
+        contents = await self.render(
+            qr, suffix, scale, bg_color, data_color, ecc, border, compress_level
+        )
+        await asyncio.to_thread(_write, path, contents)
+
+    async def make_many(
+        self,
+        items: Iterable[str | Tuple[str, str]] | AsyncIterable[str | Tuple[str, str]],
+        ecc: str = "H",
+        with_index: bool = False,
+    ) -> AsyncIterator["QrCode | Tuple[int, QrCode]"]:
+        """
+        Make a QR code for every item, yielding them in input order. At most `limit` items are in flight, the input
+        is only read further as results are consumed. Closing the generator cancels the items in flight.
+
+        :param items: Data to encode, or (data, ecc) tuples, from a plain or an async iterable
+        :param ecc: Error Correction Code used for plain data items
+        :param with_index: Yield (index, qr) tuples instead of just the QR codes
+        :return: Async generator of QR codes in input order
+        """
+        pending: Deque[Tuple[int, asyncio.Future]] = deque()
+        try:
+            index = 0
+            async for item in _aiter(items):
+                data, item_ecc = item if isinstance(item, tuple) else (item, ecc)
+                pending.append(
+                    (index, asyncio.ensure_future(self.make(data, item_ecc)))
+                )
+                index += 1
+                if len(pending) >= self.limit:
+                    done, future = pending.popleft()
+                    qr = await future
+                    yield (done, qr) if with_index else qr
+
+            while pending:
+                done, future = pending.popleft()
+                qr = await future
+                yield (done, qr) if with_index else qr
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def _render_qr(
+    qr: QrCode, suffix, scale, bg_color, data_color, ecc, border, compress_level
+) -> bytes:
+    dark = qr._generate_best_fit_array(ecc) == QrCode.BLACK_MODULE
+    return render_bytes(
+        dark, suffix, scale, bg_color, data_color, border, compress_level
+    )
+
+
+def _release(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore):
+    # done callbacks run in the worker thread, the loop may be gone by then
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        pass
+
+
+def _write(path: Path | str | BinaryIO, contents: bytes):
+    if isinstance(path, (str, Path)):
+        with open(path, "wb") as fp:
+            fp.write(contents)
+    else:
+        path.write(contents)
+
+
+async def _aiter(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+_default_maker = AsyncQrMaker()
+
+
+async def async_make(data: str, ecc: str = "H", maker: Optional[AsyncQrMaker] = None):
+    """
+    :param data: The data to be encoded
+    :param ecc: Error Correction Code
+    :param maker: Executor and concurrency limit to use, a process wide default when omitted
+    :return: The QR code
+    """
+    return await (maker or _default_maker).make(data, ecc)
+
+
+async def async_save(
+    qr: QrCode,
+    path: Path | str | BinaryIO,
+    scale=10,
+    bg_color=(255, 255, 255),
+    data_color=(0, 0, 0),
+    ecc: str = "H",
+    border: int = 4,
+    compress_level: int = 6,
+    maker: Optional[AsyncQrMaker] = None,
+):
+    """
+    See `AsyncQrMaker.save`.
+    """
+    await (maker or _default_maker).save(
+        qr, path, scale, bg_color, data_color, ecc, border, compress_level
+    )
+
+
+def async_make_many(
+    items: Iterable[str | Tuple[str, str]] | AsyncIterable[str | Tuple[str, str]],
+    ecc: str = "H",
+    with_index: bool = False,
+    maker: Optional[AsyncQrMaker] = None,
+) -> AsyncIterator["QrCode | Tuple[int, QrCode]"]:
+    """
+    See `AsyncQrMaker.make_many`.
+    """
+    return (maker or _default_maker).make_many(items, ecc, with_index)
@@ -0,0 +1,162 @@
+"""
+Batch engine for payloads which all land on the same version and error correction level. Every stage works on a
+leading batch axis: the codewords form an (N, codewords) array, Reed-Solomon runs over all rows at once, the bits
+are placed into an (N, size, size) stack through the shared placement index, and the eight masks are applied and
+scored along the batch axis. The result matches calling `make` one payload at a time.
+"""
+
+from functools import cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from const import REMAINING_BITS
+from encoder import DataEncoder
+from plan import EncodePlan
+from qr import (
+    MaskEngine,
+    PatternTemplates,
+    PenaltyEvaluator,
+    PlacementIndex,
+    QrCode,
+)
+
+
+class MixedVersionBatch(Exception):
+    """
+    Raised when the payloads of a batch do not all land on the same version.
+    """
+
+    pass
+
+
+def get_batch_plans(payloads: Sequence[str], ecc: str) -> List[EncodePlan]:
+    """
+    :param payloads: Data to be encoded
+    :param ecc: Error Correction Code
+    :return: The plan of every payload, all sharing the same version
+    """
+    if not payloads:
+        raise ValueError("no payloads")
+    plans = [EncodePlan.create(data, ecc) for data in payloads]
+    versions = {plan.version for plan in plans}
+    if len(versions) != 1:
+        raise MixedVersionBatch(sorted(versions))
+    return plans
+
+
+def get_batch_version(payloads: Sequence[str], ecc: str) -> int:
+    """
+    :param payloads: Data to be encoded
+    :param ecc: Error Correction Code
+    :return: The version shared by every payload
+    """
+    return get_batch_plans(payloads, ecc)[0].version
+
+
+def encode_data_batch(
+    payloads: Sequence[str], ecc: str = "H", plans: Optional[List[EncodePlan]] = None
+) -> Tuple[int, np.ndarray]:
+    """
+    Encode the data codewords of every payload, then add the error correction codewords of all blocks of all rows in
+    one pass and interleave them.
+
+    :param payloads: Data to be encoded, all landing on the same version
+    :param ecc: Error Correction Code
+    :param plans: Plans of the payloads from `get_batch_plans`, created when omitted
+    :return: The version and an (N, total codewords) uint8 array
+    """
+    if not payloads:
+        raise ValueError("no payloads")
+    if plans is None:
+        plans = get_batch_plans(payloads, ecc)
+    data = b"".join(DataEncoder.encode_plan(plan).to_bytes() for plan in plans)
+    data = np.frombuffer(data, dtype=np.uint8).reshape(len(payloads), -1)
+    return plans[0].version, plans[0].layout.encode(data)
+
+
+def place_codewords(codewords: np.ndarray, version: int) -> np.ndarray:
+    """
+    Place the codewords of every row, followed by the remainder bits, into a stack of template copies.
+
+    :param codewords: (N, codewords) uint8 array from `encode_data_batch`
+    :param version: QR code version
+    :return: (N, size, size) uint8 stack of unmasked matrices
+    """
+    bits = np.unpackbits(codewords, axis=1)
+    bits = np.pad(bits, ((0, 0), (0, REMAINING_BITS[version])))
+    rows, cols = PlacementIndex.get(version)
+    count = min(bits.shape[1], len(rows))
+
+    template, _ = PatternTemplates.get(version)
+    stack = np.repeat(template[np.newaxis], len(codewords), axis=0)
+    stack[:, rows[:count], cols[:count]] = np.where(
+        bits[:, :count], QrCode.BLACK_MODULE, QrCode.WHITE_MODULE
+    )
+    return stack
+
+
+@cache
+def get_format_modules(version: int, ecc: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The format string occupies the same modules for every mask, only the values differ.
+
+    :param version: QR code version
+    :param ecc: Error Correction Code
+    :return: (size, size) boolean mask of the format modules and an (8, K) array of their values per mask
+    """
+    qr = QrCode("", version=version)
+    empty = np.full((qr.get_module_size(),) * 2, QrCode.EMPTY_MODULE, dtype=np.uint8)
+
+    layers = [qr.add_format_string(empty.copy(), ecc, i) for i in range(8)]
+    positions = layers[0] != QrCode.EMPTY_MODULE
+    values = np.stack([layer[positions] for layer in layers])
+    positions.setflags(write=False)
+    values.setflags(write=False)
+    return positions, values
+
+
+def apply_best_masks(stack: np.ndarray, version: int, ecc: str) -> np.ndarray:
+    """
+    Score all eight masks for every matrix of the stack and apply the best one together with its format string.
+
+    :param stack: (N, size, size) uint8 stack of unmasked matrices
+    :param version: QR code version
+    :param ecc: Error Correction Code
+    :return: New (N, size, size) uint8 stack of masked matrices
+    """
+    flips = MaskEngine.get_masks(version)
+    filled = stack != QrCode.EMPTY_MODULE
+    positions, values = get_format_modules(version, ecc)
+    evaluator = PenaltyEvaluator()
+
+    scores = np.empty((len(stack), 8), dtype=np.int64)
+    for pattern_id in range(8):
+        candidates = stack ^ (
+            (flips[pattern_id] & filled).view(np.uint8) << MaskEngine.FLIP_BIT
+        )
+        candidates[:, positions] = values[pattern_id]
+        scores[:, pattern_id] = evaluator.evaluate_many(candidates)
+
+    # argmin keeps the lowest pattern id on ties, same as `QrCode.find_best_mask`
+    best = np.argmin(scores, axis=1)
+    masked = stack ^ ((flips[best] & filled).view(np.uint8) << MaskEngine.FLIP_BIT)
+    masked[:, positions] = values[best]
+    return masked
+
+
+def make_batch(
+    payloads: Sequence[str], ecc: str = "H", plans: Optional[List[EncodePlan]] = None
+) -> np.ndarray:
+    """
+    Batch counterpart of `make` followed by `QrCode._generate_best_fit_array`. Memory grows linearly with the
+    number of payloads, so split very large jobs into batches of a few hundred.
+
+    :param payloads: Data to be encoded, all landing on the same version
+    :param ecc: Error Correction Code
+    :param plans: Plans of the payloads, all sharing one version, created when omitted
+    :return: (N, size, size) uint8 stack of final matrices
+    """
+    version, codewords = encode_data_batch(payloads, ecc, plans)
+    stack = place_codewords(codewords, version)
+    return apply_best_masks(stack, version, ecc)
@@ -0,0 +1,316 @@
+"""
+Per-stage benchmarks, so a regression can be pinned on encoding, Reed-Solomon, placement, mask search or rendering.
+
+    python bench.py --output bench_baseline.json
+    python bench.py --baseline bench_baseline.json --threshold 0.2
+
+Every stage is timed separately for payloads which fill representative versions at every error correction level.
+The caches are warmed first, so the numbers are steady state. `save` renders a PNG file and includes the mask
+search it runs itself. A stage is called until it ran for `--min-time` seconds and the fastest call is reported,
+which is the figure least disturbed by other load on the machine.
+
+`IncrementalEncoder.encode` recomputes the error correction codewords of every block after the last
+`CHANGED_CODEWORDS` data codewords changed, as for serial numbers on a fixed template. Compare it with
+`GeneratorPolynomial.divide`, which divides the same blocks in full.
+
+With `--baseline` every stage is compared to the same stage, version and error correction level of an earlier run,
+and the script exits with status 1 when one got slower by more than `--threshold`. Baselines are specific to a
+machine and Python build, record one before a change and compare after it.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from blocks import BlockLayout
+from const import LIBRARY_VERSION, Mode
+from encoder import DataEncoder
+from plan import EncodePlan
+from polynomial import GeneratorPolynomial, IncrementalEncoder
+from qr import QrCode, encode_data_bits, warm_caches
+from util import capacity
+
+VERSIONS = (1, 2, 5, 7, 10, 15, 20, 27, 30, 35, 40)
+ECC_LEVELS = ("L", "M", "Q", "H")
+STAGES = (
+    "DataEncoder.encode",
+    "GeneratorPolynomial.divide",
+    "IncrementalEncoder.encode",
+    "add_static_patterns",
+    "add_encoded_data",
+    "find_best_mask",
+    "save",
+)
+# byte mode text, the lower case letters keep the segmenter from switching modes
+PAYLOAD_TEXT = "qrcodey benchmark payload, "
+CHANGED_CODEWORDS = 3
+
+
+class BenchResult(NamedTuple):
+    stage: str
+    version: int
+    ecc: str
+    calls: int
+    min_us: float
+    median_us: float
+
+
+class Regression(NamedTuple):
+    stage: str
+    version: int
+    ecc: str
+    baseline_us: float
+    current_us: float
+    ratio: float
+
+
+def get_payload(version: int, ecc: str) -> str:
+    """
+    :param version: QR code version
+    :param ecc: Error Correction Code
+    :return: Byte mode payload filling the version to capacity
+    """
+    length = capacity(version, ecc, Mode.BYTE)
+    payload = (PAYLOAD_TEXT * (length // len(PAYLOAD_TEXT) + 1))[:length]
+    chosen = EncodePlan.create(payload, ecc).version
+    if chosen != version:
+        raise ValueError(f"payload for {version}-{ecc} lands on version {chosen}")
+    return payload
+
+
+def time_calls(
+    func: Callable[[object], object],
+    setup: Callable[[], object] = lambda: None,
+    min_time: float = 0.2,
+    min_calls: int = 3,
+) -> Tuple[int, float, float]:
+    """
+    :param func: Stage to time, called with the result of `setup`
+    :param setup: Untimed preparation run before every call
+    :param min_time: Seconds spent in `func` before stopping
+    :param min_calls: Minimum number of calls
+    :return: Number of calls, fastest and median call in microseconds
+    """
+    timings: List[float] = []
+    total = 0.0
+    while total < min_time or len(timings) < min_calls:
+        state = setup()
+        start = time.perf_counter()
+        func(state)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+    return len(timings), min(timings) * 1e6, statistics.median(timings) * 1e6
+
+
+def get_stages(
+    version: int, ecc: str, directory: Path
+) -> Dict[str, Tuple[Callable, Callable]]:
+    """
+    :param version: QR code version
+    :param ecc: Error Correction Code
+    :param directory: Scratch directory for `save`
+    :return: (func, setup) of every stage
+    """
+    data = get_payload(version, ecc)
+    plan = EncodePlan.create(data, ecc)
+    layout = BlockLayout.get(version, ecc)
+    bits = encode_data_bits(data, ecc, plan)
+
+    codewords = DataEncoder.encode_plan(plan).to_bytes()
+    blocks = []
+    start = 0
+    for size in layout.block_sizes:
+        blocks.append(codewords[start : start + size])
+        start += size
+    generator = GeneratorPolynomial(layout.ec_codewords_per_block)
+    encoders = [
+        IncrementalEncoder(layout.ec_codewords_per_block, block) for block in blocks
+    ]
+    changed = [
+        block[:-CHANGED_CODEWORDS]
+        + bytes(term ^ 0xFF for term in block[-CHANGED_CODEWORDS:])
+        for block in blocks
+    ]
+
+    def new_qr() -> QrCode:
+        return QrCode(data, ecc, plan=plan)
+
+    def with_patterns() -> QrCode:
+        qr = new_qr()
+        qr.add_static_patterns()
+        return qr
+
+    finished = with_patterns()
+    finished.add_encoded_data(bits)
+    finished.add_dark_module()
+    path = directory / f"{version}-{ecc}.png"
+
+    return {
+        "DataEncoder.encode": (
+            lambda _: DataEncoder.encode(data, version, ecc),
+            lambda: None,
+        ),
+        "GeneratorPolynomial.divide": (
+            lambda _: [generator.divide(block) for block in blocks],
+            lambda: None,
+        ),
+        "IncrementalEncoder.encode": (
+            lambda _: [
+                encoder.encode(block) for encoder, block in zip(encoders, changed)
+            ],
+            lambda: None,
+        ),
+        "add_static_patterns": (lambda qr: qr.add_static_patterns(), new_qr),
+        "add_encoded_data": (lambda qr: qr.add_encoded_data(bits), with_patterns),
+        "find_best_mask": (lambda qr: qr.find_best_mask(ecc), lambda: finished),
+        "save": (lambda qr: qr.save(path, ecc=ecc), lambda: finished),
+    }
+
+
+def run(
+    versions: Iterable[int] = VERSIONS,
+    ecc_levels: Iterable[str] = ECC_LEVELS,
+    stages: Iterable[str] = STAGES,
+    min_time: float = 0.2,
+    progress: Optional[Callable[[BenchResult], None]] = None,
+) -> List[BenchResult]:
+    """
+    :param versions: Versions to benchmark
+    :param ecc_levels: Error correction levels to benchmark
+    :param stages: Names from `STAGES`
+    :param min_time: Seconds spent per stage, version and error correction level
+    :param progress: Called with every result as it is measured
+    :return: Results in measuring order
+    """
+    warm_caches()
+    stages = list(stages)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for version in versions:
+            for ecc in ecc_levels:
+                funcs = get_stages(version, ecc, Path(directory))
+                for stage in stages:
+                    func, setup = funcs[stage]
+                    result = BenchResult(
+                        stage, version, ecc, *time_calls(func, setup, min_time)
+                    )
+                    results.append(result)
+                    if progress is not None:
+                        progress(result)
+    return results
+
+
+def to_json(results: List[BenchResult]) -> Dict:
+    return {
+        "library_version": LIBRARY_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": [result._asdict() for result in results],
+    }
+
+
+def compare(
+    results: List[BenchResult], baseline: Dict, threshold: float = 0.2
+) -> List[Regression]:
+    """
+    :param results: Current results
+    :param baseline: Earlier run, as written by `to_json`
+    :param threshold: Allowed slowdown, 0.2 flags stages more than 20% slower
+    :return: Stages slower than the baseline by more than the threshold, stages missing from it are skipped
+    """
+    previous = {
+        (entry["stage"], entry["version"], entry["ecc"]): entry["min_us"]
+        for entry in baseline["results"]
+    }
+    regressions = []
+    for result in results:
+        baseline_us = previous.get((result.stage, result.version, result.ecc))
+        if not baseline_us:
+            continue
+        ratio = result.min_us / baseline_us
+        if ratio > 1 + threshold:
+            regressions.append(
+                Regression(
+                    result.stage,
+                    result.version,
+                    result.ecc,
+                    baseline_us,
+                    result.min_us,
+                    ratio,
+                )
+            )
+    return regressions
+
+
+def _print_result(result: BenchResult):
+    print(
+        f"{result.stage:<28} {result.version:>2}-{result.ecc}"
+        f" {result.min_us:>12.1f} us {result.median_us:>12.1f} us {result.calls:>7}",
+        flush=True,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every stage of make")
+    parser.add_argument(
+        "--versions",
+        default=",".join(map(str, VERSIONS)),
+        help="comma separated versions",
+    )
+    parser.add_argument("--ecc", default="".join(ECC_LEVELS), help="e.g. LMQH")
+    parser.add_argument(
+        "--stages", default=",".join(STAGES), help="comma separated stage names"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per measurement"
+    )
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 is 20%%"
+    )
+    args = parser.parse_args(argv)
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages {', '.join(sorted(unknown))}")
+
+    print(f"{'stage':<28} {'case':>4} {'fastest':>15} {'median':>15} {'calls':>7}")
+    results = run(
+        [int(version) for version in args.versions.split(",")],
+        args.ecc.upper(),
+        stages,
+        args.min_time,
+        _print_result,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(to_json(results), fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression.stage} {regression.version}-{regression.ecc}:"
+                f" {regression.baseline_us:.1f} us -> {regression.current_us:.1f} us"
+                f" ({regression.ratio:.2f}x)"
+            )
+        if regressions:
+            return 1
+        print(f"no stage slower than the baseline by more than {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+class BitBuffer:
+    """
+    Append-only sequence of bits, packed eight to a byte with the most significant bit first.
+    Bits which do not fill a whole byte yet are kept aside until the byte is complete.
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._pending = 0
+        self._pending_width = 0
+
+    def __len__(self) -> int:
+        """
+        :return: Length of the buffer in bits
+        """
+        return len(self._data) * 8 + self._pending_width
+
+    def __eq__(self, other: "BitBuffer"):
+        if not isinstance(other, BitBuffer):
+            return NotImplemented
+        return len(self) == len(other) and self.to_bytes() == other.to_bytes()
+
+    def append(self, value: int, width: int):
+        """
+        Append the lowest `width` bits of `value`, most significant bit first.
+
+        :param value: Non-negative integer to append
+        :param width: Number of bits to write
+        """
+        if value < 0 or value >> width:
+            raise ValueError(f"{value} does not fit in {width} bits")
+
+        width += self._pending_width
+        value |= self._pending << (width - self._pending_width)
+        remainder = width % 8
+        if width >= 8:
+            self._data += (value >> remainder).to_bytes(width // 8, "big")
+
+        self._pending = value & ((1 << remainder) - 1)
+        self._pending_width = remainder
+
+    def append_bytes(self, data: bytes):
+        """
+        Append whole bytes, e.g. codewords, eight bits per byte.
+        """
+        if self._pending_width == 0:
+            self._data += data
+        else:
+            for byte in data:
+                self.append(byte, 8)
+
+    def to_bytes(self) -> bytes:
+        """
+        :return: Packed bits, the last byte is padded with zeros if the length is not a multiple of 8
+        """
+        if self._pending_width == 0:
+            return bytes(self._data)
+        return bytes(self._data) + bytes([self._pending << (8 - self._pending_width)])
+
+    def to_bitstring(self) -> str:
+        """
+        :return: The bits as a string of '0' and '1' characters
+        """
+        if len(self) == 0:
+            return ""
+        data = self.to_bytes()
+        return format(int.from_bytes(data, "big"), f"0{len(data) * 8}b")[: len(self)]
+
+    @classmethod
+    def from_bitstring(cls, bits: str) -> "BitBuffer":
+        """
+        :param bits: String of '0' and '1' characters
+        :return: New buffer holding the same bits
+        """
+        buffer = cls()
+        if bits:
+            buffer.append(int(bits, 2), len(bits))
+        return buffer
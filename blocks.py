@@ -0,0 +1,109 @@
+from functools import cache
+from typing import Tuple
+
+import numpy as np
+
+from const import ECC_BLOCKS, InvalidErrorCorrectionCode, InvalidErrorCorrectionVersion
+from polynomial import GeneratorPolynomial
+
+
+class BlockLayout:
+    """
+    Group and block structure of the codewords for a version and error correction level, as listed in `ECC_BLOCKS`.
+    The data codewords are split into blocks, every block gets its own error correction codewords, and the final
+    message interleaves the blocks codeword by codeword, followed by the interleaved error correction codewords.
+
+    Blocks of the first group can be one codeword shorter than those of the second group. Short blocks are padded
+    with a leading zero, which does not change their remainder, so all blocks are encoded as one padded 2D array.
+
+    https://www.thonky.com/qr-code-tutorial/structure-final-message
+
+    :param version: QR code version
+    :param ecc: Error Correction Code
+    """
+
+    def __init__(self, version: int, ecc: str):
+        block = ECC_BLOCKS.get(version)
+        if block is None:
+            raise InvalidErrorCorrectionVersion(version)
+        if ecc not in block:
+            raise InvalidErrorCorrectionCode(ecc)
+
+        (
+            self.data_codewords,
+            self.ec_codewords_per_block,
+            group_1_blocks,
+            group_1_size,
+            group_2_blocks,
+            group_2_size,
+        ) = block[ecc]
+        self.block_sizes: Tuple[int, ...] = (group_1_size,) * group_1_blocks + (
+            group_2_size,
+        ) * group_2_blocks
+        self.total_codewords = (
+            self.data_codewords + len(self.block_sizes) * self.ec_codewords_per_block
+        )
+        self.block_index = self._get_block_index()
+        self.interleave_index = self._get_interleave_index()
+
+    @classmethod
+    @cache
+    def get(cls, version: int, ecc: str) -> "BlockLayout":
+        return cls(version, ecc)
+
+    def _get_block_index(self) -> np.ndarray:
+        """
+        :return: (blocks, longest block) index array into the data codewords, short blocks start with the index
+                 one past the last data codeword, which points at a zero pad
+        """
+        longest = max(self.block_sizes)
+        index = np.full((len(self.block_sizes), longest), self.data_codewords)
+        start = 0
+        for block, size in enumerate(self.block_sizes):
+            index[block, longest - size :] = np.arange(start, start + size)
+            start += size
+
+        index.setflags(write=False)
+        return index
+
+    def _get_interleave_index(self) -> np.ndarray:
+        """
+        :return: Permutation of [data codewords, error correction codewords block by block] into the final message
+        """
+        blocks = len(self.block_sizes)
+
+        # data codewords column by column, the short blocks have no codeword in the last column
+        starts = np.cumsum((0,) + self.block_sizes[:-1])
+        columns = np.arange(max(self.block_sizes))
+        data = (starts[np.newaxis] + columns[:, np.newaxis]).ravel()
+        in_block = (columns[:, np.newaxis] < np.array(self.block_sizes)).ravel()
+        data = data[in_block]
+
+        ec = np.arange(blocks * self.ec_codewords_per_block).reshape(blocks, -1)
+        ec = ec.T.ravel() + self.data_codewords
+
+        index = np.concatenate([data, ec])
+        index.setflags(write=False)
+        return index
+
+    def encode(self, data: np.ndarray) -> np.ndarray:
+        """
+        Add the error correction codewords of every block and interleave the result.
+
+        :param data: (data codewords,) or (N, data codewords) uint8 array
+        :return: (total codewords,) or (N, total codewords) uint8 array of final messages
+        """
+        data = np.asarray(data, dtype=np.uint8)
+        if data.shape[-1] != self.data_codewords:
+            raise ValueError(
+                f"expected {self.data_codewords} data codewords, got {data.shape[-1]}"
+            )
+        rows = data.reshape(-1, self.data_codewords)
+
+        padded = np.pad(rows, ((0, 0), (0, 1)))[:, self.block_index]
+        blocks = padded.reshape(-1, padded.shape[-1])
+        generator = GeneratorPolynomial(self.ec_codewords_per_block)
+        ec = generator.divide_many(blocks).reshape(len(rows), -1)
+
+        message = np.concatenate([rows, ec], axis=1)[:, self.interleave_index]
+        return message.reshape(data.shape[:-1] + (self.total_codewords,))
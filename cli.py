@@ -0,0 +1,511 @@
+"""
+Command line for bulk jobs.
+
+    python -m cli batch urls.txt --output out/ --workers 8
+    python -m cli batch tickets.csv --output tickets.tar --checkpoint tickets.json
+    python -m cli batch --input-format jsonl --output - < payloads.jsonl > symbols.tar
+
+Input is read lazily from a file or stdin: one payload per line, CSV with a `data` column, or JSON lines holding an
+object with a `data` key or a bare string. CSV rows and JSON objects may also set `ecc` and `name`. Rows are sent to
+the worker processes in chunks with at most two chunks per worker in flight, and within a chunk payloads sharing a
+version and error correction level are made as one batch. Memory therefore stays bounded whatever the input size.
+
+Files are written in input order to a directory, a tar or zip archive, or a tar stream on stdout, see `sinks`.
+`--manifest` adds an index of every file with its row and payload, and `--dedupe` stores identical files once.
+
+With `--checkpoint` the number of rows done and the output position are recorded after every chunk once the output
+has been flushed. Running the same command again skips the rows already done, truncates a tar archive and the
+manifest to their last complete entry and carries on, so a killed job loses at most the chunks that were in flight.
+Zip archives and stdout cannot be resumed.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+from batch import make_batch
+from const import InvalidVersionNumber
+from plan import EncodePlan
+from qr import QrCode, _make_chunks_in_pool, render_bytes
+from sinks import Sink, SinkError, SinkPosition, get_sink_kind, open_sink
+from util import InvalidErrorCorrectionCode, get_file_mode
+
+INPUT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+# default names are spread over subdirectories of this many files
+NAMES_PER_DIRECTORY = 10000
+
+
+class InputError(Exception):
+    pass
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class Record(NamedTuple):
+    index: int
+    data: str
+    ecc: str
+    name: str
+
+
+class RenderOptions(NamedTuple):
+    suffix: str
+    scale: int
+    border: int
+    compress_level: int
+
+
+class BatchResult(NamedTuple):
+    done: int
+    written: int
+    failed: int
+
+
+def read_lines(fp: TextIO) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    :param fp: Text input with one payload per line, blank lines are skipped
+    :return: Generator of (data, ecc, name) rows
+    """
+    for line in fp:
+        line = line.rstrip("\r\n")
+        if line:
+            yield line, None, None
+
+
+def read_csv(
+    fp: TextIO, column: str = "data"
+) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    :param fp: CSV input with a header row, opened with `newline=""`
+    :param column: Name of the payload column, `ecc` and `name` columns are optional
+    :return: Generator of (data, ecc, name) rows
+    """
+    reader = csv.DictReader(fp)
+    if reader.fieldnames is None:
+        return
+    if column not in reader.fieldnames:
+        raise InputError(f"CSV input has no {column!r} column")
+    for row in reader:
+        yield row[column], row.get("ecc") or None, row.get("name") or None
+
+
+def read_jsonl(fp: TextIO) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    :param fp: JSON lines input, every line an object with a `data` key or a string
+    :return: Generator of (data, ecc, name) rows
+    """
+    for number, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as ex:
+            raise InputError(f"line {number}: {ex}")
+        if isinstance(row, str):
+            yield row, None, None
+        elif isinstance(row, dict) and isinstance(row.get("data"), str):
+            yield row["data"], row.get("ecc"), row.get("name")
+        else:
+            raise InputError(f"line {number}: expected a string or an object with data")
+
+
+def get_input_format(path: str) -> str:
+    return INPUT_FORMATS.get(Path(path).suffix.lower(), "lines")
+
+
+def get_default_name(index: int, suffix: str) -> str:
+    return f"{index // NAMES_PER_DIRECTORY:04d}/{index:08d}{suffix}"
+
+
+def get_records(
+    rows: Iterable[Tuple[str, Optional[str], Optional[str]]],
+    ecc: str,
+    suffix: str,
+    skip: int = 0,
+) -> Iterator[Record]:
+    """
+    :param rows: (data, ecc, name) rows from one of the readers
+    :param ecc: Error Correction Code of rows which don't set one
+    :param suffix: File suffix of the image format
+    :param skip: Number of rows already done
+    :return: Generator of records, numbered from the start of the input
+    """
+    for index, (data, row_ecc, name) in enumerate(islice(rows, skip, None), skip):
+        if name is None:
+            name = get_default_name(index, suffix)
+        elif not name.lower().endswith(suffix):
+            name += suffix
+        yield Record(index, data, (row_ecc or ecc).upper(), name)
+
+
+def render_chunk(
+    chunk: List[Record], options: RenderOptions
+) -> List[Tuple[Record, Optional[bytes], Optional[str]]]:
+    """
+    Runs in the worker processes. Records landing on the same version and error correction level are made as one
+    batch. When a batch fails, its records are rendered one by one, so only the bad rows are reported.
+
+    :param chunk: Records to render
+    :param options: Output format
+    :return: (record, contents, error) in input order, contents is None when the record failed
+    """
+    results = {}
+    groups: Dict[Tuple[int, str], List[Tuple[Record, EncodePlan]]] = {}
+    for record in chunk:
+        try:
+            plan = EncodePlan.create(record.data, record.ecc)
+        except InvalidVersionNumber:
+            error = (
+                "data is empty" if not record.data else "data does not fit any version"
+            )
+            results[record.index] = (record, None, error)
+            continue
+        except InvalidErrorCorrectionCode:
+            error = "ecc must be one of L, M, Q, H"
+            results[record.index] = (record, None, error)
+            continue
+        except Exception as ex:
+            results[record.index] = (record, None, get_error_message(ex))
+            continue
+        groups.setdefault((plan.version, plan.ecc), []).append((record, plan))
+
+    for group in groups.values():
+        try:
+            rendered = _render_group(group, options)
+        except Exception:
+            rendered = []
+            for record, plan in group:
+                try:
+                    rendered += _render_group([(record, plan)], options)
+                except Exception as ex:
+                    results[record.index] = (record, None, get_error_message(ex))
+        for record, contents in rendered:
+            results[record.index] = (record, contents, None)
+
+    return [results[record.index] for record in chunk]
+
+
+def _render_group(
+    group: List[Tuple[Record, EncodePlan]], options: RenderOptions
+) -> List[Tuple[Record, bytes]]:
+    plans = [plan for _, plan in group]
+    stack = make_batch([plan.data for plan in plans], plans[0].ecc, plans)
+    return [
+        (
+            record,
+            render_bytes(
+                matrix == QrCode.BLACK_MODULE,
+                options.suffix,
+                options.scale,
+                border=options.border,
+                compress_level=options.compress_level,
+            ),
+        )
+        for (record, _), matrix in zip(group, stack)
+    ]
+
+
+def get_error_message(ex: Exception) -> str:
+    """
+    :param ex: Error raised while rendering a row
+    :return: Message reported for the row
+    """
+    return f"{type(ex).__name__}: {ex}" if str(ex) else type(ex).__name__
+
+
+class Checkpoint:
+    """
+    JSON file holding the progress of a job, replaced atomically on every save. Once the output is closed the job is
+    marked as finished, a finished job is not run again.
+
+    :param path: Checkpoint file
+    :param settings: Options of the job, a checkpoint written with different options is refused
+    """
+
+    def __init__(self, path: Path | str, settings: Dict):
+        self.path = Path(path)
+        self.settings = settings
+
+    def load(self) -> Optional[Tuple[int, Optional[SinkPosition], int, bool]]:
+        """
+        :return: Rows done, sink position, rows failed and whether the job finished, None when there is no checkpoint
+                 yet. The position is None for finished jobs.
+        """
+        try:
+            with open(self.path, encoding="utf-8") as fp:
+                state = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError as ex:
+            raise CheckpointError(f"{self.path}: {ex}")
+
+        if state.get("settings") != self.settings:
+            raise CheckpointError(
+                f"{self.path} belongs to a job with other options, remove it to start over"
+            )
+        position = state["position"]
+        return (
+            state["done"],
+            SinkPosition(*position) if position is not None else None,
+            state["failed"],
+            state.get("finished", False),
+        )
+
+    def save(
+        self,
+        done: int,
+        position: Optional[SinkPosition],
+        failed: int,
+        finished: bool = False,
+    ):
+        state = {
+            "settings": self.settings,
+            "done": done,
+            "position": list(position) if position is not None else None,
+            "failed": failed,
+            "finished": finished,
+        }
+        fd, temp = tempfile.mkstemp(
+            prefix=".tmp-", suffix=".json", dir=self.path.parent
+        )
+        try:
+            os.chmod(temp, get_file_mode())
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump(state, fp)
+            os.replace(temp, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+def run_batch(
+    records: Iterable[Record],
+    sink: Sink,
+    options: RenderOptions,
+    workers: int = 1,
+    chunksize: int = 256,
+    checkpoint: Optional[Checkpoint] = None,
+    done: int = 0,
+    failed: int = 0,
+    errors: Optional[TextIO] = None,
+) -> BatchResult:
+    """
+    :param records: Records in input order, starting at row `done`
+    :param sink: Output target
+    :param options: Output format
+    :param workers: Number of worker processes, 1 renders in the current process
+    :param chunksize: Number of records sent to a worker at once, and rows between checkpoints
+    :param checkpoint: Progress file saved after every chunk
+    :param done: Rows done by an earlier run
+    :param failed: Rows failed in an earlier run
+    :param errors: Stream receiving one line per failed row, stderr by default
+    :return: Rows done and failed in total, and files written by this run
+    """
+    chunks = _chunk_records(records, chunksize)
+    func = partial(render_chunk, options=options)
+    if workers > 1:
+        results = _make_chunks_in_pool(chunks, workers, func)
+    else:
+        results = map(func, chunks)
+
+    errors = errors or sys.stderr
+    written = 0
+    for chunk in results:
+        for record, contents, error in chunk:
+            if contents is not None:
+                try:
+                    sink.write(
+                        record.name, contents, index=record.index, data=record.data
+                    )
+                    written += 1
+                except SinkError as ex:
+                    error = str(ex)
+            if error is not None:
+                failed += 1
+                print(f"row {record.index}: {error}", file=errors)
+            done = record.index + 1
+
+        position = sink.commit()
+        if checkpoint is not None:
+            checkpoint.save(done, position, failed)
+    return BatchResult(done, written, failed)
+
+
+def _chunk_records(records: Iterable[Record], chunksize: int) -> Iterator[List[Record]]:
+    records = iter(records)
+    while chunk := list(islice(records, chunksize)):
+        yield chunk
+
+
+def _open_input(path: str) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def batch_command(args: argparse.Namespace) -> int:
+    input_format = args.input_format
+    if input_format == "auto":
+        input_format = get_input_format(args.input)
+    suffix = "." + args.format
+    options = RenderOptions(suffix, args.scale, args.border, args.compress_level)
+
+    checkpoint = None
+    done = failed = 0
+    position = None
+    if args.checkpoint:
+        settings = {
+            "input": os.path.abspath(args.input) if args.input != "-" else "-",
+            "input_format": input_format,
+            "column": args.column,
+            "ecc": args.ecc,
+            "output": os.path.abspath(args.output) if args.output != "-" else "-",
+            "output_format": args.output_format,
+            "manifest": args.manifest,
+            "dedupe": args.dedupe,
+            "options": list(options),
+        }
+        checkpoint = Checkpoint(args.checkpoint, settings)
+        state = checkpoint.load()
+        if state is not None:
+            done, position, failed, finished = state
+            if finished:
+                # the output is complete, a tar archive already ends with its manifest
+                print(
+                    f"job already finished, remove {args.checkpoint} to run it again",
+                    file=sys.stderr,
+                )
+                print(f"{done} rows, {failed} failed", file=sys.stderr)
+                return 1 if failed else 0
+            print(f"resuming after row {done}", file=sys.stderr)
+
+    with _open_input(args.input) as fp:
+        if input_format == "csv":
+            rows = read_csv(fp, args.column)
+        elif input_format == "jsonl":
+            rows = read_jsonl(fp)
+        else:
+            rows = read_lines(fp)
+
+        with open_sink(
+            args.output, args.output_format, position, args.manifest, args.dedupe
+        ) as sink:
+            result = run_batch(
+                get_records(rows, args.ecc, suffix, done),
+                sink,
+                options,
+                args.workers or os.cpu_count() or 1,
+                args.chunksize,
+                checkpoint,
+                done,
+                failed,
+            )
+    if checkpoint is not None:
+        checkpoint.save(result.done, None, result.failed, finished=True)
+
+    print(
+        f"{result.done} rows, {result.written} files written, {result.failed} failed",
+        file=sys.stderr,
+    )
+    return 1 if result.failed else 0
+
+
+def get_int_type(low: int, high: Optional[int] = None) -> Callable[[str], int]:
+    """
+    :param low: Smallest accepted value
+    :param high: Largest accepted value, unbounded when omitted
+    :return: argparse type parsing an integer in the range
+    """
+
+    def parse(value: str) -> int:
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{value!r} is not an integer")
+        if number < low or (high is not None and number > high):
+            bounds = (
+                f"between {low} and {high}" if high is not None else f"at least {low}"
+            )
+            raise argparse.ArgumentTypeError(f"must be {bounds}")
+        return number
+
+    return parse
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cli", description="QR code tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="make QR codes for every input row")
+    batch.add_argument("input", nargs="?", default="-", help="input file, - for stdin")
+    batch.add_argument(
+        "--input-format", default="auto", choices=("auto", "lines", "csv", "jsonl")
+    )
+    batch.add_argument("--column", default="data", help="payload column of CSV input")
+    batch.add_argument(
+        "-o", "--output", required=True, help="directory, .tar, .zip or -"
+    )
+    batch.add_argument("--output-format", choices=("dir", "tar", "zip"))
+    batch.add_argument(
+        "--manifest", action="store_true", help="write an index of every file"
+    )
+    batch.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="store identical files once, implies --manifest",
+    )
+    batch.add_argument("--ecc", default="M", choices=("L", "M", "Q", "H"))
+    batch.add_argument("--format", default="png", choices=("png", "svg"))
+    batch.add_argument("--scale", type=get_int_type(1, 50), default=10)
+    batch.add_argument("--border", type=get_int_type(0, 20), default=4)
+    batch.add_argument("--compress-level", type=get_int_type(0, 9), default=6)
+    batch.add_argument(
+        "--workers",
+        type=get_int_type(0),
+        default=0,
+        help="worker processes, one per CPU when 0",
+    )
+    batch.add_argument("--chunksize", type=get_int_type(1), default=256)
+    batch.add_argument("--checkpoint", help="progress file, the job resumes from it")
+    batch.set_defaults(func=batch_command)
+
+    args = parser.parse_args(argv)
+    if args.command == "batch" and args.checkpoint:
+        kind = get_sink_kind(args.output, args.output_format)
+        if args.output == "-" or kind == "zip":
+            batch.error(
+                "--checkpoint needs a directory or tar file output,"
+                " zip archives and stdout can't be resumed"
+            )
+    try:
+        return args.func(args)
+    except (InputError, CheckpointError, SinkError, OSError) as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
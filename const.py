@@ -1,5 +1,8 @@
 from enum import Enum
 
+# Part of every on-disk cache key, bump it whenever the rendered output of the same input changes
+LIBRARY_VERSION = "0.2.0"
+
 
 class Mode(Enum):
     NUMERIC: str = "Numeric"
@@ -902,6 +905,15 @@ class InvalidErrorCorrectionVersion(Exception):
     pass
 
 
+class InvalidVersionNumber(Exception):
+    """
+    This class represents an exception that is raised when an invalid version number is encountered.
+
+    """
+
+    pass
+
+
 def get_required_length_of_ecc_block(qr_version: int, ecc: str) -> int:
     block = ECC_BLOCKS.get(qr_version)
     if block is None:
@@ -0,0 +1,188 @@
+"""
+Content-addressed cache of rendered files, shared across process restarts. Every output is stored under the hash of
+everything that decides its bytes, so a hit can be copied to the destination without encoding or rendering.
+
+Several processes can share one directory: files only appear through an atomic rename of a complete temporary file,
+readers keep reading a file that another process evicts, and every step tolerates files vanishing underneath it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+from const import LIBRARY_VERSION
+from util import get_file_mode
+
+
+class DiskCache:
+    """
+    Directory of rendered outputs, bounded by a total size in bytes. A hit refreshes the file's mtime, and eviction
+    removes the files with the oldest mtime first, which makes the policy LRU across all processes.
+
+    :param directory: Cache directory, created when missing
+    :param max_bytes: Total size the directory is trimmed to after writes
+    """
+
+    # rescan the directory after this many writes, other processes add files too
+    RESCAN_EVERY = 256
+    # evict down to this fraction of `max_bytes` so a full cache doesn't rescan on every write
+    LOW_WATERMARK = 0.9
+
+    def __init__(self, directory: Path | str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._bytes: Optional[int] = None
+        self._writes = 0
+
+    @staticmethod
+    def get_key(*fields) -> str:
+        """
+        :param fields: JSON serialisable values which decide the bytes of the output, e.g. payload, error correction
+                       level, version, format, scale, border and colours
+        :return: Hex digest of the fields and the library version
+        """
+        encoded = json.dumps([LIBRARY_VERSION, *fields], ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get_path(self, key: str, suffix: str) -> Path:
+        """
+        Files are spread over 256 subdirectories to keep directory listings short.
+        """
+        return self.directory / key[:2] / (key + suffix.lower())
+
+    def copy_to(
+        self, key: str, suffix: str, destination: Path | str | BinaryIO
+    ) -> bool:
+        """
+        Stream a cached file to the destination.
+
+        :param key: Key from `get_key`
+        :param suffix: File suffix of the format, e.g. `.png`
+        :param destination: Path or binary file object
+        :return: False on a miss
+        """
+        try:
+            source = open(self.get_path(key, suffix), "rb")
+        except FileNotFoundError:
+            return False
+
+        with source:
+            try:
+                os.utime(source.fileno())
+            except OSError:
+                pass
+
+            if isinstance(destination, (str, Path)):
+                with open(destination, "wb") as fp:
+                    self._copy(source, fp)
+            else:
+                self._copy(source, destination)
+        return True
+
+    @staticmethod
+    def _copy(source: BinaryIO, destination: BinaryIO):
+        """
+        Zero-copy `os.sendfile` between real files, `shutil.copyfileobj` for anything else.
+        """
+        try:
+            destination.flush()
+            out_fd = destination.fileno()
+        except (AttributeError, OSError, ValueError):
+            shutil.copyfileobj(source, destination)
+            return
+
+        size = os.fstat(source.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(out_fd, source.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            if offset:
+                raise
+            source.seek(0)
+            shutil.copyfileobj(source, destination)
+
+    def store(self, key: str, suffix: str, write: Callable[[Path], None]) -> Path:
+        """
+        Write a new entry through a temporary file in the target directory and rename it into place, so other
+        processes either see the complete file or none at all. Concurrent writers of the same key produce the same
+        bytes, the last rename wins.
+
+        :param key: Key from `get_key`
+        :param suffix: File suffix of the format, the writer picks the format from it
+        :param write: Callable writing the output to the given path
+        :return: Path of the cached file
+        """
+        path = self.get_path(key, suffix)
+        path.parent.mkdir(exist_ok=True)
+        fd, temp = tempfile.mkstemp(
+            suffix=suffix.lower(), prefix=".tmp-", dir=path.parent
+        )
+        os.close(fd)
+        try:
+            os.chmod(temp, get_file_mode())
+            write(Path(temp))
+            size = os.path.getsize(temp)
+            os.replace(temp, path)
+        except BaseException:
+            try:
+                os.unlink(temp)
+            except FileNotFoundError:
+                pass
+            raise
+
+        self._writes += 1
+        if self._bytes is None or self._writes % self.RESCAN_EVERY == 0:
+            self._bytes = sum(size for _, size, _ in self._scan())
+        else:
+            self._bytes += size
+        if self._bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def evict(self, max_bytes: Optional[int] = None):
+        """
+        Delete the least recently used files until the directory holds at most `max_bytes`, which defaults to the
+        low watermark of the cap.
+
+        :param max_bytes: Target size in bytes
+        """
+        if max_bytes is None:
+            max_bytes = int(self.max_bytes * self.LOW_WATERMARK)
+
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                # already evicted by another process
+                pass
+            total -= size
+        self._bytes = total
+
+    def clear(self):
+        self.evict(0)
+
+    def _scan(self) -> Iterator[Tuple[float, int, Path]]:
+        """
+        :return: (mtime, size, path) of every finished file, skipping files that disappear while scanning
+        """
+        for path in self.directory.glob("??/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
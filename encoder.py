@@ -1,8 +1,23 @@
 from enum import Enum
-from typing import List, Set
-
+from functools import cache
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from bitbuffer import BitBuffer
 from const import get_required_length_of_ecc_block, Mode
-from util import choose_qr_version
+from util import choose_qr_version, choose_qr_version_by_bits
+
+if TYPE_CHECKING:
+    from plan import EncodePlan
 
 ALPHANUMERIC_CHARS: Set[str] = set("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ$%*+-.,/: ")
 
@@ -12,6 +27,11 @@ class ModeInidicators(Enum):
     ALPHANUMERIC: str = "0010"
     BYTE: str = "0100"
     KANJI: str = "1000"
+    ECI: str = "0111"
+
+
+# ECI assignment number of UTF-8, byte segments default to ISO-8859-1 without one
+UTF8_ECI = 26
 
 
 class InvalidAlphanumericCharacter(Exception):
@@ -76,9 +96,11 @@ class AlphanumericPair:
     def encode(self) -> str:
         value = self.get_pair_value()
         bin_text = "{0:b}".format(value)
-        width = 6 if self._second_value() == -1 else 11
 
-        return bin_text.rjust(width, "0")
+        return bin_text.rjust(self.get_width(), "0")
+
+    def get_width(self) -> int:
+        return 6 if self._second_value() == -1 else 11
 
     def get_pair_value(self) -> int:
         if self._second_value() == -1:
@@ -88,6 +110,15 @@ class AlphanumericPair:
         return value
 
 
+class Segment(NamedTuple):
+    """
+    Run of characters encoded with a single mode, with its own mode indicator and character count.
+    """
+
+    mode: Mode
+    text: str
+
+
 class DataEncoder:
     """
     DataEncoder is a class that provides methods for encoding text into a string formatted according to the QR code
@@ -96,124 +127,364 @@ class DataEncoder:
 
     @classmethod
     def encode(cls, text: str, version: int, ecc: str) -> str:
-        # infer the encoding mode and get the respective indicator string and bit chunks
-        encoding_mode = cls.get_encoding_mode(text)
-        indicator, chunks = cls._get_indicator_and_encoded_chunks(encoding_mode, text)
-        encoded_string = indicator
+        """
+        String based counterpart of `encode_bits`, kept for compatibility.
+        """
+        return cls.encode_bits(text, version, ecc).to_bitstring()
 
-        # set mode indicator and character length
-        encoded_string += cls._get_character_count_indicator(text, ecc, encoding_mode)
-        encoded_string += "".join(chunks)
+    @classmethod
+    def encode_bits(cls, text: str, version: int, ecc: str) -> BitBuffer:
+        return cls.encode_segments(cls.get_segments(text, version), version, ecc)
 
-        # terminator zeros (up to 4 zeros if padding is required)
-        terminator_zeros = cls._pad_terminator_zeros(encoded_string)
-        encoded_string += terminator_zeros
+    @classmethod
+    def encode_plan(cls, plan: "EncodePlan") -> BitBuffer:
+        """
+        Encode the data codewords of a plan without analysing the text again.
+        """
+        return cls.encode_segments(plan.segments, plan.version, plan.ecc)
 
-        # pad zeros until current string len is a multiple of 8
-        modulus_padding = cls._pad_to_modulus_eight(encoded_string)
-        encoded_string += modulus_padding
+    @classmethod
+    def encode_segments(
+        cls, segments: Iterable[Segment], version: int, ecc: str
+    ) -> BitBuffer:
+        segments = list(segments)
+        utf8 = cls.uses_utf8(segments)
+        buffer = BitBuffer()
+        if utf8:
+            buffer.append(
+                int(ModeInidicators.ECI.value, 2), len(ModeInidicators.ECI.value)
+            )
+            buffer.append(UTF8_ECI, 8)
+        for segment in segments:
+            # set mode indicator and character length, followed by the codes of the segment
+            indicator, codes = cls._get_indicator_and_codes(
+                segment.mode, segment.text, utf8
+            )
+            buffer.append(int(indicator, 2), len(indicator))
+            buffer.append(
+                cls.get_character_count(segment.mode, segment.text, utf8),
+                cls.get_character_count_width(version, segment.mode),
+            )
+            for value, width in codes:
+                buffer.append(value, width)
 
         # https://www.thonky.com/qr-code-tutorial/error-correction-table
         # Total Number of Data Codewords for this Version and EC Level (Multiplied by 8 bytes for binary length)
         required_length = get_required_length_of_ecc_block(version, ecc)
 
+        # terminator zeros (up to 4 zeros if there is room left)
+        cls._pad_terminator_zeros(buffer, required_length)
+
+        # pad zeros until current string len is a multiple of 8
+        cls._pad_to_modulus_eight(buffer)
+
         # pad final alternating bytes of 0xEC and 0x11 to the end of encoded string
-        encoded_string = cls._pad_remaining_bytes(encoded_string, required_length)
+        cls._pad_remaining_bytes(buffer, required_length)
+
+        return buffer
+
+    @staticmethod
+    def uses_utf8(segments: Iterable[Segment]) -> bool:
+        """
+        Byte segments are ISO-8859-1 unless the symbol starts with an ECI header. Text with characters beyond
+        ISO-8859-1 in a byte segment gets the UTF-8 header, and every byte segment of the symbol is then UTF-8.
 
-        return encoded_string
+        :param segments: Segments from `get_segments`
+        :return: True when the byte segments have to be UTF-8
+        """
+        return any(
+            mode == Mode.BYTE and any(ord(ch) > 0xFF for ch in text)
+            for mode, text in segments
+        )
+
+    @staticmethod
+    def get_character_count(mode: Mode, text: str, utf8: bool = False) -> int:
+        """
+        :return: Value of the character count indicator, the number of bytes for byte segments
+        """
+        if mode == Mode.BYTE:
+            return len(text.encode("utf-8" if utf8 else "latin-1"))
+        return len(text)
 
     @classmethod
-    def _get_indicator_and_encoded_chunks(cls, encoding_mode: Mode, text: str):
+    def _get_indicator_and_codes(
+        cls, encoding_mode: Mode, text: str, utf8: bool = False
+    ) -> Tuple[str, Iterator[Tuple[int, int]]]:
         """
-        Get encoding mode indicator and the encoded bytes in 8 bit binary chunks.
+        Get encoding mode indicator and the encoded characters as (value, bit width) codes.
 
         :param encoding_mode: The encoding mode to be used for encoding the text.
-        :type encoding_mode: Mode
         :param text: The text to be encoded.
-        :type text: str
-        :return: The encoded string and the encoding chunks.
-        :rtype: tuple[str, list]
+        :param utf8: Encode byte segments as UTF-8 instead of ISO-8859-1, see `uses_utf8`
+        :return: The mode indicator and the codes.
         """
-        encoding_chunks = []
-        encoded_string = ""
+        encoding_codes = iter(())
+        indicator = ""
         match encoding_mode:
             case Mode.NUMERIC:
-                encoded_string = ModeInidicators.NUMERIC.value
-                encoding_chunks = cls._encode_numeric(text)
+                indicator = ModeInidicators.NUMERIC.value
+                encoding_codes = cls._numeric_codes(text)
             case Mode.ALPHANUMERIC:
-                encoded_string = ModeInidicators.ALPHANUMERIC.value
-                encoding_chunks = cls._encode_alphanumeric_pairs(text)
+                indicator = ModeInidicators.ALPHANUMERIC.value
+                encoding_codes = cls._alphanumeric_codes(text)
             case Mode.BYTE:
-                encoded_string = ModeInidicators.BYTE.value
-                encoding_chunks = cls._encode_bytes(text)
-        return encoded_string, encoding_chunks
+                indicator = ModeInidicators.BYTE.value
+                encoding_codes = cls._byte_codes(text, utf8)
+            case Mode.KANJI:
+                indicator = ModeInidicators.KANJI.value
+                encoding_codes = cls._kanji_codes(text)
+        return indicator, encoding_codes
 
     @staticmethod
-    def get_encoding_mode(text: str) -> Mode:
+    def _to_binary(value: int, width: int) -> str:
+        return format(value, f"0{width}b")
+
+    @classmethod
+    def choose_version(cls, text: str, ecc: str) -> Optional[int]:
+        """
+        Choose the smallest version whose data capacity holds the optimally segmented text. The count indicator
+        widths only change at versions 10 and 27, so the text is segmented at most once per range of versions.
+
+        :param text: The text to be encoded
+        :param ecc: Error Correction Code
+        :return: The version number, or None if the text is empty or too long
+        """
+        if not text:
+            return None
+
+        return choose_qr_version_by_bits(
+            lambda version: cls.get_bit_length(
+                cls.get_segments(text, version), version
+            ),
+            ecc,
+        )
+
+    @classmethod
+    def get_bit_length(cls, segments: List[Segment], version: int) -> int:
+        """
+        :param segments: Segments from `get_segments`
+        :param version: QR code version
+        :return: Number of bits of the segments before the terminator and padding
+        """
+        utf8 = cls.uses_utf8(segments)
+        length = len(ModeInidicators.ECI.value) + 8 if utf8 else 0
+        for mode, text in segments:
+            length += len(ModeInidicators.NUMERIC.value)
+            length += cls.get_character_count_width(version, mode)
+            length += sum(
+                width for _, width in cls._get_indicator_and_codes(mode, text, utf8)[1]
+            )
+        return length
+
+    @classmethod
+    def get_segments(cls, text: str, version: int) -> List[Segment]:
+        """
+        Split the text into numeric, alphanumeric, byte and kanji segments with the minimum total bit length. Every
+        new segment costs a mode indicator and a count indicator, so short runs stay inside the surrounding segment.
+
+        Dynamic programming over the characters, keeping the cheapest cost of ending the prefix in every mode. The
+        costs are counted in sixths of a bit, so a numeric character costs 20 (10 bits per 3 digits), an alphanumeric
+        character 33 (11 bits per 2 characters), a byte 48 and a kanji character 78. Characters beyond ISO-8859-1
+        cost 48 per UTF-8 byte in byte mode. A segment is rounded up to whole bits when the mode switches.
+
+        https://www.nayuki.io/page/optimal-text-segmentation-for-qr-codes
+
+        :param text: The text to be encoded
+        :param version: QR code version, which decides the count indicator widths
+        :return: List of segments, empty for empty text
+        """
+        modes = (Mode.BYTE, Mode.ALPHANUMERIC, Mode.NUMERIC, Mode.KANJI)
+        char_costs = (48, 33, 20, 78)
+        head_costs = [
+            (
+                len(ModeInidicators.NUMERIC.value)
+                + cls.get_character_count_width(version, mode)
+            )
+            * 6
+            for mode in modes
+        ]
+        kanji_table = cls.get_kanji_table()
+        # text needing UTF-8 byte segments doesn't use kanji mode, decoders read kanji segments under the UTF-8 ECI
+        # as UTF-8 bytes
+        if any(ord(ch) > 0xFF and ch not in kanji_table for ch in text):
+            kanji_table = {}
+
+        # char_modes[i][m] is the mode of character i when the prefix up to i ends in mode m
+        char_modes: List[List[Optional[int]]] = []
+        prev_costs = head_costs
+        for ch in text:
+            cur_costs = [0, 0, 0, 0]
+            cur_modes: List[Optional[int]] = [None, None, None, None]
+            # characters outside of latin-1 only use byte mode when kanji mode can't take them
+            is_kanji = ch in kanji_table
+            if ord(ch) <= 0xFF:
+                cur_costs[0] = prev_costs[0] + char_costs[0]
+                cur_modes[0] = 0
+            elif not is_kanji:
+                cur_costs[0] = prev_costs[0] + char_costs[0] * len(ch.encode("utf-8"))
+                cur_modes[0] = 0
+            if AlphanumericPair.get_char_value(ch) != -1:
+                cur_costs[1] = prev_costs[1] + char_costs[1]
+                cur_modes[1] = 1
+            if "0" <= ch <= "9":
+                cur_costs[2] = prev_costs[2] + char_costs[2]
+                cur_modes[2] = 2
+            if is_kanji:
+                cur_costs[3] = prev_costs[3] + char_costs[3]
+                cur_modes[3] = 3
+
+            # switch modes after this character
+            for to_mode in range(len(modes)):
+                for from_mode in range(len(modes)):
+                    if cur_modes[from_mode] is None:
+                        continue
+                    cost = (cur_costs[from_mode] + 5) // 6 * 6 + head_costs[to_mode]
+                    if cur_modes[to_mode] is None or cost < cur_costs[to_mode]:
+                        cur_costs[to_mode] = cost
+                        cur_modes[to_mode] = from_mode
+
+            char_modes.append(cur_modes)
+            prev_costs = cur_costs
+
+        if not text:
+            return []
+
+        # walk back from the cheapest final mode
+        mode = min(range(len(modes)), key=lambda m: prev_costs[m])
+        char_mode_ids = [0] * len(text)
+        for i in range(len(text) - 1, -1, -1):
+            mode = char_modes[i][mode]
+            char_mode_ids[i] = mode
+
+        segments: List[Segment] = []
+        start = 0
+        for i in range(1, len(text) + 1):
+            if i == len(text) or char_mode_ids[i] != char_mode_ids[start]:
+                segments.append(Segment(modes[char_mode_ids[start]], text[start:i]))
+                start = i
+        return segments
+
+    @classmethod
+    def get_encoding_mode(cls, text: str) -> Mode:
         if text.isdigit():
             return Mode.NUMERIC
 
-        for ch in text:
-            if ch not in ALPHANUMERIC_CHARS:
-                return Mode.BYTE
+        if all(ch in ALPHANUMERIC_CHARS for ch in text):
+            return Mode.ALPHANUMERIC
+
+        # latin-1 text fits byte mode, even where Shift JIS has the same characters
+        if all(ord(ch) <= 0xFF for ch in text):
+            return Mode.BYTE
+
+        kanji_table = cls.get_kanji_table()
+        if all(ch in kanji_table for ch in text):
+            return Mode.KANJI
+
+        return Mode.BYTE
 
-        return Mode.ALPHANUMERIC
+    @classmethod
+    def _encode_alphanumeric_pairs(cls, text: str) -> List[str]:
+        return [
+            cls._to_binary(value, width)
+            for value, width in cls._alphanumeric_codes(text)
+        ]
 
     @staticmethod
-    def _encode_alphanumeric_pairs(text: str) -> List[str]:
-        encs = []
+    def _alphanumeric_codes(text: str) -> Iterator[Tuple[int, int]]:
         for i in range(0, len(text), 2):
             if i + 1 < len(text):
                 pair = AlphanumericPair(text[i], text[i + 1])
             else:
                 pair = AlphanumericPair(text[i], "")
 
-            encs.append(pair.encode())
-        return encs
+            yield pair.get_pair_value(), pair.get_width()
 
-    @staticmethod
-    def _encode_bytes(text: str) -> List[str]:
+    @classmethod
+    def _encode_bytes(cls, text: str) -> List[str]:
         """
         Convert the bytes into an 8-bit binary string.
         Pad on the left with 0s if necessary to make each one 8-bits long.
         """
-        return [format(ord(char), "08b") for char in text]
+        utf8 = any(ord(ch) > 0xFF for ch in text)
+        return [
+            cls._to_binary(value, width) for value, width in cls._byte_codes(text, utf8)
+        ]
+
+    @staticmethod
+    def _byte_codes(text: str, utf8: bool = False) -> Iterator[Tuple[int, int]]:
+        return ((byte, 8) for byte in text.encode("utf-8" if utf8 else "latin-1"))
 
     @staticmethod
-    def _encode_numeric(text: str) -> List[str]:
+    @cache
+    def get_kanji_table() -> Dict[str, int]:
+        """
+        Every double byte Shift JIS character in the kanji mode ranges 0x8140-0x9FFC and 0xE040-0xEBBF, mapped to its
+        13 bit code: subtract 0x8140 or 0xC140, then multiply the most significant byte by 0xC0 and add the least
+        significant byte. The codec only runs while building the table.
+        https://www.thonky.com/qr-code-tutorial/kanji-mode-encoding
+
+        :return: Dictionary of character to 13 bit kanji code
+        """
+        table: Dict[str, int] = {}
+        for first, offset in ((range(0x81, 0xA0), 0x8140), (range(0xE0, 0xEC), 0xC140)):
+            for lead in first:
+                for trail in range(0x40, 0xFD):
+                    try:
+                        ch = bytes([lead, trail]).decode("shift_jis")
+                    except UnicodeDecodeError:
+                        continue
+                    if len(ch) != 1 or ch.encode("shift_jis") != bytes([lead, trail]):
+                        continue
+                    value = (lead << 8 | trail) - offset
+                    table[ch] = (value >> 8) * 0xC0 + (value & 0xFF)
+        return table
+
+    @classmethod
+    def _kanji_codes(cls, text: str) -> Iterator[Tuple[int, int]]:
+        kanji_table = cls.get_kanji_table()
+        return ((kanji_table[char], 13) for char in text)
+
+    @classmethod
+    def _encode_numeric(cls, text: str) -> List[str]:
         """
         Convert the bytes into an 8-bit binary string.
         Pad on the left with 0s if necessary to make each one 8-bits long.
         """
-        enc = []
+        return [
+            cls._to_binary(value, width) for value, width in cls._numeric_codes(text)
+        ]
+
+    @staticmethod
+    def _numeric_codes(text: str) -> Iterator[Tuple[int, int]]:
         splits = [text[i : i + 3] for i in range(0, len(text), 3)]
         for s in splits:
-            fmt = ""
+            width = 0
             # If the final group consists of only two digits, you should convert it to 7 binary bits, and if the
             # final group consists of only one digit, you should convert it to 4 binary bits.
 
             if len(s) == 3:
-                fmt = format(int(s), "010b")
+                width = 10
             elif len(s) == 2:
-                fmt = format(int(s), "07b")
+                width = 7
             elif len(s) == 1:
-                fmt = format(int(s), "04b")
+                width = 4
 
-            # If a group starts with a zero, it should be interpreted as a two-digit number and you should convert it
-            # to 7 binary bits, and if there are two zeroes at the beginning of a group, it should be interpreted as
-            # a one-digit number and you should convert it to 4 binary bits.
+            # Leading zeros do not shorten a group, the decoder derives the number of digits from the width alone.
 
-            if s[:1] == "00":
-                fmt = format(int(s), "04b")
-            elif s[0] == "0":
-                fmt = format(int(s), "07b")
+            yield int(s), width
 
-            enc.append(fmt)
-        return enc
+    @classmethod
+    def _get_character_count_indicator(cls, text: str, ecc: str, mode: Mode):
+        width = cls._get_character_count_width(text, ecc, mode)
+        return "{0:b}".format(len(text)).rjust(width, "0")
 
-    @staticmethod
-    def _get_character_count_indicator(text: str, ecc: str, mode: Mode):
+    @classmethod
+    def _get_character_count_width(cls, text: str, ecc: str, mode: Mode) -> int:
         version = choose_qr_version(len(text), ecc, mode)
+        return cls.get_character_count_width(version, mode)
+
+    @staticmethod
+    def get_character_count_width(version: int, mode: Mode) -> int:
         width = 0
         if 1 <= version <= 9:
             match mode:
@@ -223,6 +494,8 @@ class DataEncoder:
                     width = 9
                 case Mode.BYTE:
                     width = 8
+                case Mode.KANJI:
+                    width = 8
         elif 10 <= version <= 26:
             match mode:
                 case Mode.NUMERIC:
@@ -231,6 +504,8 @@ class DataEncoder:
                     width = 11
                 case Mode.BYTE:
                     width = 16
+                case Mode.KANJI:
+                    width = 10
         elif 27 <= version:
             match mode:
                 case Mode.NUMERIC:
@@ -239,32 +514,34 @@ class DataEncoder:
                     width = 13
                 case Mode.BYTE:
                     width = 16
-        return "{0:b}".format(len(text)).rjust(width, "0")
+                case Mode.KANJI:
+                    width = 12
+        return width
 
     @staticmethod
-    def _pad_terminator_zeros(encoded_string: str) -> str:
-        rem = len(encoded_string) % 8
-        return "0" * min(rem, 4)
+    def _pad_terminator_zeros(buffer: BitBuffer, required_length: int):
+        buffer.append(0, max(0, min(required_length - len(buffer), 4)))
 
     @staticmethod
-    def _pad_to_modulus_eight(encoded_string: str) -> str:
-        remaining_slots_to_modulus_eight = len(encoded_string) % 8
+    def _pad_to_modulus_eight(buffer: BitBuffer):
+        remaining_slots_to_modulus_eight = len(buffer) % 8
         if remaining_slots_to_modulus_eight > 0:
             # we need to invert the remainer to get amount of zeros required to fill
             remaining_slots_to_modulus_eight = 8 - remaining_slots_to_modulus_eight
 
-        return "0" * remaining_slots_to_modulus_eight
+        buffer.append(0, remaining_slots_to_modulus_eight)
 
     @staticmethod
-    def _pad_remaining_bytes(encoded_string: str, required_length: int) -> str:
+    def _pad_remaining_bytes(buffer: BitBuffer, required_length: int):
         """
         Alternate between adding 0xEC (11101100) and 0x11 (00010001) to the end of the encoded data until it reaches
         the required length.
         """
-        remaining_zero_slots = (required_length - len(encoded_string)) // 8
-        for r in range(remaining_zero_slots):
-            encoded_string += "11101100" if r % 2 == 0 else "00010001"
-        return encoded_string
+        remaining_zero_slots = (required_length - len(buffer)) // 8
+        if remaining_zero_slots > 0:
+            buffer.append_bytes(
+                bytes([0xEC, 0x11] * remaining_zero_slots)[:remaining_zero_slots]
+            )
 
     @staticmethod
     def get_8bit_binary_numbers(encoded_string: str) -> List[int]:
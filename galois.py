@@ -19,6 +19,26 @@ class GaloisField:
         exps = GaloisField.get_exponents_table()
         return {value: exp for exp, value in exps.items()}
 
+    @staticmethod
+    @cache
+    def get_flat_exponents_table() -> bytes:
+        """
+        Exponents as a flat byte table. It is doubled to 510 entries so the sum of two logs can index it directly
+        without a modulo 255.
+        """
+        exps = GaloisField.get_exponents_table()
+        return bytes(exps[exp % 255] for exp in range(510))
+
+    @staticmethod
+    @cache
+    def get_flat_log_table() -> bytes:
+        """
+        Logs as a flat byte table indexed by value. The log of 0 is undefined and stored as 0, same as `get_log`, so
+        callers have to handle a 0 operand themselves.
+        """
+        log = GaloisField.get_log_table()
+        return bytes(log.get(value, 0) for value in range(256))
+
     @staticmethod
     def multiply(a: int, b: int) -> int:
         if a == 0 or b == 0:
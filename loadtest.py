@@ -0,0 +1,136 @@
+"""
+Load test for the local rendering service, using keep-alive connections from a single event loop.
+
+    python -m serve --port 8000 &
+    python loadtest.py --port 8000 --requests 5000 --concurrency 64 --distinct 100
+
+`--distinct` controls how many different payloads are requested, a small number exercises the single-flight path,
+a large one the process pool. With `--spawn` the script starts and stops the server itself.
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import List, Tuple
+from urllib.parse import urlencode
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, target: str
+) -> int:
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(
+    host: str, port: int, targets: List[str], results: List[Tuple[int, float]]
+):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            start = time.perf_counter()
+            status = await _request(reader, writer, host, target)
+            results.append((status, time.perf_counter() - start))
+    finally:
+        writer.close()
+
+
+async def run(
+    host: str,
+    port: int,
+    requests: int,
+    concurrency: int,
+    distinct: int,
+    image_format: str,
+):
+    targets = [
+        "/qr?"
+        + urlencode(
+            {"data": f"https://example.com/item/{i % distinct}", "format": image_format}
+        )
+        for i in range(requests)
+    ]
+    results: List[Tuple[int, float]] = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(host, port, targets[i::concurrency], results)
+            for i in range(concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = Counter(status for status, _ in results)
+    print(
+        f"{len(results)} requests in {elapsed:.2f}s, {len(results) / elapsed:.0f} req/s"
+    )
+    for percentile in (50, 95, 99):
+        index = min(len(latencies) - 1, len(latencies) * percentile // 100)
+        print(f"p{percentile}: {latencies[index] * 1000:.1f} ms")
+    print("status:", dict(statuses))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the local QR service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=100)
+    parser.add_argument("--format", default="png", choices=("png", "svg"))
+    parser.add_argument(
+        "--spawn", action="store_true", help="start the server for the test"
+    )
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "serve",
+                "--host",
+                args.host,
+                "--port",
+                str(args.port),
+            ],
+            stdout=subprocess.PIPE,
+        )
+        # the server prints its address once it listens
+        server.stdout.readline()
+
+    try:
+        asyncio.run(
+            run(
+                args.host,
+                args.port,
+                args.requests,
+                args.concurrency,
+                args.distinct,
+                args.format,
+            )
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+from blocks import BlockLayout
+from const import InvalidVersionNumber, Mode
+from encoder import DataEncoder, Segment
+from util import choose_qr_version_by_bits
+
+
+class EncodePlan(NamedTuple):
+    """
+    Everything decided about a payload before any bit is written: the segments and their modes, the version, the
+    error correction level and its block layout. The text is analysed once in `create`, and the plan is passed on to
+    `DataEncoder.encode_plan`, `encode_data_bits` and `QrCode`, so callers can precompute plans and reuse them.
+
+    :param data: The data to be encoded
+    :param ecc: Error Correction Code
+    :param version: QR code version
+    :param segments: Segments from `DataEncoder.get_segments` for the version
+    :param bit_length: Number of bits of the segments before the terminator and padding
+    :param layout: Block layout of the version and error correction level
+    """
+
+    data: str
+    ecc: str
+    version: int
+    segments: Tuple[Segment, ...]
+    bit_length: int
+    layout: BlockLayout
+
+    @classmethod
+    def create(
+        cls, data: str, ecc: str = "H", version: Optional[int] = None
+    ) -> "EncodePlan":
+        """
+        :param data: The data to be encoded
+        :param ecc: Error Correction Code
+        :param version: Force a version instead of choosing the smallest one that fits
+        :return: The plan
+        """
+        if not data:
+            raise InvalidVersionNumber(None)
+
+        if version is None:
+            # segmented once per count indicator range, the last range tried is the one of the chosen version
+            tried: List[Tuple[List[Segment], int]] = []
+
+            def get_bit_length(range_start: int) -> int:
+                segments = DataEncoder.get_segments(data, range_start)
+                tried.append(
+                    (segments, DataEncoder.get_bit_length(segments, range_start))
+                )
+                return tried[-1][1]
+
+            version = choose_qr_version_by_bits(get_bit_length, ecc)
+            if version is None:
+                raise InvalidVersionNumber(None)
+            segments, bit_length = tried[-1]
+            layout = BlockLayout.get(version, ecc)
+        else:
+            layout = BlockLayout.get(version, ecc)
+            segments = DataEncoder.get_segments(data, version)
+            bit_length = DataEncoder.get_bit_length(segments, version)
+            if bit_length > layout.data_codewords * 8:
+                raise InvalidVersionNumber(version)
+
+        return cls(data, ecc, version, tuple(segments), bit_length, layout)
+
+    @property
+    def modes(self) -> Tuple[Mode, ...]:
+        return tuple(segment.mode for segment in self.segments)
+
+    @property
+    def data_bits(self) -> int:
+        """
+        :return: Number of data bits of the version and error correction level, including the padding
+        """
+        return self.layout.data_codewords * 8
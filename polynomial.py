@@ -1,5 +1,7 @@
-from copy import copy
-from typing import List
+from functools import cache
+from typing import List, Tuple
+
+import numpy as np
 
 from const import GENERATOR_POLYNOMIALS
 from galois import GaloisField
@@ -10,6 +12,7 @@ class GeneratorPolynomial:
         if degree not in GENERATOR_POLYNOMIALS:
             raise ValueError(f"No generator polynomial available for degree {degree}")
         self.polynomial = GENERATOR_POLYNOMIALS[degree]
+        self.degree = degree
 
     def __eq__(self, other: List[int] | "GeneratorPolynomial"):
         return other == self.polynomial
@@ -17,42 +20,154 @@ class GeneratorPolynomial:
     def __truediv__(self, message: List[int]) -> List[int]:
         return self.divide(message)
 
-    def divide(self, message: List[int]) -> List[int]:
+    @staticmethod
+    @cache
+    def get_product_table(degree: int) -> bytes:
+        """
+        The generator polynomial multiplied by every possible lead term, like the feedback network of a hardware
+        LFSR encoder. Row `lead` holds the `degree` non-leading coefficients of lead * g(x), flattened into a
+        256 * degree byte table. The row of a 0 lead term is all zeros, there is nothing to cancel.
+
+        :param degree: Degree of the generator polynomial
+        :return: Flat 256 * degree product table
+        """
+        exps = GaloisField.get_flat_exponents_table()
+        log = GaloisField.get_flat_log_table()
+        generator = GENERATOR_POLYNOMIALS[degree][1:]
+
+        # the flat log table stores 0 for a lead term of 0, which would give it the row of 1. Its row stays all zeros
+        table = bytearray(256 * degree)
+        for lead in range(1, 256):
+            lead_log = log[lead]
+            table[lead * degree : (lead + 1) * degree] = bytes(
+                exps[alpha + lead_log] for alpha in generator
+            )
+        return bytes(table)
+
+    @staticmethod
+    @cache
+    def get_register_table(degree: int) -> Tuple[int, ...]:
+        """
+        Rows of `get_product_table` packed into ints, so a whole row can be xor'ed into the register at once.
+        """
+        table = GeneratorPolynomial.get_product_table(degree)
+        return tuple(
+            int.from_bytes(table[lead * degree : (lead + 1) * degree], "big")
+            for lead in range(256)
+        )
+
+    def divide(self, message: List[int] | bytes) -> List[int]:
         """
         Divides the generator polynomial by the message polynomial
         in Galois Field arithmetic to get the remainder, which is
         the error correction code.
 
+        The remainder is kept in a shift register of `degree` bytes. Every message byte is combined with the
+        outgoing register byte and the matching product table row is xor'ed into the shifted register.
+
         :param message: The message polynomial coefficients
         :return: The remainder polynomial coefficients (error correction code)
         """
-        steps = len(message)
-        for step in range(steps):
-            gen_polys = copy(self.polynomial)
-            lead_term_log = GaloisField.get_log(message[0])
+        rows = self.get_register_table(self.degree)
+        shift = 8 * (self.degree - 1)
+        mask = (1 << (8 * self.degree)) - 1
+
+        register = 0
+        for term in bytearray(message):
+            register = ((register << 8) & mask) ^ rows[term ^ (register >> shift)]
 
-            # add the exponents and the alphas together. if > 255, then modulo 255
-            for i in range(len(gen_polys)):
-                gen_polys[i] += lead_term_log
-                if gen_polys[i] >= 255:
-                    gen_polys[i] %= 255
+        return list(register.to_bytes(self.degree, "big"))
 
-            # convert all the generator polynomials into their exponent form
-            for i in range(len(gen_polys)):
-                gen_polys[i] = GaloisField.get_exp(gen_polys[i])
+    def divide_many(self, messages: np.ndarray) -> np.ndarray:
+        """
+        Same as `divide`, for every row of a 2D array at once. The register of every row is updated per message
+        column, gathering the product table rows of all lead terms in one lookup.
+
+        :param messages: (N, L) uint8 array of message polynomials of the same length
+        :return: (N, degree) uint8 array of remainders
+        """
+        table = np.frombuffer(self.get_product_table(self.degree), dtype=np.uint8)
+        table = table.reshape(256, self.degree)
 
-            # extend message polynomial to the correct error correction code length if req.
-            if len(message) < len(gen_polys):
-                message.extend([0] * (len(gen_polys) - len(message)))
+        messages = np.asarray(messages, dtype=np.uint8)
+        register = np.zeros((len(messages), self.degree), dtype=np.uint8)
+        for column in messages.T:
+            lead = column ^ register[:, 0]
+            register[:, :-1] = register[:, 1:]
+            register[:, -1] = 0
+            register ^= table[lead]
 
-            # xor the ith generator polynomial and message polynomial values
-            for i in range(len(message)):
-                if i < len(gen_polys):
-                    message[i] ^= gen_polys[i]
-                else:
-                    message[i] ^= 0
+        return register
+
+
+class IncrementalEncoder:
+    """
+    Reed-Solomon parity is linear over GF(256): parity(a ^ b) = parity(a) ^ parity(b). For messages which share a
+    template and only differ in a few codewords, the parity of a cached base message is updated by xor'ing in the
+    contribution of every changed codeword, instead of dividing the whole message again. Changing k codewords costs
+    k int xors on the packed parity.
+
+    :param degree: Degree of the generator polynomial, i.e. number of error correction codewords
+    :param base: Base message polynomial coefficients, every later message must have the same length
+    """
+
+    def __init__(self, degree: int, base: List[int] | bytes):
+        self.degree = degree
+        self._base = bytes(base)
+        self._base_value = int.from_bytes(self._base, "big")
+        generator = GeneratorPolynomial(degree)
+        self._parity = int.from_bytes(bytes(generator.divide(self._base)), "big")
+
+    @staticmethod
+    @cache
+    def get_contributions(degree: int, distance: int) -> Tuple[int, ...]:
+        """
+        Parity of a single non-zero codeword `distance` positions before the end of an otherwise zero message. The
+        contribution only depends on the distance from the end, not on the message length. Every codeword further
+        from the end is one more shift of the LFSR register with a zero input.
+
+        :param degree: Degree of the generator polynomial
+        :param distance: Number of codewords after the changed one
+        :return: Packed parity of every codeword value at that distance, indexed by the value
+        """
+        rows = GeneratorPolynomial.get_register_table(degree)
+        if distance == 0:
+            return rows
+
+        shift = 8 * (degree - 1)
+        mask = (1 << (8 * degree)) - 1
+        previous = IncrementalEncoder.get_contributions(degree, distance - 1)
+        # the parity of a value is linear in it, shift the 8 single bit values and combine the rest from them
+        basis = []
+        for bit in range(8):
+            register = previous[1 << bit]
+            basis.append(((register << 8) & mask) ^ rows[register >> shift])
+
+        contributions = [0] * 256
+        for value in range(1, 256):
+            low = value & -value
+            contributions[value] = (
+                contributions[value ^ low] ^ basis[low.bit_length() - 1]
+            )
+        return tuple(contributions)
+
+    def encode(self, message: List[int] | bytes) -> List[int]:
+        """
+        :param message: Message polynomial coefficients, same length as the base message
+        :return: The remainder polynomial coefficients (error correction code), same as `GeneratorPolynomial.divide`
+        """
+        message = bytes(message)
+        if len(message) != len(self._base):
+            raise ValueError(
+                f"Message length {len(message)} does not match the base length {len(self._base)}"
+            )
 
-            # trim the leading 0
-            message = message[1:]
+        parity = self._parity
+        changed = int.from_bytes(message, "big") ^ self._base_value
+        while changed:
+            distance = ((changed & -changed).bit_length() - 1) >> 3
+            delta = (changed >> (8 * distance)) & 0xFF
+            changed ^= delta << (8 * distance)
+            parity ^= self.get_contributions(self.degree, distance)[delta]
 
-        return message
+        return list(parity.to_bytes(self.degree, "big"))
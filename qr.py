@@ -1,29 +1,40 @@
-import math
+import io
+from collections import deque
+from functools import cache
 from pathlib import Path
-from typing import Tuple, List
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Tuple,
+    List,
+    Optional,
+    TextIO,
+)
 
-import matplotlib.pyplot as plt
 import numpy as np
-from PIL import Image
 
+from bitbuffer import BitBuffer
 from const import (
     FORMAT_STRINGS,
     ALIGNMENT_PATTERN_LOCATIONS,
+    GENERATOR_POLYNOMIALS,
     REMAINING_BITS,
-    get_ec_codewords_per_block,
+    VERSION_TABLE,
+    InvalidVersionNumber,
 )
 from encoder import DataEncoder
+from plan import EncodePlan
 from polynomial import GeneratorPolynomial
+from render import get_image_format, render_image, save_image, show_matrix
 from util import choose_qr_version
+from vector import write_eps, write_svg
 
-
-class InvalidVersionNumber(Exception):
-    """
-    This class represents an exception that is raised when an invalid version number is encountered.
-
-    """
-
-    pass
+if TYPE_CHECKING:
+    from diskcache import DiskCache
 
 
 class InvalidMaskPatternId(Exception):
@@ -31,31 +42,230 @@ class InvalidMaskPatternId(Exception):
 
 
 def encode_data(data: str, ecc: str = "H") -> str:
-    encoding_mode = DataEncoder.get_encoding_mode(data)
-    version = choose_qr_version(len(data), ecc, encoding_mode)
+    """
+    String based counterpart of `encode_data_bits`, kept for compatibility.
+    """
+    return encode_data_bits(data, ecc).to_bitstring()
 
-    enc = DataEncoder.encode(data, version, ecc)
-    per_block = get_ec_codewords_per_block(version, ecc)
-    poly = GeneratorPolynomial(per_block).divide(
-        DataEncoder.get_8bit_binary_numbers(enc)
-    )
-    data = (
-        enc
-        + "".join(DataEncoder.get_8bit_binary_numbers_from_list(poly))
-        + "0" * REMAINING_BITS.get(version)
-    )
-    return data
+
+def encode_data_bits(
+    data: str, ecc: str = "H", plan: Optional[EncodePlan] = None
+) -> BitBuffer:
+    """
+    Encode the data codewords, add the error correction codewords of every block, interleave the blocks and append
+    the remainder bits.
+
+    :param data: The data to be encoded
+    :param ecc: Error Correction Code
+    :param plan: Precomputed plan of the data, created when missing
+    :return: Final bit stream to be placed in the matrix
+    """
+    if plan is None:
+        plan = EncodePlan.create(data, ecc)
+
+    data_codewords = DataEncoder.encode_plan(plan).to_bytes()
+    codewords = plan.layout.encode(np.frombuffer(data_codewords, np.uint8))
+
+    buffer = BitBuffer()
+    buffer.append_bytes(codewords.tobytes())
+    buffer.append(0, REMAINING_BITS.get(plan.version))
+    return buffer
 
 
-def make(data: str, ecc: str):
-    qr = QrCode(data, ecc)
+def get_output_suffix(
+    path: Path | str | BinaryIO, image_format: Optional[str] = None
+) -> str:
+    """
+    :param path: Path or binary file object
+    :param image_format: Suffix of the format, e.g. `.svg`, used instead of the suffix of the path
+    :return: Lower case suffix, of the path or the file name of the file object unless given, empty when there is none
+    """
+    if image_format:
+        return image_format.lower()
+    name = path if isinstance(path, (str, Path)) else getattr(path, "name", "")
+    return Path(name).suffix.lower() if isinstance(name, (str, Path)) else ""
+
+
+def save_matrix(
+    dark: np.ndarray,
+    path: Path | str | BinaryIO,
+    scale=10,
+    bg_color=(255, 255, 255),
+    data_color=(0, 0, 0),
+    border: int = 4,
+    compress_level: int = 6,
+    image_format: Optional[str] = None,
+):
+    """
+    Write a final matrix, e.g. one kept by a `SymbolCache`, without going through a `QrCode`. Paths ending in `.svg`
+    or `.eps` are written as vector graphics, anything else as a raster image.
+
+    :param dark: (N, N) boolean array, True for dark modules
+    :param path: Path or binary file object to write to, the format is inferred from the suffix of the path or the
+                 file name of the file object
+    :param scale: Pixels per module
+    :param bg_color: RGB colour of the light modules and the quiet zone
+    :param data_color: RGB colour of the dark modules
+    :param border: Width of the quiet zone in modules
+    :param compress_level: PNG zlib compression level between 0-9, lower is faster and bigger
+    :param image_format: Suffix of the format, e.g. `.svg`, required for file objects without a file name
+    """
+    suffix = get_output_suffix(path, image_format)
+    if not isinstance(path, (str, Path)):
+        path.write(
+            render_bytes(
+                dark, suffix, scale, bg_color, data_color, border, compress_level
+            )
+        )
+        return
+
+    if suffix in (".svg", ".eps"):
+        writer = write_svg if suffix == ".svg" else write_eps
+        with open(path, "w", encoding="utf-8") as fp:
+            writer(dark, fp, scale, border, bg_color, data_color)
+        return
+
+    img = render_image(dark, scale, border, bg_color, data_color)
+    save_image(img, path, get_image_format(suffix), compress_level)
+
+
+def render_bytes(
+    dark: np.ndarray,
+    suffix: str = ".png",
+    scale=10,
+    bg_color=(255, 255, 255),
+    data_color=(0, 0, 0),
+    border: int = 4,
+    compress_level: int = 6,
+) -> bytes:
+    """
+    In-memory counterpart of `save_matrix`, for callers which write or send the output themselves.
+
+    :param dark: (N, N) boolean array, True for dark modules
+    :param suffix: File suffix of the format, e.g. `.png` or `.svg`
+    :param scale: Pixels per module
+    :param bg_color: RGB colour of the light modules and the quiet zone
+    :param data_color: RGB colour of the dark modules
+    :param border: Width of the quiet zone in modules
+    :param compress_level: PNG zlib compression level between 0-9, lower is faster and bigger
+    :return: Encoded file contents
+    """
+    suffix = suffix.lower()
+    if suffix in (".svg", ".eps"):
+        writer = write_svg if suffix == ".svg" else write_eps
+        text = io.StringIO()
+        writer(dark, text, scale, border, bg_color, data_color)
+        return text.getvalue().encode("utf-8")
+
+    image_format = get_image_format(suffix)
+    if image_format is None:
+        raise ValueError(f"unknown file extension {suffix!r}")
+    fp = io.BytesIO()
+    img = render_image(dark, scale, border, bg_color, data_color)
+    save_image(img, fp, image_format, compress_level)
+    return fp.getvalue()
+
+
+def make(data: str, ecc: str, plan: Optional[EncodePlan] = None):
+    if plan is None:
+        plan = EncodePlan.create(data, ecc)
+
+    qr = QrCode(data, ecc, plan=plan)
     qr.add_static_patterns()
-    qr.add_encoded_data(encode_data(data, ecc))
+    qr.add_encoded_data(encode_data_bits(data, ecc, plan))
     qr.add_dark_module()
 
     return qr
 
 
+def make_many(
+    items: Iterable[str | Tuple[str, str]],
+    ecc: str = "H",
+    workers: int = 0,
+    chunksize: int = 256,
+    with_index: bool = False,
+) -> Iterator["QrCode | Tuple[int, QrCode]"]:
+    """
+    Make a QR code for every item, streaming the results back in input order.
+
+    The input is consumed lazily in chunks. With `workers` the chunks are spread over a process pool whose workers
+    warm the per-version templates, placement indexes and Reed-Solomon tables once at start-up.
+
+    :param items: Data to encode, or (data, ecc) tuples to override the error correction level per item
+    :param ecc: Error Correction Code used for plain data items
+    :param workers: Number of worker processes, 0 makes every symbol in the current process
+    :param chunksize: Number of items sent to a worker at once
+    :param with_index: Yield (index, qr) tuples instead of just the QR codes
+    :return: Generator of QR codes in input order
+    """
+    chunks = _chunk_items(items, ecc, chunksize)
+    if workers:
+        results = _make_chunks_in_pool(chunks, workers)
+    else:
+        results = map(_make_chunk, chunks)
+
+    for chunk in results:
+        for index, qr in chunk:
+            yield (index, qr) if with_index else qr
+
+
+def warm_caches(versions: Iterable[int] = range(1, 41)):
+    """
+    Build the per-version templates, placement indexes and mask patterns and every Reed-Solomon table up front.
+
+    :param versions: Versions to warm, defaults to all of them
+    """
+    for version in versions:
+        PatternTemplates.get(version)
+        PlacementIndex.get(version)
+        MaskEngine.get_masks(version)
+    for degree in GENERATOR_POLYNOMIALS:
+        GeneratorPolynomial.get_register_table(degree)
+
+
+def _chunk_items(
+    items: Iterable[str | Tuple[str, str]], ecc: str, chunksize: int
+) -> Iterator[List[Tuple[int, str, str]]]:
+    chunk = []
+    for index, item in enumerate(items):
+        data, item_ecc = item if isinstance(item, tuple) else (item, ecc)
+        chunk.append((index, data, item_ecc))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _make_chunk(chunk: List[Tuple[int, str, str]]) -> List[Tuple[int, "QrCode"]]:
+    return [(index, make(data, item_ecc)) for index, data, item_ecc in chunk]
+
+
+def _make_chunks_in_pool(
+    chunks: Iterator[List], workers: int, func: Callable[[List], List] = _make_chunk
+) -> Iterator[List]:
+    """
+    Keep at most two chunks per worker in flight, so memory stays bounded for unbounded input.
+    Chunks which have not started yet are cancelled when the consumer stops early.
+
+    :param func: Picklable function run on every chunk, `_make_chunk` by default
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_caches) as pool:
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(func, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
 class QrCode:
     """
     Constructor for the QrCode class
@@ -63,6 +273,7 @@ class QrCode:
     :param data: The data to be encoded in QR code
     :param ecc: The error correction level to be used. Default value is "H"
                  ("H" - High, "Q" - Quality, "M" - Medium, "L" - Low)
+    :param version: Force a specific version instead of choosing the smallest one that fits the data
     """
 
     MAX_VERSION = 40  # REF 1
@@ -74,12 +285,21 @@ class QrCode:
     EMPTY_MODULE = 1
     WHITE_MODULE = 2
 
-    def __init__(self, data: str, ecc: str = "H"):
+    def __init__(
+        self,
+        data: str,
+        ecc: str = "H",
+        version: Optional[int] = None,
+        plan: Optional[EncodePlan] = None,
+    ):
         self._rawdata = data
-        self._encoding_mode = DataEncoder.get_encoding_mode(data)
-        self._version = choose_qr_version(len(data), ecc, self._encoding_mode)
+        if plan is None and version is None:
+            plan = EncodePlan.create(data, ecc)
+        if plan is not None:
+            version = plan.version
+        self.plan = plan
+        self._version = version
         self._modules = self.get_module_size()
-        self._dataset = set()
         self.matrix = [
             [self.EMPTY_MODULE] * self._modules for _ in range(self._modules)
         ]
@@ -103,7 +323,17 @@ class QrCode:
 
     def add_static_patterns(self):
         """
-        Helper function to add all of the static patterns required by the QR code to function properly
+        Helper function to add all of the static patterns required by the QR code to function properly.
+        The patterns only depend on the version, so they are copied from the cached `PatternTemplates`.
+        """
+        template, function_mask = PatternTemplates.get(self._version)
+        matrix = np.asarray(self.matrix, dtype=np.uint8)
+        np.copyto(matrix, template, where=function_mask)
+        self.matrix = matrix.tolist()
+
+    def draw_static_patterns(self):
+        """
+        Draw all of the static patterns module by module. Used to build the `PatternTemplates`.
         """
         self.add_finder_patterns()
         self.add_separators()
@@ -111,6 +341,7 @@ class QrCode:
         self.add_reserve_modules()
         self.add_timing_patterns()
         self.add_dark_module()
+        self.add_version_information()
 
     def add_finder_patterns(self):
         """
@@ -296,93 +527,57 @@ class QrCode:
         r, c = ((self.MODULES_INCREMENT * self._version) + 9, 8)
         self.matrix[r][c] = self.BLACK_MODULE
 
-    def add_encoded_data(self, encoded_string: str):
+    def add_version_information(self):
         """
-        Start at bottom left and zig zag data into matrix
-        :param encoded_string:
-        :return:
+        Versions 7 and up carry two copies of the 18 bit version string, a 6x3 block above the bottom-left finder
+        pattern and its transpose left of the top-right finder pattern. The least significant bit goes closest to the
+        top-left corner.
         """
+        version_string = VERSION_TABLE.get(self._version)
+        if version_string is None:
+            return
 
-        ORDER_UP, ORDER_DOWN = 1, -1
-        ROWS, COLS = len(self.matrix[0]), len(self.matrix)
-        # start at the bottom left of the matrix
-        r, c = ROWS - 1, COLS - 1
-        # order dictates the current direction of module swaps
-        order: int = ORDER_UP
-        # switch row is triggered when two modules have been swapped on the current row
-        switch_row = False
-        for i, ch in enumerate(encoded_string):
-            module = self.WHITE_MODULE if ch == "0" else self.BLACK_MODULE
-            self.matrix[r][c] = module
-            self._dataset.add((r, c))
-
-            try:
-                while self._is_module_filled(r, c):
-                    # change pixel positions for next column and row
-                    if order == ORDER_UP:
-                        match switch_row:
-                            case True:
-                                switch_row = False
-                                r -= 1
-                                c += 1
-                            case False:
-                                switch_row = True
-                                c -= 1
-                    elif order == ORDER_DOWN:
-                        match switch_row:
-                            case True:
-                                switch_row = False
-                                r += 1
-                                c += 1
-                            case False:
-                                switch_row = True
-                                c -= 1
-
-                    # check if out of bounds
-                    if r < 0:
-                        order = ORDER_DOWN
-                        switch_row = False
-                        r = 0
-                        c -= 2
-                    elif r >= ROWS:
-                        order = ORDER_UP
-                        switch_row = False
-                        r = ROWS - 1
-                        c -= 2
-
-                    # fixes the issue of modules being upside down when touching the vertical timing line
-                    if self._is_on_veritcal_timing(r, c):
-                        c -= 1
-
-            except IndexError:
-                break
+        for i, bit in enumerate(reversed(version_string)):
+            pixel = self.BLACK_MODULE if bit == "1" else self.WHITE_MODULE
+            a, b = len(self.matrix) - 11 + i % 3, i // 3
+            self.matrix[b][a] = pixel
+            self.matrix[a][b] = pixel
+
+    def add_encoded_data(self, encoded_string: BitBuffer | str):
+        """
+        Start at bottom left and zig zag data into matrix. The zig zag path only depends on the version, so the
+        bits are placed with a single assignment through the cached `PlacementIndex`.
+        :param encoded_string: Bit stream, a string of '0' and '1' characters is also accepted
+        :return:
+        """
+        if isinstance(encoded_string, BitBuffer):
+            packed = np.frombuffer(encoded_string.to_bytes(), dtype=np.uint8)
+            bits = np.unpackbits(packed)[: len(encoded_string)].astype(bool)
+        else:
+            bits = np.frombuffer(encoded_string.encode("ascii"), dtype=np.uint8)
+            bits = bits != ord("0")
+        rows, cols = self.get_placement_index()
+        count = min(len(bits), len(rows))
+
+        matrix = np.asarray(self.matrix, dtype=np.uint8)
+        matrix[rows[:count], cols[:count]] = np.where(
+            bits[:count], self.BLACK_MODULE, self.WHITE_MODULE
+        )
+        self.matrix = matrix.tolist()
+
+    def get_placement_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Row and column index arrays of the data modules in placement order
+        """
+        return PlacementIndex.get(self._version)
 
     def apply_mask(self, pattern_id: int) -> List[List[int]]:
-        strategy = MaskStrategies().get(pattern_id)
-        if strategy is None:
+        if MaskStrategies().get(pattern_id) is None:
             raise InvalidMaskPatternId
 
-        # create a deep copy of inner matrix to allow for multiple mask attempts
-        masked = [row[:] for row in self.matrix]
-        for r, c in self._dataset:
-            if strategy(r, c):
-                masked[r][c] = (
-                    self.WHITE_MODULE
-                    if masked[r][c] is self.BLACK_MODULE
-                    else self.BLACK_MODULE
-                )
-
-        return masked
-
-    def _is_on_veritcal_timing(self, r, c) -> bool:
-        if r in range(
-            self.FINDER_OFFSET + 1, len(self.matrix) - self.FINDER_OFFSET - 1
-        ):
-            return c == self.FINDER_OFFSET - 1
-        return False
-
-    def _is_module_filled(self, r: int, c: int) -> bool:
-        return self.matrix[r][c] != self.EMPTY_MODULE
+        # the engine returns a new array, so the inner matrix is untouched for multiple mask attempts
+        matrix = np.asarray(self.matrix, dtype=np.uint8)
+        return MaskEngine.apply(matrix, self._version, pattern_id).tolist()
 
     def add_format_string(
         self, matrix: List[List[int]], ecc: str, mask_pattern_id: int
@@ -418,18 +613,15 @@ class QrCode:
         return matrix
 
     def find_best_mask(self, ecc: str) -> int:
-        evaluator = PenaltyEvaluator()
-        best_mask = -1
-        best_score = math.inf
+        candidates = MaskEngine.apply_all(
+            np.asarray(self.matrix, dtype=np.uint8), self._version
+        )
         for i in range(8):
-            temp_matrix = self.apply_mask(i)
-            temp_matrix = self.add_format_string(temp_matrix, ecc, i)
-            score = evaluator.evaluate(temp_matrix)
-            if score < best_score:
-                best_mask = i
-                best_score = score
+            self.add_format_string(candidates[i], ecc, i)
 
-        return best_mask
+        # argmin keeps the lowest pattern id on ties
+        scores = PenaltyEvaluator().evaluate_many(candidates)
+        return int(np.argmin(scores))
 
     def _generate_best_fit(self, ecc: str) -> List[List[int]]:
         """
@@ -440,19 +632,22 @@ class QrCode:
         :param ecc: Error Correction Code
         :return: New matrix object with best fit mask and format strings
         """
-        mask = self.find_best_mask(ecc)
-        matrix = self.apply_mask(mask)
-        matrix = self.add_format_string(matrix, ecc, mask)
-        return matrix
+        return self._generate_best_fit_array(ecc).tolist()
 
-    def draw(self, ecc: str = "H"):
-        matrix = self._generate_best_fit(ecc)
+    def _generate_best_fit_array(self, ecc: str) -> np.ndarray:
+        """
+        Array counterpart of `_generate_best_fit`.
 
-        # Visualize the data
-        plt.imshow(np.array(matrix), cmap="gray", vmin=0, vmax=2)
+        :param ecc: Error Correction Code
+        :return: New (N, N) uint8 matrix with best fit mask and format strings
+        """
+        mask = self.find_best_mask(ecc)
+        matrix = np.asarray(self.matrix, dtype=np.uint8)
+        matrix = MaskEngine.apply(matrix, self._version, mask)
+        return self.add_format_string(matrix, ecc, mask)
 
-        # Display the image
-        plt.show()
+    def draw(self, ecc: str = "H"):
+        show_matrix(self._generate_best_fit_array(ecc))
 
     def save(
         self,
@@ -461,23 +656,127 @@ class QrCode:
         bg_color=(255, 255, 255),
         data_color=(0, 0, 0),
         ecc: str = "H",
+        border: int = 4,
+        compress_level: int = 6,
+        cache: Optional["DiskCache"] = None,
+        image_format: Optional[str] = None,
     ):
-        matrix = self._generate_best_fit(ecc)
+        """
+        Render the QR code straight from the module array, every module becomes a `scale` x `scale` block with
+        hard edges. Paths ending in `.svg` or `.eps` are written as vector graphics instead.
+
+        With a `cache`, a symbol made from a plan is looked up by its payload and render options first, and new
+        outputs are stored in it. Symbols without a plan are never cached.
 
-        img = Image.new(mode="RGB", size=(len(matrix), len(matrix[0])), color=bg_color)
-        pixels = img.load()
+        :param path: Path or binary file object to write to, the format is inferred from the suffix of the path or the
+                     file name of the file object
+        :param scale: Pixels per module
+        :param bg_color: RGB colour of the light modules and the quiet zone
+        :param data_color: RGB colour of the dark modules
+        :param ecc: Error Correction Code
+        :param border: Width of the quiet zone in modules
+        :param compress_level: PNG zlib compression level between 0-9, lower is faster and bigger
+        :param cache: On-disk cache of rendered outputs
+        :param image_format: Suffix of the format, e.g. `.svg`, required for file objects without a file name
+        """
+        suffix = get_output_suffix(path, image_format)
+        if cache is None or self.plan is None or not suffix:
+            dark = self._generate_best_fit_array(ecc) == self.BLACK_MODULE
+            save_matrix(
+                dark, path, scale, bg_color, data_color, border, compress_level, suffix
+            )
+            return
+
+        key = cache.get_key(
+            self.plan.data,
+            self.plan.ecc,
+            self.plan.version,
+            ecc,
+            suffix,
+            scale,
+            border,
+            bg_color,
+            data_color,
+            compress_level,
+        )
+        if cache.copy_to(key, suffix, path):
+            return
+
+        dark = self._generate_best_fit_array(ecc) == self.BLACK_MODULE
+        cache.store(
+            key,
+            suffix,
+            lambda temp: save_matrix(
+                dark, temp, scale, bg_color, data_color, border, compress_level
+            ),
+        )
+        # another process may evict the new file right away
+        if not cache.copy_to(key, suffix, path):
+            save_matrix(
+                dark, path, scale, bg_color, data_color, border, compress_level, suffix
+            )
 
-        # add qr data to image
-        for r in range(img.size[0]):
-            for c in range(img.size[1]):
-                if matrix[r][c] == 0:
-                    pixels[r, c] = data_color
+    def to_svg(
+        self,
+        fp: Optional[TextIO] = None,
+        scale=10,
+        border: int = 4,
+        bg_color=(255, 255, 255),
+        data_color=(0, 0, 0),
+        ecc: str = "H",
+    ) -> Optional[str]:
+        """
+        Write the QR code as an SVG with a single path, horizontal runs of dark modules are merged into one
+        rectangle each.
+
+        :param fp: Text file object to stream to, the SVG is returned as a string when omitted
+        :param scale: Default size of a module in pixels
+        :param border: Width of the quiet zone in modules
+        :param bg_color: RGB colour of the light modules and the quiet zone
+        :param data_color: RGB colour of the dark modules
+        :param ecc: Error Correction Code
+        :return: The SVG document if no file object was given
+        """
+        return self._write_vector(
+            write_svg, fp, scale, border, bg_color, data_color, ecc
+        )
+
+    def to_eps(
+        self,
+        fp: Optional[TextIO] = None,
+        scale=10,
+        border: int = 4,
+        bg_color=(255, 255, 255),
+        data_color=(0, 0, 0),
+        ecc: str = "H",
+    ) -> Optional[str]:
+        """
+        Write the QR code as Encapsulated PostScript, horizontal runs of dark modules are merged into one
+        rectangle each.
+
+        :param fp: Text file object to stream to, the EPS is returned as a string when omitted
+        :param scale: Size of a module in points
+        :param border: Width of the quiet zone in modules
+        :param bg_color: RGB colour of the light modules and the quiet zone
+        :param data_color: RGB colour of the dark modules
+        :param ecc: Error Correction Code
+        :return: The EPS document if no file object was given
+        """
+        return self._write_vector(
+            write_eps, fp, scale, border, bg_color, data_color, ecc
+        )
 
-        # resize image to sacle
-        img = img.resize(size=(img.size[0] * scale, img.size[1] * scale))
+    def _write_vector(
+        self, writer, fp, scale, border, bg_color, data_color, ecc
+    ) -> Optional[str]:
+        dark = self._generate_best_fit_array(ecc) == self.BLACK_MODULE
+        if fp is not None:
+            writer(dark, fp, scale, border, bg_color, data_color)
+            return None
 
-        # save image to disk
-        img.save(path)
+        fp = io.StringIO()
+        writer(dark, fp, scale, border, bg_color, data_color)
+        return fp.getvalue()
 
 
 class MaskStrategies:
@@ -529,118 +828,329 @@ class MaskStrategies:
         return (((r + c) % 2) + ((r * c) % 3)) % 2 == 0
 
 
+class PatternTemplates:
+    """
+    Cache of the static patterns of each version: finder patterns, separators, alignment patterns, reserved format
+    modules, timing patterns and the dark module. Each entry holds the base matrix with every static pattern drawn
+    and a boolean mask of the function modules. Versions are built lazily on first use, or eagerly with `warm`.
+    """
+
+    _templates: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def get(cls, version: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param version: QR code version
+        :return: Read-only (N, N) uint8 base matrix and (N, N) boolean function module mask
+        """
+        template = cls._templates.get(version)
+        if template is None:
+            template = cls._templates[version] = cls._build(version)
+        return template
+
+    @classmethod
+    def warm(cls, versions=range(QrCode.MIN_VERSION, QrCode.MAX_VERSION + 1)):
+        """
+        Build the templates of the given versions up front.
+
+        :param versions: Versions to build, defaults to all of them
+        """
+        for version in versions:
+            cls.get(version)
+
+    @staticmethod
+    def _build(version: int) -> Tuple[np.ndarray, np.ndarray]:
+        qr = QrCode("", version=version)
+        qr.draw_static_patterns()
+        template = np.asarray(qr.matrix, dtype=np.uint8)
+        function_mask = template != QrCode.EMPTY_MODULE
+        template.setflags(write=False)
+        function_mask.setflags(write=False)
+        return template, function_mask
+
+
+class MaskEngine:
+    """
+    Vectorised counterpart of `MaskStrategies`. The eight mask patterns and the data module mask only depend on the
+    version, so they are computed once per version over a `np.indices` grid. Applying a mask is then a single XOR,
+    because black (0) and white (2) modules only differ by the second bit.
+    """
+
+    FLIP_BIT = 1  # BLACK_MODULE ^ (1 << FLIP_BIT) == WHITE_MODULE
+
+    @staticmethod
+    @cache
+    def get_patterns(version: int) -> np.ndarray:
+        """
+        Evaluate every `MaskStrategies` formula over the whole grid at once.
+
+        :param version: QR code version
+        :return: Read-only (8, N, N) boolean array, one layer per mask pattern id
+        """
+        modules = QrCode("", version=version).get_module_size()
+        r, c = np.indices((modules, modules))
+        patterns = np.stack(
+            [strategy(r, c) for strategy in MaskStrategies().strategies.values()]
+        )
+        patterns.setflags(write=False)
+        return patterns
+
+    @staticmethod
+    @cache
+    def get_data_mask(version: int) -> np.ndarray:
+        """
+        The data modules are every module left empty once the static patterns have been drawn.
+
+        :param version: QR code version
+        :return: Read-only (N, N) boolean array which is True for data modules
+        """
+        mask = ~PatternTemplates.get(version)[1]
+        mask.setflags(write=False)
+        return mask
+
+    @staticmethod
+    @cache
+    def get_masks(version: int) -> np.ndarray:
+        """
+        :param version: QR code version
+        :return: Read-only (8, N, N) boolean array of the modules each pattern flips
+        """
+        masks = MaskEngine.get_patterns(version) & MaskEngine.get_data_mask(version)
+        masks.setflags(write=False)
+        return masks
+
+    @classmethod
+    def apply(cls, matrix: np.ndarray, version: int, pattern_id: int) -> np.ndarray:
+        """
+        Apply a single mask pattern. Data modules which have not been filled are left empty.
+
+        :param matrix: (N, N) uint8 module matrix
+        :param version: QR code version of the matrix
+        :param pattern_id: Mask pattern id between 0-7
+        :return: New masked (N, N) uint8 matrix
+        """
+        flips = cls.get_masks(version)[pattern_id] & (matrix != QrCode.EMPTY_MODULE)
+        return matrix ^ (flips.view(np.uint8) << cls.FLIP_BIT)
+
+    @classmethod
+    def apply_all(cls, matrix: np.ndarray, version: int) -> np.ndarray:
+        """
+        Apply all eight mask patterns in one pass.
+
+        :param matrix: (N, N) uint8 module matrix
+        :param version: QR code version of the matrix
+        :return: New (8, N, N) uint8 stack, indexed by mask pattern id
+        """
+        flips = cls.get_masks(version) & (matrix != QrCode.EMPTY_MODULE)
+        return matrix ^ (flips.view(np.uint8) << cls.FLIP_BIT)
+
+
+class PlacementIndex:
+    """
+    Ordered coordinates of the data modules of each version. Data is placed in two module wide columns, starting
+    at the bottom right and zig zagging up and down towards the left, skipping the vertical timing pattern and any
+    module used by a static pattern. The path only depends on the version, so it is built lazily once per version.
+
+    https://www.thonky.com/qr-code-tutorial/module-placement-matrix#step-6-place-the-data-bits
+    """
+
+    _indexes: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def get(cls, version: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param version: QR code version
+        :return: Read-only row and column index arrays of the data modules in placement order
+        """
+        index = cls._indexes.get(version)
+        if index is None:
+            index = cls._indexes[version] = cls._build(version)
+        return index
+
+    @staticmethod
+    def _build(version: int) -> Tuple[np.ndarray, np.ndarray]:
+        data_mask = MaskEngine.get_data_mask(version)
+        modules = len(data_mask)
+
+        # right hand column of every column pair, the vertical timing pattern shifts the pairs left of it by one
+        right_columns = list(range(modules - 1, 6, -2)) + [5, 3, 1]
+
+        upwards = np.arange(modules - 1, -1, -1)
+        rows, cols = [], []
+        for i, column in enumerate(right_columns):
+            order = upwards if i % 2 == 0 else upwards[::-1]
+            rows.append(np.repeat(order, 2))
+            cols.append(np.tile((column, column - 1), modules))
+
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        is_data = data_mask[rows, cols]
+        rows, cols = rows[is_data], cols[is_data]
+        rows.setflags(write=False)
+        cols.setflags(write=False)
+        return rows, cols
+
+    @classmethod
+    def save(
+        cls, path: Path, versions=range(QrCode.MIN_VERSION, QrCode.MAX_VERSION + 1)
+    ):
+        """
+        Build and persist the indexes of the given versions, so other processes can `load` them instead of
+        rebuilding.
+
+        :param path: File to write, NumPy appends `.npz` if missing
+        :param versions: Versions to include
+        """
+        arrays = {}
+        for version in versions:
+            rows, cols = cls.get(version)
+            arrays[f"rows_{version}"] = rows.astype(np.uint8)
+            arrays[f"cols_{version}"] = cols.astype(np.uint8)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Path):
+        """
+        Populate the cache with indexes written by `save`.
+
+        :param path: File written by `save`
+        """
+        with np.load(path) as arrays:
+            for key in arrays.files:
+                if not key.startswith("rows_"):
+                    continue
+                version = int(key.removeprefix("rows_"))
+                rows = arrays[key].astype(np.intp)
+                cols = arrays[f"cols_{version}"].astype(np.intp)
+                rows.setflags(write=False)
+                cols.setflags(write=False)
+                cls._indexes[version] = rows, cols
+
+
 class PenaltyEvaluator:
-    def evaluate(self, matrix: List[List[int]]) -> int:
-        score = 0
-        score += self._evaluate_1(matrix)
-        score += self._evaluate_2(matrix)
-        score += self._evaluate_3(matrix)
-        score += self._evaluate_4(matrix)
+    """
+    Scores masked matrices with the four penalty rules. Every rule works on a (B, N, N) stack so all eight mask
+    candidates can be scored in a single batched call with `evaluate_many`.
+    """
+
+    FINDER_LIKE_PATTERNS = np.array(
+        [
+            (2, 2, 2, 2, 0, 2, 0, 0, 0, 2, 0),
+            (0, 2, 0, 0, 0, 2, 0, 2, 2, 2, 2),
+        ],
+        dtype=np.uint8,
+    )
+
+    def evaluate(self, matrix: List[List[int]] | np.ndarray) -> int:
+        return int(self.evaluate_many(self._as_stack(matrix))[0])
+
+    def evaluate_many(self, stack: np.ndarray) -> np.ndarray:
+        """
+        :param stack: (B, N, N) uint8 stack of matrices, e.g. all eight mask candidates
+        :return: (B,) array of penalty scores
+        """
+        stack = np.asarray(stack, dtype=np.uint8)
+        score = self._score_1(stack)
+        score += self._score_2(stack)
+        score += self._score_3(stack)
+        score += self._score_4(stack)
         return score
 
     @staticmethod
-    def _evaluate_1(matrix: List[List[int]]) -> int:
-        points = 0
-        for r in range(len(matrix)):
-            count = 1
-            for c in range(1, len(matrix[r])):
-                if matrix[r][c] == matrix[r][c - 1]:
-                    count += 1
-                else:
-                    count = 1
-
-                if count == 5:
-                    points += 3
-                elif count > 5:
-                    points += 1
-
-        for c in range(len(matrix[0])):
-            count = 1
-            for r in range(1, len(matrix)):
-                if matrix[r][c] == matrix[r - 1][c]:
-                    count += 1
-                else:
-                    count = 1
-
-                if count == 5:
-                    points += 3
-                elif count > 5:
-                    points += 1
+    def _as_stack(matrix: List[List[int]] | np.ndarray) -> np.ndarray:
+        return np.asarray(matrix, dtype=np.uint8)[np.newaxis]
 
-        return points
+    @classmethod
+    def _evaluate_1(cls, matrix: List[List[int]] | np.ndarray) -> int:
+        return int(cls._score_1(cls._as_stack(matrix))[0])
+
+    @classmethod
+    def _evaluate_2(cls, matrix: List[List[int]] | np.ndarray) -> int:
+        return int(cls._score_2(cls._as_stack(matrix))[0])
+
+    @classmethod
+    def _evaluate_3(cls, matrix: List[List[int]] | np.ndarray) -> int:
+        return int(cls._score_3(cls._as_stack(matrix))[0])
+
+    @classmethod
+    def _evaluate_4(cls, matrix: List[List[int]] | np.ndarray) -> int:
+        return int(cls._score_4(cls._as_stack(matrix))[0])
 
     @staticmethod
-    def _evaluate_2(matrix: List[List[int]]) -> int:
-        points = 0
-        dirs = [(0, 1), (1, 0), (1, 1)]
-        ROWS, COLS = len(matrix), len(matrix[0])
-        for r in range(len(matrix)):
-            for c in range(len(matrix[r])):
-                matches = 0
-                for dr, dc in dirs:
-                    nr, nc = r + dr, c + dc
-                    if nr in range(ROWS) and nc in range(COLS):
-                        if matrix[r][c] == matrix[nr][nc]:
-                            matches += 1
-                        else:
-                            break
-                if matches == 3:
-                    points += 3
+    def _score_1(stack: np.ndarray) -> np.ndarray:
+        """
+        Run-length encode every row and column. A run of 5 scores 3 and each extra module in the run scores 1 more.
+        """
+        batch = stack.shape[0]
+        points = np.zeros(batch, dtype=np.int64)
+        for lines in (stack, stack.transpose(0, 2, 1)):
+            # prefix every line with a sentinel so runs never continue onto the next line
+            padded = np.full(lines.shape[:2] + (lines.shape[2] + 1,), 0xFF, np.uint8)
+            padded[..., 1:] = lines
+            flat = padded.ravel()
+
+            starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+            lengths = np.diff(np.append(starts, flat.size))
+            penalties = np.where(lengths >= 5, lengths - 2, 0)
+            points += np.bincount(
+                starts // (flat.size // batch), weights=penalties, minlength=batch
+            ).astype(np.int64)
 
         return points
 
     @staticmethod
-    def _evaluate_3(matrix: List[List[int]]) -> int:
-        points = 0
-        pattern_1 = (2, 2, 2, 2, 0, 2, 0, 0, 0, 2, 0)
-        pattern_2 = (0, 2, 0, 0, 0, 2, 0, 2, 2, 2, 2)
-
-        for r in range(len(matrix)):
-            for c in range(len(matrix[r])):
-                if (
-                    tuple(matrix[r][c : c + 11]) == pattern_1
-                    or tuple(matrix[r][c : c + 11]) == pattern_2
-                ):
-                    points += 40
-
-        matrix = list(zip(*matrix))
-        for r in range(len(matrix)):
-            for c in range(len(matrix[r])):
-                if (
-                    matrix[r][c : c + 11] == pattern_1
-                    or matrix[r][c : c + 11] == pattern_2
-                ):
-                    points += 40
+    def _score_2(stack: np.ndarray) -> np.ndarray:
+        """
+        Each 2x2 block of the same colour scores 3.
+        """
+        top_left = stack[:, :-1, :-1]
+        blocks = (
+            (top_left == stack[:, :-1, 1:])
+            & (top_left == stack[:, 1:, :-1])
+            & (top_left == stack[:, 1:, 1:])
+        )
+        return np.count_nonzero(blocks, axis=(1, 2)) * 3
+
+    @classmethod
+    def _score_3(cls, stack: np.ndarray) -> np.ndarray:
+        """
+        Each finder-like 1:1:3:1:1 sequence with four light modules on either side scores 40.
+        """
+        width = cls.FINDER_LIKE_PATTERNS.shape[1]
+        points = np.zeros(stack.shape[0], dtype=np.int64)
+        for lines in (stack, stack.transpose(0, 2, 1)):
+            # slide the pattern one module at a time, so memory stays at one (B, N, N) mask for any batch size
+            starts = lines.shape[2] - width + 1
+            for pattern in cls.FINDER_LIKE_PATTERNS:
+                matches = lines[..., :starts] == pattern[0]
+                for offset in range(1, width):
+                    matches &= lines[..., offset : offset + starts] == pattern[offset]
+                points += np.count_nonzero(matches, axis=(1, 2)) * 40
 
         return points
 
     @staticmethod
-    def _evaluate_4(matrix: List[List[int]]) -> int:
-        black = 0
-        white = 0
-        for r in range(len(matrix)):
-            for c in range(len(matrix[r])):
-                if matrix[r][c] == 0:
-                    black += 1
-                else:
-                    white += 1
-
-        # Calculate the percentage of dark modules in the QR code.
-        dark_pct = (black / (black + white)) * 100
-
-        # Determine the previous and next multiple of five of the percentage in step 1
-        prev_multiple_of_five = dark_pct // 5 * 5
-        next_multiple_of_five = prev_multiple_of_five + 5
-
-        # Subtract 50 from the numbers in step 2. Then, take their absolute values.
-        value_prev = abs(dark_pct - prev_multiple_of_five)
-        value_next = abs(dark_pct - next_multiple_of_five)
-
-        # Divide the numbers from Step 3 by 5
-        value_prev /= 5
-        value_next /= 5
-
-        # Take the smaller of the two numbers and multiply it by 10.
-        final_score = min(value_prev, value_next) * 10
-
-        return int(final_score)
+    def _score_4(stack: np.ndarray) -> np.ndarray:
+        total = stack.shape[1] * stack.shape[2]
+        blacks = np.count_nonzero(stack == QrCode.BLACK_MODULE, axis=(1, 2))
+
+        scores = []
+        for black in blacks.tolist():
+            # Calculate the percentage of dark modules in the QR code.
+            dark_pct = (black / total) * 100
+
+            # Determine the previous and next multiple of five of the percentage in step 1
+            prev_multiple_of_five = dark_pct // 5 * 5
+            next_multiple_of_five = prev_multiple_of_five + 5
+
+            # Subtract 50 from the numbers in step 2. Then, take their absolute values.
+            value_prev = abs(dark_pct - prev_multiple_of_five)
+            value_next = abs(dark_pct - next_multiple_of_five)
+
+            # Divide the numbers from Step 3 by 5
+            value_prev /= 5
+            value_next /= 5
+
+            # Take the smaller of the two numbers and multiply it by 10.
+            scores.append(int(min(value_prev, value_next) * 10))
+
+        return np.array(scores, dtype=np.int64)
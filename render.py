@@ -0,0 +1,99 @@
+"""
+Raster renderers. Pillow and matplotlib are imported when a function needs them, so importing this module, and
+therefore `qr`, stays cheap for worker processes and command line tools.
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+Color = Tuple[int, int, int]
+
+
+def scale_modules(dark: np.ndarray, scale: int, border: int) -> np.ndarray:
+    """
+    Surround the modules with a quiet zone and blow every module up to a `scale` x `scale` block of pixels.
+
+    :param dark: (N, N) boolean array which is True for dark modules
+    :param scale: Pixels per module
+    :param border: Width of the quiet zone in modules
+    :return: ((N + 2 * border) * scale, ...) uint8 array of palette indices
+    """
+    modules = np.pad(dark, border).view(np.uint8)
+    return np.repeat(np.repeat(modules, scale, axis=0), scale, axis=1)
+
+
+def render_image(
+    dark: np.ndarray,
+    scale: int = 10,
+    border: int = 4,
+    bg_color: Color = (255, 255, 255),
+    data_color: Color = (0, 0, 0),
+) -> "Image.Image":
+    """
+    Render the modules into a two colour palette image with hard module edges. Pillow stores a two colour palette
+    as a 1-bit PNG, so the files stay small.
+
+    :param dark: (N, N) boolean array which is True for dark modules
+    :param scale: Pixels per module
+    :param border: Width of the quiet zone in modules
+    :param bg_color: RGB colour of the light modules and the quiet zone
+    :param data_color: RGB colour of the dark modules
+    :return: Image in "P" mode
+    """
+    from PIL import Image
+
+    pixels = np.ascontiguousarray(scale_modules(dark, scale, border))
+    height, width = pixels.shape
+    img = Image.frombuffer("P", (width, height), pixels, "raw", "P", 0, 1)
+    img.putpalette(list(bg_color) + list(data_color))
+    return img
+
+
+def save_image(
+    img: "Image.Image",
+    fp: Path | str | BinaryIO,
+    image_format: str | None = None,
+    compress_level: int = 6,
+):
+    """
+    :param img: Image from `render_image`
+    :param fp: Path or binary file object to write to
+    :param image_format: Pillow format name, inferred from the path when omitted, required for file objects
+    :param compress_level: PNG zlib compression level between 0-9, lower is faster and bigger
+    """
+    if image_format is None and isinstance(fp, (str, Path)):
+        image_format = get_image_format(Path(fp).suffix)
+    if image_format == "JPEG":
+        # JPEG has no palette mode
+        img = img.convert("RGB")
+    img.save(fp, format=image_format, compress_level=compress_level)
+
+
+def get_image_format(suffix: str) -> str | None:
+    """
+    :param suffix: File suffix such as `.png`
+    :return: Pillow format name, None for unknown suffixes
+    """
+    from PIL import Image
+
+    return Image.registered_extensions().get(suffix.lower())
+
+
+def show_matrix(matrix: np.ndarray):
+    """
+    Display the module matrix in a matplotlib window.
+
+    :param matrix: (N, N) module matrix
+    """
+    import matplotlib.pyplot as plt
+
+    # Visualize the data
+    plt.imshow(matrix, cmap="gray", vmin=0, vmax=2)
+
+    # Display the image
+    plt.show()
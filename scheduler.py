@@ -0,0 +1,218 @@
+"""
+Micro-batching for the rendering service. Requests arriving within a short window are grouped by the version and
+error correction level they land on, and every group goes to the executor as one batch, so the batch engine shares
+the per-version templates, placement index and Reed-Solomon tables across the whole group and the executor pays
+one round trip per batch instead of per request.
+
+A group is flushed when its window expires or it reaches `max_batch` items. Flushed bulk batches wait in a ready
+queue while `max_inflight` batches are running, which keeps the executor's own queue short. Priority items skip
+the window and the ready queue, so an interactive request is never stuck behind bulk jobs.
+
+When a batch fails, every item of it is retried in a batch of its own, so one bad payload only fails its own
+request.
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from const import InvalidVersionNumber
+from encoder import DataEncoder
+
+
+class SchedulerMetrics(NamedTuple):
+    window: float
+    max_batch: int
+    batches: int
+    items: int
+    priority_items: int
+    mean_batch_size: float
+    largest_batch_size: int
+    queue_depth: int
+    largest_queue_depth: int
+
+
+class MicroBatcher:
+    """
+    :param batch_func: Picklable function turning a list of items of one group into a list of results
+    :param key_func: Function returning the group of an item, raising rejects the item before it is queued. It is
+                     called on the event loop, so expensive work like planning a payload belongs in the item itself
+    :param executor: Executor running `batch_func`, the loop's default executor when omitted
+    :param window: Seconds a group waits for more items
+    :param max_batch: Number of items which flushes a group right away
+    :param max_inflight: Number of bulk batches running at once
+    """
+
+    def __init__(
+        self,
+        batch_func: Callable[[List[Any]], Sequence[Any]],
+        key_func: Callable[[Any], Hashable],
+        executor: Optional[Executor] = None,
+        window: float = 0.002,
+        max_batch: int = 64,
+        max_inflight: int = 2,
+    ):
+        self.batch_func = batch_func
+        self.key_func = key_func
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+
+        self._groups: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._ready: Deque[List[Tuple[Any, asyncio.Future]]] = deque()
+        self._inflight = 0
+
+        self._batches = 0
+        self._items = 0
+        self._priority_items = 0
+        self._largest_batch_size = 0
+        self._largest_queue_depth = 0
+
+    async def submit(self, item, priority: bool = False):
+        """
+        :param item: Item passed on to `batch_func`
+        :param priority: Run right away in a batch of its own
+        :return: Result of the item
+        """
+        key = self.key_func(item)
+        future = asyncio.get_running_loop().create_future()
+        if priority:
+            self._priority_items += 1
+            self._run([(item, future)])
+            return await future
+
+        group = self._groups.setdefault(key, [])
+        group.append((item, future))
+        if len(group) >= self.max_batch:
+            self._flush(key)
+        elif len(group) == 1:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        self._largest_queue_depth = max(
+            self._largest_queue_depth, self.get_queue_depth()
+        )
+        return await future
+
+    def get_queue_depth(self) -> int:
+        """
+        :return: Number of items waiting in a window or for an executor slot
+        """
+        waiting = sum(len(group) for group in self._groups.values())
+        return waiting + sum(len(batch) for batch in self._ready)
+
+    def metrics(self) -> SchedulerMetrics:
+        return SchedulerMetrics(
+            self.window,
+            self.max_batch,
+            self._batches,
+            self._items,
+            self._priority_items,
+            self._items / self._batches if self._batches else 0.0,
+            self._largest_batch_size,
+            self.get_queue_depth(),
+            self._largest_queue_depth,
+        )
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._groups.pop(key, None)
+        if not batch:
+            return
+
+        self._ready.append(batch)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._ready and self._inflight < self.max_inflight:
+            self._inflight += 1
+            self._run(self._ready.popleft(), bulk=True)
+
+    def _run(self, batch: List[Tuple[Any, asyncio.Future]], bulk: bool = False):
+        self._batches += 1
+        self._items += len(batch)
+        self._largest_batch_size = max(self._largest_batch_size, len(batch))
+
+        def finished():
+            if bulk:
+                self._inflight -= 1
+                self._dispatch()
+
+        self._execute(batch, finished)
+
+    def _execute(
+        self, batch: List[Tuple[Any, asyncio.Future]], finished: Callable[[], None]
+    ):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        job = loop.run_in_executor(self.executor, self.batch_func, items)
+
+        def done(job: asyncio.Future):
+            error = None if job.cancelled() else job.exception()
+            if error is not None and len(batch) > 1:
+                self._retry(batch, finished)
+                return
+            finished()
+
+            results = None if job.cancelled() or error else job.result()
+            for index, (_, future) in enumerate(batch):
+                # the submitter may have been cancelled already
+                if future.done():
+                    continue
+                if job.cancelled():
+                    future.cancel()
+                elif error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[index])
+
+        job.add_done_callback(done)
+
+    def _retry(
+        self, batch: List[Tuple[Any, asyncio.Future]], finished: Callable[[], None]
+    ):
+        """
+        Run every item of a failed batch on its own, so only the items which fail by themselves get the error. The
+        slot of the batch is held until all of them finished.
+        """
+        waiting = [entry for entry in batch if not entry[1].done()]
+        remaining = len(waiting)
+        if not remaining:
+            finished()
+            return
+
+        def item_finished():
+            nonlocal remaining
+            remaining -= 1
+            if not remaining:
+                finished()
+
+        for entry in waiting:
+            self._execute([entry], item_finished)
+
+
+def get_version_group(data: str, ecc: str) -> Tuple[int, str]:
+    """
+    :param data: The data to be encoded
+    :param ecc: Error Correction Code
+    :return: The (version, ecc) group of the payload
+    """
+    version = DataEncoder.choose_version(data, ecc)
+    if version is None:
+        raise InvalidVersionNumber(None)
+    return version, ecc
@@ -0,0 +1,446 @@
+"""
+Local HTTP rendering service, built on asyncio streams only.
+
+    python -m serve --port 8000 --workers 4
+    curl "http://127.0.0.1:8000/qr?data=https%3A%2F%2Fexample.com&ecc=M&format=svg"
+
+Query parameters: `data` (required), `ecc` (L, M, Q or H, defaults to M), `format` (png or svg), `scale` and
+`border`. Symbols are made in a process pool. Identical requests in flight at the same time share one computation
+(single-flight). Every response carries Cache-Control and an ETag derived from the request parameters and the
+library version, which decide the bytes of the body, so clients revalidate with `If-None-Match` and get a 304
+without any work on the server.
+
+Requests are micro-batched by version and error correction level, see `scheduler`. Interactive clients can add
+`priority=1` to skip the batching window. `GET /metrics` returns the scheduler metrics as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor
+from http import HTTPStatus
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from urllib.parse import parse_qs, urlsplit
+
+from batch import make_batch
+from const import InvalidVersionNumber
+from diskcache import DiskCache
+from qr import QrCode, make, render_bytes, warm_caches
+from plan import EncodePlan
+from scheduler import MicroBatcher
+
+CONTENT_TYPES = {".png": "image/png", ".svg": "image/svg+xml"}
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024
+
+
+class BadRequest(Exception):
+    pass
+
+
+class RenderRequest(NamedTuple):
+    data: str
+    ecc: str
+    suffix: str
+    scale: int
+    border: int
+
+    @classmethod
+    def from_query(cls, query: str) -> "RenderRequest":
+        """
+        :param query: URL query string
+        :return: Validated request
+        """
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        data = params.get("data")
+        if not data:
+            raise BadRequest("data is required")
+
+        ecc = params.get("ecc", "M").upper()
+        if ecc not in ("L", "M", "Q", "H"):
+            raise BadRequest("ecc must be one of L, M, Q, H")
+
+        suffix = "." + params.get("format", "png").lower()
+        if suffix not in CONTENT_TYPES:
+            raise BadRequest("format must be png or svg")
+
+        return cls(
+            data,
+            ecc,
+            suffix,
+            cls._get_int(params, "scale", 10, 1, 50),
+            cls._get_int(params, "border", 4, 0, 20),
+        )
+
+    @staticmethod
+    def _get_int(params: Dict[str, str], name: str, default: int, low: int, high: int):
+        try:
+            value = int(params.get(name, default))
+        except ValueError:
+            raise BadRequest(f"{name} must be an integer")
+        if not low <= value <= high:
+            raise BadRequest(f"{name} must be between {low} and {high}")
+        return value
+
+    def get_etag(self) -> str:
+        """
+        :return: Quoted hash of the request parameters and the library version, the body is not hashed
+        """
+        return '"' + DiskCache.get_key(*self)[:32] + '"'
+
+
+def render_request(request: RenderRequest) -> bytes:
+    """
+    Runs in the worker processes.
+
+    :param request: Validated request
+    :return: Encoded file contents
+    """
+    qr = make(request.data, request.ecc)
+    dark = qr._generate_best_fit_array(request.ecc) == QrCode.BLACK_MODULE
+    return render_bytes(dark, request.suffix, request.scale, border=request.border)
+
+
+class PlannedRequest(NamedTuple):
+    request: RenderRequest
+    plan: EncodePlan
+
+
+def plan_request(request: RenderRequest) -> PlannedRequest:
+    """
+    Runs in the worker processes, so the front process never segments a payload. The plan travels with the request
+    into its batch and is not computed again.
+
+    :param request: Validated request
+    :return: The request with its plan
+    """
+    return PlannedRequest(request, EncodePlan.create(request.data, request.ecc))
+
+
+def render_requests(requests: List[PlannedRequest]) -> List[bytes]:
+    """
+    Batch counterpart of `render_request` for requests sharing version and error correction level. Runs in the
+    worker processes.
+
+    :param requests: Planned requests from one `MicroBatcher` group
+    :return: Encoded file contents per request
+    """
+    plans = [planned.plan for planned in requests]
+    stack = make_batch([plan.data for plan in plans], plans[0].ecc, plans)
+    requests = [planned.request for planned in requests]
+    return [
+        render_bytes(
+            matrix == QrCode.BLACK_MODULE,
+            request.suffix,
+            request.scale,
+            border=request.border,
+        )
+        for request, matrix in zip(requests, stack)
+    ]
+
+
+def get_request_group(planned: PlannedRequest) -> Tuple[int, str]:
+    return planned.plan.version, planned.plan.ecc
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one. The shared computation is shielded, so a caller going
+    away does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
+
+
+class QrServer:
+    """
+    :param executor: Executor running `render`, the loop's default executor when omitted
+    :param max_age: Seconds clients may reuse a response without revalidating
+    :param render: Function turning a `RenderRequest` into the response body, must be picklable for process pools
+    :param scheduler: Micro-batcher of requests, used instead of `render` when given
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        max_age: int = 86400,
+        render: Callable[[RenderRequest], bytes] = render_request,
+        scheduler: Optional[MicroBatcher] = None,
+    ):
+        self.executor = executor
+        self.max_age = max_age
+        self.render = render
+        self.scheduler = scheduler
+        self.single_flight = SingleFlight()
+
+    async def get_body(self, request: RenderRequest, priority: bool = False) -> bytes:
+        async def compute() -> bytes:
+            loop = asyncio.get_running_loop()
+            if self.scheduler is not None:
+                planned = await loop.run_in_executor(
+                    self.executor, plan_request, request
+                )
+                return await self.scheduler.submit(planned, priority)
+            return await loop.run_in_executor(self.executor, self.render, request)
+
+        return await self.single_flight.do(request, compute)
+
+    def get_metrics(self) -> Dict:
+        metrics = {"in_flight": len(self.single_flight)}
+        if self.scheduler is not None:
+            metrics.update(self.scheduler.metrics()._asdict())
+        return metrics
+
+    async def handle(
+        self, method: str, target: str, headers: Dict[str, str]
+    ) -> Tuple[HTTPStatus, Dict[str, str], bytes]:
+        """
+        :param method: HTTP method
+        :param target: Request target, path and query
+        :param headers: Request headers with lower case names
+        :return: Status, response headers and body
+        """
+        if method not in ("GET", "HEAD"):
+            return self._error(HTTPStatus.METHOD_NOT_ALLOWED, "use GET")
+
+        url = urlsplit(target)
+        if url.path == "/metrics":
+            body = json.dumps(self.get_metrics()).encode()
+            return HTTPStatus.OK, {"Content-Type": "application/json"}, body
+        if url.path != "/qr":
+            return self._error(HTTPStatus.NOT_FOUND, "not found")
+
+        try:
+            request = RenderRequest.from_query(url.query)
+        except BadRequest as ex:
+            return self._error(HTTPStatus.BAD_REQUEST, str(ex))
+
+        etag = request.get_etag()
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={self.max_age}",
+        }
+        if etag in headers.get("if-none-match", "").replace(" ", "").split(","):
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+
+        priority = parse_qs(url.query).get("priority", ["0"])[-1] not in ("", "0")
+        try:
+            body = await self.get_body(request, priority)
+        except InvalidVersionNumber:
+            return self._error(HTTPStatus.BAD_REQUEST, "data does not fit any version")
+        except ValueError as ex:
+            # includes UnicodeError, data the encoder can't represent
+            return self._error(HTTPStatus.BAD_REQUEST, str(ex) or "invalid data")
+        except Exception:
+            traceback.print_exc()
+            return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, "rendering failed")
+
+        response_headers["Content-Type"] = CONTENT_TYPES[request.suffix]
+        return HTTPStatus.OK, response_headers, body
+
+    @staticmethod
+    def _error(
+        status: HTTPStatus, message: str
+    ) -> Tuple[HTTPStatus, Dict[str, str], bytes]:
+        return status, {"Content-Type": "text/plain; charset=utf-8"}, message.encode()
+
+    @classmethod
+    def _check_body(
+        cls, headers: Dict[str, str]
+    ) -> Optional[Tuple[HTTPStatus, Dict[str, str], bytes]]:
+        """
+        Only GET and HEAD are served, so a request body is read and dropped. Chunked bodies are refused instead of
+        being parsed as the next request, and so are bodies above `MAX_BODY_BYTES`, which the server would buffer.
+
+        :param headers: Request headers with lower case names
+        :return: Error response, None when the body can be skipped
+        """
+        if "transfer-encoding" in headers:
+            return cls._error(
+                HTTPStatus.NOT_IMPLEMENTED, "transfer-encoding is not supported"
+            )
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return cls._error(HTTPStatus.BAD_REQUEST, "bad content-length")
+        if length > MAX_BODY_BYTES:
+            return cls._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "body too large")
+        return None
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """
+        Serve HTTP/1.1 requests on one connection until the client closes it or asks to.
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._write(
+                        writer,
+                        "HTTP/1.1",
+                        *self._error(
+                            HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                            "headers too large",
+                        ),
+                        False,
+                    )
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self._write(
+                        writer,
+                        "HTTP/1.1",
+                        *self._error(HTTPStatus.BAD_REQUEST, "bad request line"),
+                        False,
+                    )
+                    break
+
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                error = self._check_body(headers)
+                if error is not None:
+                    # the body is not read, the connection can't be reused
+                    await self._write(writer, "HTTP/1.1", *error, False)
+                    break
+                await reader.readexactly(int(headers.get("content-length") or 0))
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = (
+                    connection != "close"
+                    if version == "HTTP/1.1"
+                    else connection == "keep-alive"
+                )
+
+                status, response_headers, body = await self.handle(
+                    method, target, headers
+                )
+                if method == "HEAD":
+                    response_headers["Content-Length"] = str(len(body))
+                    body = b""
+                await self._write(
+                    writer, version, status, response_headers, body, keep_alive
+                )
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _write(
+        writer: asyncio.StreamWriter,
+        version: str,
+        status: HTTPStatus,
+        headers: Dict[str, str],
+        body: bytes,
+        keep_alive: bool,
+    ):
+        headers.setdefault("Content-Length", str(len(body)))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        head = f"{version} {status.value} {status.phrase}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.Server:
+        return await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_BYTES
+        )
+
+
+async def serve(
+    host: str, port: int, workers: int, max_age: int, window: float, max_batch: int
+):
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_caches) as pool:
+        scheduler = None
+        if max_batch > 1:
+            scheduler = MicroBatcher(
+                render_requests,
+                get_request_group,
+                pool,
+                window,
+                max_batch,
+                max_inflight=workers,
+            )
+        server = await QrServer(pool, max_age, scheduler=scheduler).start(host, port)
+        print(
+            f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}/qr",
+            flush=True,
+        )
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve QR codes over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=0, help="worker processes, one per CPU when 0"
+    )
+    parser.add_argument("--max-age", type=int, default=86400)
+    parser.add_argument(
+        "--window", type=float, default=2.0, help="batching window in milliseconds"
+    )
+    parser.add_argument(
+        "--max-batch", type=int, default=64, help="batch size, 1 disables batching"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(
+            serve(
+                args.host,
+                args.port,
+                args.workers,
+                args.max_age,
+                args.window / 1000,
+                args.max_batch,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Output targets of the bulk path. Writing millions of small files costs a metadata operation each, so besides a
+plain directory the symbols can be streamed into a tar or zip archive, or a tar stream on stdout, through one
+buffered file handle.
+
+    with open_sink("tickets.tar", manifest=True, dedupe=True) as sink:
+        for index, qr in make_many(payloads, "M", with_index=True):
+            sink.save(f"{index:08d}.png", qr, ecc="M", index=index)
+
+A sink receives finished files in input order through `write`, or renders a QR code in memory through `save`.
+`commit` flushes everything written so far and returns the position to resume from after a crash, which the caller
+records in its checkpoint only once `commit` returned.
+
+With `manifest` every file gets a JSON line with its name, size, SHA-256 and any extra fields of the caller, stored
+as `manifest.jsonl` next to the files or as the last archive member. With `dedupe` a file whose bytes were written
+before is stored as a hard link to the first copy in directories and tar archives, and only recorded in the manifest
+for zip archives, which have no links. Deduplication keeps the digest of every distinct file in memory and implies
+the manifest.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, BinaryIO, Dict, NamedTuple, Optional
+
+from qr import render_bytes
+
+if TYPE_CHECKING:
+    from qr import QrCode
+
+MANIFEST_NAME = "manifest.jsonl"
+BUFFER_SIZE = 1024 * 1024
+
+
+class SinkError(Exception):
+    pass
+
+
+class SinkPosition(NamedTuple):
+    offset: int
+    manifest: int
+
+
+def get_member_name(name: str) -> str:
+    """
+    :param name: Relative file name from the input
+    :return: Normalised relative POSIX path
+    """
+    path = PurePosixPath(name.replace("\\", "/"))
+    if not name or path.is_absolute() or ".." in path.parts:
+        raise SinkError(f"invalid file name {name!r}")
+    return str(path)
+
+
+def open_output(target: str, offset: Optional[int] = None) -> BinaryIO:
+    """
+    :param target: File path, or `-` for stdout
+    :param offset: Truncate an existing file there and continue writing, None starts a new file
+    :return: Binary file object with a `BUFFER_SIZE` buffer
+    """
+    if target == "-":
+        sys.stdout.flush()
+        return open(sys.stdout.fileno(), "wb", BUFFER_SIZE, closefd=False)
+    if offset is None:
+        return open(target, "wb", BUFFER_SIZE)
+    fp = open(target, "r+b", BUFFER_SIZE)
+    fp.truncate(offset)
+    fp.seek(offset)
+    return fp
+
+
+def open_manifest(path: Path | str, offset: Optional[int] = None) -> BinaryIO:
+    """
+    :param path: Manifest file
+    :param offset: Position from an earlier `commit` to resume from, None starts a new manifest
+    :return: Manifest opened for reading and writing, positioned at its end
+    """
+    if offset is None:
+        return open(path, "w+b")
+    fp = open(path, "r+b")
+    fp.truncate(offset)
+    fp.seek(offset)
+    return fp
+
+
+class Sink:
+    """
+    Base class taking care of the manifest and deduplication, subclasses store the files.
+
+    :param manifest: Binary file receiving the manifest lines, positioned at its end, None disables the manifest
+    :param dedupe: Store identical files once
+    """
+
+    def __init__(self, manifest: Optional[BinaryIO] = None, dedupe: bool = False):
+        if dedupe and manifest is None:
+            raise SinkError("deduplication needs a manifest")
+        self.manifest = manifest
+        self.dedupe = dedupe
+        self._digests: Dict[str, str] = {}
+        if dedupe and manifest.tell():
+            self._load_digests()
+
+    def _load_digests(self):
+        """
+        Collect the digests of the files written before a resume from the manifest.
+        """
+        end = self.manifest.tell()
+        self.manifest.seek(0)
+        for line in self.manifest.read(end).splitlines():
+            entry = json.loads(line)
+            if "same_as" not in entry:
+                self._digests.setdefault(entry["sha256"], entry["name"])
+        self.manifest.seek(end)
+
+    def write(self, name: str, contents: bytes, **fields):
+        """
+        :param name: Relative file name, see `get_member_name`
+        :param contents: File contents
+        :param fields: JSON serialisable values added to the manifest line, e.g. the row index and payload
+        """
+        name = get_member_name(name)
+        if self.manifest is None:
+            self._add(name, contents)
+            return
+
+        digest = hashlib.sha256(contents).hexdigest()
+        entry = {"name": name, "size": len(contents), "sha256": digest, **fields}
+        original = self._digests.get(digest)
+        if original is None:
+            self._add(name, contents)
+            if self.dedupe:
+                self._digests[digest] = name
+        else:
+            self._link(name, original)
+            entry["same_as"] = original
+        self.manifest.write(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        self.manifest.write(b"\n")
+
+    def save(
+        self,
+        name: str,
+        qr: "QrCode",
+        scale=10,
+        bg_color=(255, 255, 255),
+        data_color=(0, 0, 0),
+        ecc: str = "H",
+        border: int = 4,
+        compress_level: int = 6,
+        **fields,
+    ):
+        """
+        Sink counterpart of `QrCode.save`, the symbol is rendered into memory and written as one file.
+
+        :param name: Relative file name, the format is inferred from the suffix
+        :param fields: Values added to the manifest line
+        """
+        dark = qr._generate_best_fit_array(ecc) == qr.BLACK_MODULE
+        contents = render_bytes(
+            dark,
+            PurePosixPath(name).suffix,
+            scale,
+            bg_color,
+            data_color,
+            border,
+            compress_level,
+        )
+        self.write(name, contents, **fields)
+
+    def commit(self) -> SinkPosition:
+        """
+        :return: Position to resume from
+        """
+        manifest = 0
+        if self.manifest is not None:
+            self.manifest.flush()
+            manifest = self.manifest.tell()
+        return SinkPosition(self._flush(), manifest)
+
+    def close(self):
+        if self.manifest is not None:
+            self.manifest.close()
+
+    def abort(self):
+        """
+        Close the files without finishing them, called when a job fails. A resumed job picks up from the last
+        `commit`.
+        """
+        if self.manifest is not None:
+            self.manifest.close()
+
+    def _add(self, name: str, contents: bytes):
+        raise NotImplementedError
+
+    def _link(self, name: str, original: str):
+        raise NotImplementedError
+
+    def _flush(self) -> int:
+        return 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class DirectorySink(Sink):
+    """
+    Files are complete once `write` returned. Rewriting the files after the checkpoint on resume replaces any that
+    were cut short.
+
+    :param directory: Output directory, created when missing
+    :param manifest: Write `manifest.jsonl` into the directory
+    :param dedupe: Hard link identical files to their first copy
+    :param position: Position from an earlier `commit` to resume from, None starts over
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        manifest: bool = False,
+        dedupe: bool = False,
+        position: Optional[SinkPosition] = None,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        manifest_fp = None
+        if manifest or dedupe:
+            offset = position.manifest if position is not None else None
+            manifest_fp = open_manifest(self.directory / MANIFEST_NAME, offset)
+        super().__init__(manifest_fp, dedupe)
+
+    def _add(self, name: str, contents: bytes):
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fp:
+            fp.write(contents)
+
+    def _link(self, name: str, original: str):
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # a file left by an interrupted run
+        path.unlink(missing_ok=True)
+        try:
+            os.link(self.directory / original, path)
+        except OSError:
+            shutil.copyfile(self.directory / original, path)
+
+
+class TarSink(Sink):
+    """
+    Uncompressed tar archive. Members are complete once `commit` returned, so a resumed job truncates the archive
+    there and appends. The manifest is kept in a file next to the archive until it is added as the last member.
+
+    :param fp: Binary file object, positioned where the first member goes
+    :param stream: Write in stream mode, for pipes which cannot `tell`
+    :param owned: Close `fp` together with the sink
+    :param manifest: Binary file receiving the manifest lines
+    :param dedupe: Store identical files as hard links to their first copy
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        stream: bool = False,
+        owned: bool = False,
+        manifest: Optional[BinaryIO] = None,
+        dedupe: bool = False,
+    ):
+        super().__init__(manifest, dedupe)
+        self.fp = fp
+        self.stream = stream
+        self.owned = owned
+        self.mtime = int(time.time())
+        self.tar = tarfile.open(fileobj=fp, mode="w|" if stream else "w")
+
+    @classmethod
+    def open(
+        cls,
+        target: str,
+        position: Optional[SinkPosition] = None,
+        manifest: bool = False,
+        dedupe: bool = False,
+    ) -> "TarSink":
+        """
+        :param target: Archive path, or `-` for stdout
+        :param position: Position from an earlier `commit` to resume from, the archive is truncated there. None
+                         starts a new archive
+        :param manifest: Add `manifest.jsonl` as the last member
+        :param dedupe: Store identical files as hard links to their first copy
+        """
+        stream = target == "-"
+        if stream and position is not None:
+            raise SinkError("archives written to stdout cannot be resumed")
+
+        manifest_fp = None
+        if manifest or dedupe:
+            if stream:
+                manifest_fp = tempfile.TemporaryFile()
+            else:
+                offset = position.manifest if position is not None else None
+                manifest_fp = open_manifest(f"{target}.{MANIFEST_NAME}", offset)
+
+        offset = position.offset if position is not None else None
+        return cls(open_output(target, offset), stream, True, manifest_fp, dedupe)
+
+    def _get_info(self, name: str) -> tarfile.TarInfo:
+        info = tarfile.TarInfo(name)
+        info.mtime = self.mtime
+        info.mode = 0o644
+        return info
+
+    def _add(self, name: str, contents: bytes):
+        info = self._get_info(name)
+        info.size = len(contents)
+        self.tar.addfile(info, BytesIO(contents))
+
+    def _link(self, name: str, original: str):
+        info = self._get_info(name)
+        info.type = tarfile.LNKTYPE
+        info.linkname = original
+        self.tar.addfile(info)
+
+    def _flush(self) -> int:
+        """
+        :return: End of the last complete member, 0 in stream mode where the tar module buffers records itself
+        """
+        if self.stream:
+            return 0
+        self.fp.flush()
+        return self.fp.tell()
+
+    def close(self):
+        if self.manifest is not None:
+            info = self._get_info(MANIFEST_NAME)
+            info.size = self.manifest.tell()
+            self.manifest.seek(0)
+            self.tar.addfile(info, self.manifest)
+            self.manifest.close()
+            if isinstance(self.manifest.name, str):
+                os.unlink(self.manifest.name)
+        self.tar.close()
+        if self.owned:
+            self.fp.close()
+        else:
+            self.fp.flush()
+
+    def abort(self):
+        super().abort()
+        if self.owned:
+            self.fp.close()
+
+
+class ZipSink(Sink):
+    """
+    Stored zip archive, PNG and SVG gain nothing from deflate. Zip archives keep their index at the end, so a job
+    writing one cannot be resumed.
+
+    :param fp: Binary file object, which may be unseekable
+    :param owned: Close `fp` together with the sink
+    :param manifest: Binary file receiving the manifest lines
+    :param dedupe: Store identical files once, later copies only appear in the manifest
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        owned: bool = False,
+        manifest: Optional[BinaryIO] = None,
+        dedupe: bool = False,
+    ):
+        super().__init__(manifest, dedupe)
+        self.fp = fp
+        self.owned = owned
+        self.date_time = time.localtime()[:6]
+        self.zip = zipfile.ZipFile(fp, "w", zipfile.ZIP_STORED)
+
+    @classmethod
+    def open(
+        cls,
+        target: str,
+        position: Optional[SinkPosition] = None,
+        manifest: bool = False,
+        dedupe: bool = False,
+    ) -> "ZipSink":
+        if position is not None:
+            raise SinkError("zip archives cannot be resumed, write a directory or tar")
+        manifest_fp = tempfile.TemporaryFile() if manifest or dedupe else None
+        return cls(open_output(target), True, manifest_fp, dedupe)
+
+    def _add(self, name: str, contents: bytes):
+        self.zip.writestr(zipfile.ZipInfo(name, self.date_time), contents)
+
+    def _link(self, name: str, original: str):
+        pass
+
+    def close(self):
+        if self.manifest is not None:
+            self.manifest.seek(0)
+            info = zipfile.ZipInfo(MANIFEST_NAME, self.date_time)
+            with self.zip.open(info, "w") as fp:
+                shutil.copyfileobj(self.manifest, fp)
+            self.manifest.close()
+        self.zip.close()
+        if self.owned:
+            self.fp.close()
+        else:
+            self.fp.flush()
+
+    def abort(self):
+        super().abort()
+        if self.owned:
+            self.fp.close()
+
+
+def get_sink_kind(target: str, kind: Optional[str] = None) -> str:
+    """
+    :param target: Directory, archive path or `-` for stdout
+    :param kind: Explicit kind, returned as is
+    :return: `dir`, `tar` or `zip`, inferred from the suffix of `target` when omitted, stdout defaults to tar
+    """
+    if kind is not None:
+        return kind
+    suffix = Path(target).suffix.lower()
+    return {".tar": "tar", ".zip": "zip"}.get(suffix, "tar" if target == "-" else "dir")
+
+
+def open_sink(
+    target: str,
+    kind: Optional[str] = None,
+    position: Optional[SinkPosition] = None,
+    manifest: bool = False,
+    dedupe: bool = False,
+) -> Sink:
+    """
+    :param target: Directory, archive path or `-` for stdout
+    :param kind: `dir`, `tar` or `zip`, inferred from the suffix of `target` when omitted, stdout defaults to tar
+    :param position: Position from an earlier `commit` to resume from, None starts over
+    :param manifest: Write a manifest of every file
+    :param dedupe: Store identical files once
+    :return: Sink
+    """
+    kind = get_sink_kind(target, kind)
+    if kind == "dir":
+        if target == "-":
+            raise SinkError("stdout needs an archive format")
+        return DirectorySink(target, manifest, dedupe, position)
+    if kind == "tar":
+        return TarSink.open(target, position, manifest, dedupe)
+    if kind == "zip":
+        return ZipSink.open(target, position, manifest, dedupe)
+    raise SinkError(f"unknown output format {kind!r}")
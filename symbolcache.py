@@ -0,0 +1,139 @@
+"""
+In-memory cache of finished symbols. Skewed traffic keeps asking for the same payloads, so the final masked matrix
+is kept per (payload, ecc, options) and the whole encode, place and mask pipeline is skipped on a hit. Entries are
+stored as packed bits, one bit per module, and the least recently used entry is dropped once the cache is full.
+
+The cache is opt-in, create one and share it between threads:
+
+    symbols = SymbolCache(maxsize=4096)
+    save_matrix(symbols.get_dark("https://example.com", "M"), "example.png")
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from plan import EncodePlan
+from qr import QrCode, make
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class SymbolCache:
+    """
+    Size bounded, thread safe LRU of final masked matrices.
+
+    :param maxsize: Maximum number of symbols kept
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        if maxsize <= 0:
+            raise ValueError(maxsize)
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Tuple, Tuple[int, bytes]] = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def get_key(data: str, ecc: str = "H", version: Optional[int] = None) -> Tuple:
+        """
+        :param data: The data to be encoded
+        :param ecc: Error Correction Code
+        :param version: Forced version, chosen from the data when omitted
+        :return: Cache key of the symbol
+        """
+        return data, ecc, version
+
+    def get_dark(
+        self, data: str, ecc: str = "H", version: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Final matrix of the payload, made and stored on a miss. Two threads missing the same key at once both make
+        the symbol, the matrices are identical so the second store is harmless.
+
+        :param data: The data to be encoded
+        :param ecc: Error Correction Code
+        :param version: Forced version, chosen from the data when omitted
+        :return: (N, N) boolean array, True for dark modules
+        """
+        key = self.get_key(data, ecc, version)
+        dark = self.get(key)
+        if dark is None:
+            plan = EncodePlan.create(data, ecc, version)
+            matrix = make(data, ecc, plan)._generate_best_fit_array(ecc)
+            dark = matrix == QrCode.BLACK_MODULE
+            self.put(key, dark)
+        return dark
+
+    def get_matrix(
+        self, data: str, ecc: str = "H", version: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Same as `get_dark`, with the module values of `QrCode.matrix`.
+
+        :return: (N, N) uint8 matrix of black and white modules
+        """
+        dark = self.get_dark(data, ecc, version)
+        return np.where(dark, QrCode.BLACK_MODULE, QrCode.WHITE_MODULE).astype(np.uint8)
+
+    def get(self, key: Tuple) -> Optional[np.ndarray]:
+        """
+        :param key: Key from `get_key`
+        :return: (N, N) boolean array, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        size, packed = entry
+        bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=size * size)
+        return bits.reshape(size, size).astype(bool)
+
+    def put(self, key: Tuple, dark: np.ndarray):
+        """
+        :param key: Key from `get_key`
+        :param dark: (N, N) boolean array, True for dark modules
+        """
+        entry = (len(dark), np.packbits(dark).tobytes())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self.maxsize,
+                len(self._entries),
+            )
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aio import AsyncQrMaker, async_make, async_make_many, async_save
+from qr import make
+
+
+def test_async_make_and_save(tmp_path):
+    async def main():
+        qr = await async_make("HELLO WORLD", "Q")
+        await async_save(qr, tmp_path / "async.png", ecc="Q")
+        await async_save(qr, tmp_path / "async.svg", ecc="Q")
+        return qr
+
+    qr = asyncio.run(main())
+    expected = make("HELLO WORLD", "Q")
+    assert qr.matrix == expected.matrix
+
+    expected.save(tmp_path / "sync.png", ecc="Q")
+    expected.save(tmp_path / "sync.svg", ecc="Q")
+    for suffix in (".png", ".svg"):
+        assert (tmp_path / f"async{suffix}").read_bytes() == (
+            tmp_path / f"sync{suffix}"
+        ).read_bytes()
+
+
+def test_async_make_many():
+    async def items():
+        for i in range(10):
+            yield f"https://example.com/{i}", "L" if i % 2 else "H"
+
+    async def main(maker):
+        return [result async for result in maker.make_many(items(), with_index=True)]
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        results = asyncio.run(main(AsyncQrMaker(pool, limit=3)))
+    assert [index for index, _ in results] == list(range(10))
+    assert results[3][1].matrix == make("https://example.com/3", "L").matrix
+
+
+def test_async_cancellation(tmp_path):
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            maker = AsyncQrMaker(pool, limit=1)
+            release = threading.Event()
+            blocker = asyncio.get_running_loop().run_in_executor(pool, release.wait)
+
+            qr = await async_make("HELLO WORLD", maker=None)
+            task = asyncio.create_task(maker.save(qr, tmp_path / "cancelled.png"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            release.set()
+            await blocker
+            await asyncio.gather(task, return_exceptions=True)
+            assert task.cancelled()
+
+            # the semaphore slot was released
+            await asyncio.wait_for(maker.make("HELLO WORLD"), timeout=5)
+
+            generator = async_make_many(["A", "B", "C"], maker=maker)
+            assert (await generator.__anext__()).matrix == make("A", "H").matrix
+            await generator.aclose()
+
+    asyncio.run(main())
+    assert not (tmp_path / "cancelled.png").exists()
+
+
+def test_async_cancellation_keeps_limit():
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            maker = AsyncQrMaker(pool, limit=1)
+            started = threading.Event()
+            release = threading.Event()
+
+            def job():
+                started.set()
+                release.wait()
+
+            try:
+                task = asyncio.create_task(maker._run(job))
+                await asyncio.to_thread(started.wait)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+                # the cancelled job still runs in the executor and holds the only slot
+                waiting = asyncio.create_task(maker.make("HELLO WORLD"))
+                await asyncio.sleep(0.05)
+                assert not waiting.done()
+
+                release.set()
+                qr = await asyncio.wait_for(waiting, timeout=5)
+                assert qr.matrix == make("HELLO WORLD", "H").matrix
+            finally:
+                release.set()
+
+    asyncio.run(main())
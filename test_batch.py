@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from batch import MixedVersionBatch, encode_data_batch, make_batch
+from qr import encode_data, make
+
+
+def test_encode_data_batch():
+    version, codewords = encode_data_batch(["HELLO WORLD", "HELLO CC WORLD"], "H")
+    assert version == 2
+    assert codewords.shape == (2, 44)
+
+    bits = np.unpackbits(codewords[1]).tolist()
+    assert "".join(map(str, bits)) == encode_data("HELLO CC WORLD", "H")[: 44 * 8]
+
+
+def test_make_batch_matches_make():
+    for payloads, ecc in (
+        (["HELLO WORLD", "HELLO CC WORLD", "12345678901234567890"], "H"),
+        ([f"https://example.com/ticket/{i:06d}" for i in range(10)], "M"),
+        (["A" * 500, "B" * 499], "H"),
+    ):
+        stack = make_batch(payloads, ecc)
+        for data, matrix in zip(payloads, stack):
+            expected = make(data, ecc)._generate_best_fit(ecc)
+            assert matrix.tolist() == expected
+
+
+def test_make_batch_mixed_versions():
+    with pytest.raises(MixedVersionBatch):
+        make_batch(["A", "A" * 100], "H")
+    with pytest.raises(ValueError, match="no payloads"):
+        make_batch([], "H")
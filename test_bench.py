@@ -0,0 +1,27 @@
+from bench import STAGES, BenchResult, compare, get_payload, run, to_json
+from plan import EncodePlan
+
+
+def test_get_payload_fills_version():
+    for version, ecc in ((1, "L"), (10, "H"), (27, "M"), (39, "Q")):
+        payload = get_payload(version, ecc)
+        assert EncodePlan.create(payload, ecc).version == version
+        assert EncodePlan.create(payload + "x", ecc).version == version + 1
+
+
+def test_run_and_compare():
+    results = run([2], "Q", STAGES, min_time=0)
+    assert [result.stage for result in results] == list(STAGES)
+    assert all(result.calls >= 3 and result.min_us > 0 for result in results)
+
+    baseline = to_json(results)
+    assert compare(results, baseline) == []
+
+    slower = [result._replace(min_us=result.min_us * 2) for result in results]
+    regressions = compare(slower, baseline, threshold=0.5)
+    assert [regression.stage for regression in regressions] == list(STAGES)
+    assert regressions[0].ratio == 2
+
+    # stages missing from the baseline are skipped
+    extra = BenchResult("save", 5, "Q", 3, 1.0, 1.0)
+    assert compare([extra], baseline) == []
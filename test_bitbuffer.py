@@ -0,0 +1,33 @@
+import pytest
+
+from bitbuffer import BitBuffer
+
+
+def test_append():
+    buffer = BitBuffer()
+    buffer.append(0b0010, 4)
+    buffer.append(11, 9)
+    assert len(buffer) == 13
+    assert buffer.to_bitstring() == "0010000001011"
+    assert buffer.to_bytes() == bytes([0b00100000, 0b01011000])
+
+    buffer.append(0, 3)
+    buffer.append_bytes(bytes([0xEC, 0x11]))
+    assert len(buffer) == 32
+    assert buffer.to_bytes() == bytes([0b00100000, 0b01011000, 0xEC, 0x11])
+
+    buffer.append(0, 0)
+    assert len(buffer) == 32
+
+
+def test_append_value_too_wide():
+    with pytest.raises(ValueError):
+        BitBuffer().append(256, 8)
+
+
+def test_bitstring_round_trip():
+    bits = "0010000001011011000010110111100011010001011"
+    assert BitBuffer.from_bitstring(bits).to_bitstring() == bits
+    assert BitBuffer.from_bitstring("").to_bitstring() == ""
+    assert BitBuffer.from_bitstring("0001") == BitBuffer.from_bitstring("0001")
+    assert BitBuffer.from_bitstring("0001") != BitBuffer.from_bitstring("00010")
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from blocks import BlockLayout
+from const import InvalidErrorCorrectionCode, Mode
+from polynomial import GeneratorPolynomial
+from qr import QrCode, encode_data_bits, make
+from util import capacity
+
+
+def test_block_layout_5q():
+    layout = BlockLayout.get(5, "Q")
+    assert layout.block_sizes == (15, 15, 16, 16)
+    assert layout.total_codewords == 134
+
+    # first data column of every block, then the extra codewords of the long blocks
+    assert layout.interleave_index[:8].tolist() == [0, 15, 30, 46, 1, 16, 31, 47]
+    assert layout.interleave_index[60:62].tolist() == [45, 61]
+    # error correction codewords start right after the data
+    assert layout.interleave_index[62:64].tolist() == [62, 80]
+
+
+def test_block_layout_single_block():
+    data = np.arange(19, dtype=np.uint8)
+    codewords = BlockLayout.get(1, "L").encode(data)
+    remainder = GeneratorPolynomial(7).divide(data.tobytes())
+    assert codewords.tolist() == data.tolist() + list(remainder)
+
+
+def test_block_layout_encode_batch():
+    layout = BlockLayout.get(5, "Q")
+    data = np.random.default_rng(0).integers(0, 256, (3, 62), dtype=np.uint8)
+    codewords = layout.encode(data)
+    assert codewords.shape == (3, 134)
+    for row, expected in zip(data, codewords):
+        assert layout.encode(row).tolist() == expected.tolist()
+
+    # the last block's error correction codewords match a plain division
+    remainder = GeneratorPolynomial(18).divide(data[0, 46:].tobytes())
+    assert codewords[0, 62 + 3 :: 4].tolist() == list(remainder)
+
+
+def test_block_layout_wrong_codeword_count():
+    with pytest.raises(ValueError):
+        BlockLayout.get(1, "L").encode(np.zeros(20, dtype=np.uint8))
+
+
+def test_payloads_at_capacity():
+    # the terminator must not push a payload filling the data codewords past them
+    assert len(encode_data_bits("A" * 25, "L")) == 26 * 8
+    assert len(encode_data_bits("1" * 17, "H")) == 26 * 8
+    for ecc in ("L", "M", "Q", "H"):
+        for version in (1, 2, 7, 10, 27, 40):
+            for mode, char in ((Mode.NUMERIC, "1"), (Mode.ALPHANUMERIC, "A")):
+                qr = make(char * capacity(version, ecc, mode), ecc)
+                assert qr.plan.version == version
+
+
+def test_block_layout_invalid_ecc():
+    with pytest.raises(InvalidErrorCorrectionCode):
+        BlockLayout(5, "X")
+
+
+def test_add_version_information():
+    qr = QrCode("", version=7)
+    qr.add_version_information()
+    # 000111110010010100, least significant bit first
+    assert [qr.matrix[i // 3][34 + i % 3] for i in range(6)] == [
+        QrCode.WHITE_MODULE,
+        QrCode.WHITE_MODULE,
+        QrCode.BLACK_MODULE,
+        QrCode.WHITE_MODULE,
+        QrCode.BLACK_MODULE,
+        QrCode.WHITE_MODULE,
+    ]
+    assert [row[:6] for row in qr.matrix[34:37]] == [
+        [qr.matrix[c][r] for c in range(6)] for r in range(34, 37)
+    ]
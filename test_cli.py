@@ -0,0 +1,167 @@
+import io
+import json
+import tarfile
+
+import pytest
+
+import cli
+from cli import (
+    InputError,
+    get_records,
+    main,
+    read_csv,
+    read_jsonl,
+    read_lines,
+)
+from sinks import TarSink
+
+
+def test_readers():
+    assert list(read_lines(io.StringIO("HELLO\r\n\nWORLD\n"))) == [
+        ("HELLO", None, None),
+        ("WORLD", None, None),
+    ]
+
+    rows = read_csv(io.StringIO("name,data,ecc\na,HELLO,H\nb,WORLD,\n"))
+    assert list(rows) == [("HELLO", "H", "a"), ("WORLD", None, "b")]
+    with pytest.raises(InputError):
+        list(read_csv(io.StringIO("url\nHELLO\n")))
+
+    rows = read_jsonl(io.StringIO('"HELLO"\n\n{"data": "WORLD", "ecc": "l"}\n'))
+    assert list(rows) == [("HELLO", None, None), ("WORLD", "l", None)]
+    with pytest.raises(InputError):
+        list(read_jsonl(io.StringIO("{not json}\n")))
+
+
+def test_get_records_skip():
+    rows = [("A", None, None), ("B", "q", "b"), ("C", None, "c.svg")]
+    records = list(get_records(rows, "M", ".svg", skip=1))
+    assert [record.index for record in records] == [1, 2]
+    assert records[0].ecc == "Q"
+    assert [record.name for record in records] == ["b.svg", "c.svg"]
+    assert list(get_records(rows, "M", ".svg"))[0].name == "0000/00000000.svg"
+
+
+def test_batch_directory(tmp_path, capsys):
+    source = tmp_path / "in.jsonl"
+    source.write_text(
+        '{"data": "HELLO", "name": "hello"}\n"WORLD"\n"' + "x" * 4000 + '"\n'
+    )
+    code = main(["batch", str(source), "-o", str(tmp_path / "out"), "--format", "svg"])
+
+    assert code == 1
+    assert "row 2: data does not fit any version" in capsys.readouterr().err
+    assert (tmp_path / "out" / "hello.svg").read_bytes().startswith(b"<?xml")
+    assert (tmp_path / "out" / "0000" / "00000001.svg").exists()
+
+
+def test_batch_reports_bad_rows(tmp_path, capsys, monkeypatch):
+    make_batch = cli.make_batch
+
+    def failing_make_batch(payloads, ecc, plans=None):
+        if "BAD" in payloads:
+            raise RuntimeError("broken payload")
+        return make_batch(payloads, ecc, plans)
+
+    monkeypatch.setattr(cli, "make_batch", failing_make_batch)
+    source = tmp_path / "in.jsonl"
+    # the surrogate can't be encoded, BAD fails the batch it shares with GOOD and OK
+    source.write_text('"GOOD"\n"a\\ud800"\n"BAD"\n"OK"\n')
+    code = main(["batch", str(source), "-o", str(tmp_path / "out"), "--workers", "1"])
+
+    assert code == 1
+    err = capsys.readouterr().err
+    assert "row 1: UnicodeEncodeError: 'utf-8' codec can't encode" in err
+    assert "row 2: RuntimeError: broken payload" in err
+    assert sorted(path.name for path in (tmp_path / "out" / "0000").iterdir()) == [
+        "00000000.png",
+        "00000003.png",
+    ]
+
+
+def test_batch_resumes_tar(tmp_path, monkeypatch):
+    source = tmp_path / "in.txt"
+    source.write_text("".join(f"ITEM {i}\n" for i in range(7)))
+    archive = tmp_path / "out.tar"
+    checkpoint = tmp_path / "progress.json"
+    argv = [
+        "batch",
+        str(source),
+        "-o",
+        str(archive),
+        "--format",
+        "svg",
+        "--chunksize",
+        "2",
+        "--workers",
+        "1",
+        "--checkpoint",
+        str(checkpoint),
+        "--manifest",
+    ]
+
+    write = TarSink.write
+    calls = []
+
+    def killed_in_third_chunk(self, name, contents, **fields):
+        calls.append(name)
+        if len(calls) == 6:
+            # a member cut short, as if the process died while writing it
+            self.fp.write(b"partial")
+            raise KeyboardInterrupt
+        write(self, name, contents, **fields)
+
+    monkeypatch.setattr(TarSink, "write", killed_in_third_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        main(argv)
+    assert json.loads(checkpoint.read_text())["done"] == 4
+
+    monkeypatch.setattr(TarSink, "write", write)
+    assert main(argv) == 0
+
+    with tarfile.open(archive) as tar:
+        names = tar.getnames()
+        manifest = tar.extractfile("manifest.jsonl").read().decode().splitlines()
+    assert names == [f"0000/{i:08d}.svg" for i in range(7)] + ["manifest.jsonl"]
+    assert [json.loads(line)["data"] for line in manifest] == [
+        f"ITEM {i}" for i in range(7)
+    ]
+    assert json.loads(checkpoint.read_text())["done"] == 7
+
+    # rerunning the finished job leaves the archive alone
+    contents = archive.read_bytes()
+    assert main(argv) == 0
+    assert archive.read_bytes() == contents
+    assert json.loads(checkpoint.read_text())["finished"]
+
+
+def test_batch_checkpoint_mismatch(tmp_path, capsys):
+    source = tmp_path / "in.txt"
+    source.write_text("HELLO\n")
+    argv = ["batch", str(source), "-o", str(tmp_path / "out"), "--workers", "1"]
+    checkpoint = ["--checkpoint", str(tmp_path / "progress.json")]
+
+    assert main(argv + checkpoint) == 0
+    assert (tmp_path / "progress.json").stat().st_mode & 0o044 == 0o044
+    assert main(argv + ["--ecc", "H"] + checkpoint) == 2
+    assert "other options" in capsys.readouterr().err
+
+
+def test_batch_usage_errors(tmp_path, capsys):
+    source = tmp_path / "in.txt"
+    source.write_text("HELLO\n")
+    argv = ["batch", str(source)]
+    for options in (
+        ["-o", str(tmp_path / "out"), "--scale", "0"],
+        ["-o", str(tmp_path / "out"), "--chunksize", "many"],
+        ["-o", str(tmp_path / "out.zip"), "--checkpoint", "progress.json"],
+        ["-o", "-", "--checkpoint", "progress.json"],
+    ):
+        with pytest.raises(SystemExit) as raised:
+            main(argv + options)
+        assert raised.value.code == 2
+    err = capsys.readouterr().err
+    assert "argument --scale: must be between 1 and 50" in err
+    assert "argument --chunksize: 'many' is not an integer" in err
+    assert "zip archives and stdout can't be resumed" in err
+    assert not (tmp_path / "out").exists() and not (tmp_path / "out.zip").exists()
@@ -0,0 +1,104 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from diskcache import DiskCache
+from qr import make
+from util import get_file_mode
+
+
+def test_save_with_disk_cache(tmp_path):
+    cache = DiskCache(tmp_path / "cache")
+    qr = make("HELLO WORLD", "Q")
+    qr.save(tmp_path / "plain.png", ecc="Q")
+    qr.save(tmp_path / "miss.png", ecc="Q", cache=cache)
+    assert len(list(cache.directory.glob("??/*.png"))) == 1
+
+    # a hit never touches the matrix
+    qr.matrix = None
+    qr.save(tmp_path / "hit.png", ecc="Q", cache=cache)
+    expected = (tmp_path / "plain.png").read_bytes()
+    assert (tmp_path / "miss.png").read_bytes() == expected
+    assert (tmp_path / "hit.png").read_bytes() == expected
+
+    with open(tmp_path / "file.png", "wb") as fp:
+        qr.save(fp, ecc="Q", cache=cache)
+    assert (tmp_path / "file.png").read_bytes() == expected
+
+
+def test_save_file_object_same_with_and_without_cache(tmp_path):
+    qr = make("HELLO WORLD", "Q")
+    for suffix in (".svg", ".png"):
+        for name, cache in (("plain", None), ("cached", DiskCache(tmp_path / "c"))):
+            with open(tmp_path / f"{name}{suffix}", "wb") as fp:
+                qr.save(fp, ecc="Q", cache=cache)
+        assert (tmp_path / f"plain{suffix}").read_bytes() == (
+            tmp_path / f"cached{suffix}"
+        ).read_bytes()
+    assert (tmp_path / "plain.svg").read_text() == qr.to_svg(ecc="Q")
+
+
+def test_disk_cache_key(tmp_path):
+    cache = DiskCache(tmp_path)
+    qr = make("HELLO WORLD", "Q")
+    qr.save(tmp_path / "a.svg", ecc="Q", cache=cache)
+    qr.save(tmp_path / "b.svg", ecc="Q", scale=4, cache=cache)
+    qr.save(tmp_path / "c.svg", ecc="Q", data_color=(0, 0, 128), cache=cache)
+    assert len(list(tmp_path.glob("??/*.svg"))) == 3
+    assert DiskCache.get_key("A", 1) != DiskCache.get_key("A", 2)
+
+
+def test_disk_cache_copy_to_buffer(tmp_path):
+    cache = DiskCache(tmp_path)
+    key = cache.get_key("payload")
+    assert not cache.copy_to(key, ".txt", io.BytesIO())
+
+    cache.store(key, ".txt", lambda path: path.write_bytes(b"cached"))
+    buffer = io.BytesIO()
+    assert cache.copy_to(key, ".txt", buffer)
+    assert buffer.getvalue() == b"cached"
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=250)
+    keys = [cache.get_key(i) for i in range(3)]
+    for i, key in enumerate(keys):
+        path = cache.store(key, ".bin", lambda path: path.write_bytes(bytes(100)))
+        os.utime(path, (i, i))
+
+    # the third write went over the cap and evicted the oldest entry
+    assert not cache.get_path(keys[0], ".bin").exists()
+    assert cache.get_path(keys[2], ".bin").exists()
+
+    cache.clear()
+    assert not list(tmp_path.glob("??/*"))
+
+
+def _save_cached(args):
+    directory, path = args
+    make("https://example.com", "M").save(path, ecc="M", cache=DiskCache(directory))
+    return open(path, "rb").read()
+
+
+def test_disk_cache_processes(tmp_path):
+    jobs = [(tmp_path / "cache", tmp_path / f"{i}.png") for i in range(8)]
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        outputs = list(pool.map(_save_cached, jobs))
+
+    assert len(set(outputs)) == 1
+    assert not list((tmp_path / "cache").glob("??/.tmp-*"))
+    assert len(list((tmp_path / "cache").glob("??/*.png"))) == 1
+
+
+def test_disk_cache_file_mode(tmp_path):
+    umask = os.umask(0o022)
+    get_file_mode.cache_clear()
+    try:
+        path = DiskCache(tmp_path).store(
+            "key", ".txt", lambda temp: temp.write_bytes(b"x")
+        )
+    finally:
+        os.umask(umask)
+        get_file_mode.cache_clear()
+    # readable by other users sharing the cache, not the 0600 of mkstemp
+    assert path.stat().st_mode & 0o777 == 0o644
@@ -1,5 +1,6 @@
 from const import Mode
-from encoder import DataEncoder, AlphanumericPair
+from encoder import DataEncoder, AlphanumericPair, Segment
+from util import choose_qr_version
 
 
 def test_alphanumeric_encoder_encode():
@@ -85,3 +86,81 @@ def test_numeric_encoding():
 def test_get_8bit_binary_numbers_from_list():
     expected = ["01000101", "11110010", "00010001", "10101011"]
     assert DataEncoder.get_8bit_binary_numbers_from_list([69, 242, 17, 171]) == expected
+
+
+def test_encode_bits_matches_encode():
+    for text, version in (("HELLO WORLD", 2), ("8675309", 1), ("Hello, world!", 2)):
+        buffer = DataEncoder.encode_bits(text, version, "H")
+        assert len(buffer) % 8 == 0
+        assert buffer.to_bitstring() == DataEncoder.encode(text, version, "H")
+
+
+def test_get_segments():
+    assert DataEncoder.get_segments("", 1) == []
+    assert DataEncoder.get_segments("HELLO WORLD", 1) == [
+        Segment(Mode.ALPHANUMERIC, "HELLO WORLD")
+    ]
+    # a short digit run is cheaper inside the byte segment than in its own segment
+    assert DataEncoder.get_segments("abc123", 1) == [Segment(Mode.BYTE, "abc123")]
+    assert DataEncoder.get_segments("hello 12345678901234567890", 1) == [
+        Segment(Mode.BYTE, "hello "),
+        Segment(Mode.NUMERIC, "12345678901234567890"),
+    ]
+
+
+def test_segmented_version():
+    # a single lowercase letter no longer pushes the digits into byte mode
+    text = "x" + "1234567890" * 10
+    assert DataEncoder.get_encoding_mode(text) == Mode.BYTE
+    assert choose_qr_version(len(text), "M", Mode.BYTE) == 6
+    assert DataEncoder.choose_version(text, "M") == 4
+    assert DataEncoder.choose_version("", "M") is None
+    assert DataEncoder.choose_version("1" * 7090, "L") is None
+
+
+def test_numeric_leading_zeros():
+    assert DataEncoder._encode_numeric("012005") == ["0000001100", "0000000101"]
+
+
+def test_terminator_on_byte_boundary():
+    # 4 + 10 + 10 = 24 bits, the terminator still follows before the pad bytes
+    assert DataEncoder.encode("123", 1, "M")[24:40] == "0000000011101100"
+
+
+def test_kanji_table():
+    table = DataEncoder.get_kanji_table()
+    # 0x935F and 0xE4AA from the thonky.com kanji walkthrough
+    assert table["点"] == 0xD9F
+    assert table["茗"] == 0x1AAA
+    assert "A" not in table
+
+
+def test_kanji_encoding():
+    assert DataEncoder.get_encoding_mode("点茗") == Mode.KANJI
+    assert DataEncoder.encode("点茗", 1, "H")[:38] == (
+        "1000" "00000010" "0110110011111" "1101010101010"
+    )
+    assert DataEncoder.get_segments("ID:12345 東京都", 1) == [
+        Segment(Mode.ALPHANUMERIC, "ID:12345 "),
+        Segment(Mode.KANJI, "東京都"),
+    ]
+
+
+def test_utf8_byte_segments():
+    # "hello ✓" is 9 UTF-8 bytes behind the UTF-8 ECI header
+    assert DataEncoder.encode("hello ✓", 1, "M")[:24] == (
+        "0111" "00011010" "0100" "00001001"
+    )
+    assert DataEncoder.get_bit_length(DataEncoder.get_segments("hello ✓", 1), 1) == (
+        12 + 4 + 8 + 9 * 8
+    )
+    # latin-1 text keeps the default encoding without a header
+    assert DataEncoder.encode("café", 1, "M")[:12] == "0100" "00000100"
+    # kanji characters become UTF-8 bytes once the symbol is UTF-8
+    assert DataEncoder.get_segments("点✓", 1) == [Segment(Mode.BYTE, "点✓")]
+
+
+def test_latin1_in_kanji_table_is_byte():
+    assert "°" in DataEncoder.get_kanji_table()
+    assert DataEncoder.get_encoding_mode("°±×") == Mode.BYTE
+    assert DataEncoder.get_encoding_mode("点°") == Mode.KANJI
@@ -12,3 +12,12 @@ def test_galois_field_get_exponents():
 
 def test_galois_field_multiply():
     assert GaloisField.multiply(76, 43) == 251
+
+
+def test_galois_field_flat_tables():
+    exps, log = GaloisField.get_flat_exponents_table(), GaloisField.get_flat_log_table()
+    assert len(exps) == 510
+    assert len(log) == 256
+    for value in range(1, 256):
+        assert exps[log[value]] == value
+        assert exps[log[value] + 255] == value
@@ -0,0 +1,45 @@
+import pytest
+
+from const import InvalidVersionNumber, Mode
+from encoder import DataEncoder
+from plan import EncodePlan
+from qr import QrCode, encode_data_bits, make
+
+
+def test_encode_plan():
+    plan = EncodePlan.create("hello 12345678901234567890", "M")
+    assert plan.version == DataEncoder.choose_version(plan.data, "M") == 2
+    assert plan.modes == (Mode.BYTE, Mode.NUMERIC)
+    assert plan.bit_length == 141
+    assert plan.data_bits == 28 * 8
+    assert plan.layout.block_sizes == (28,)
+
+
+def test_encode_plan_count_width_range():
+    # segmented with the count indicator widths of versions 10 to 26
+    text = "A" * 350
+    plan = EncodePlan.create(text, "L")
+    assert plan.version == 10
+    assert plan.bit_length == 4 + 11 + 175 * 11
+
+
+def test_encode_plan_version():
+    plan = EncodePlan.create("HELLO WORLD", "H", version=5)
+    assert plan.version == 5
+    assert len(DataEncoder.encode_plan(plan)) == plan.data_bits
+
+    with pytest.raises(InvalidVersionNumber):
+        EncodePlan.create("HELLO WORLD" * 10, "H", version=1)
+    with pytest.raises(InvalidVersionNumber):
+        EncodePlan.create("", "H")
+
+
+def test_make_with_plan():
+    plan = EncodePlan.create("https://example.com/?id=1234567890", "Q")
+    qr = make(plan.data, plan.ecc, plan)
+    assert qr.plan is plan
+    assert qr.matrix == make(plan.data, plan.ecc).matrix
+    assert encode_data_bits(plan.data, plan.ecc, plan) == encode_data_bits(
+        plan.data, plan.ecc
+    )
+    assert QrCode(plan.data, plan.ecc).plan == plan
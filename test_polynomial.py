@@ -1,5 +1,27 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from const import GENERATOR_POLYNOMIALS
 from encoder import DataEncoder
-from polynomial import GeneratorPolynomial
+from galois import GaloisField
+from polynomial import GeneratorPolynomial, IncrementalEncoder
+
+
+def long_divide(message: List[int], degree: int) -> List[int]:
+    """
+    Textbook long division, one lead term at a time. A lead term of 0 has nothing to cancel.
+    """
+    generator = [GaloisField.get_exp(alpha) for alpha in GENERATOR_POLYNOMIALS[degree]]
+    remainder = list(message) + [0] * degree
+    for step in range(len(message)):
+        lead = remainder[step]
+        if lead == 0:
+            continue
+        for i, coefficient in enumerate(generator):
+            remainder[step + i] ^= GaloisField.multiply(lead, coefficient)
+    return remainder[len(message) :]
 
 
 def test_generator_polynomial():
@@ -24,3 +46,86 @@ def test_divide_generator_with_message():
 
     ans = GeneratorPolynomial(28) / DataEncoder.get_8bit_binary_numbers(data)
     assert len(ans) == 28
+
+
+def test_product_table():
+    generator = GeneratorPolynomial(10)
+    table = generator.get_product_table(10)
+    assert len(table) == 256 * 10
+
+    coefficients = [GaloisField.get_exp(alpha) for alpha in generator.polynomial[1:]]
+    for lead in (0, 1, 2, 76, 255):
+        row = table[lead * 10 : (lead + 1) * 10]
+        assert list(row) == [GaloisField.multiply(lead, c) for c in coefficients]
+
+
+def test_divide_every_degree():
+    data = (
+        "0010000001011011000010110111100011010001011100101101110001001101"
+        "0100001101000000111011000001000111101100000100011110110000010001"
+    )
+    messages = [
+        DataEncoder.get_8bit_binary_numbers(data),
+        list(range(1, 123)),
+        [255] * 40,
+        [0, 1] * 20,
+    ]
+    for degree in GENERATOR_POLYNOMIALS:
+        for message in messages:
+            assert GeneratorPolynomial(degree).divide(message) == long_divide(
+                message, degree
+            )
+
+
+def test_divide_known_vectors():
+    # 5-Q group 1 block 1 from the thonky.com QR code tutorial
+    block = [67, 85, 70, 134, 87, 38, 85, 194, 119, 50, 6, 18, 6, 103, 38]
+    assert GeneratorPolynomial(18).divide(block) == [
+        213, 199, 11, 45, 115, 247, 241, 223, 229,
+        248, 154, 117, 154, 111, 86, 161, 111, 39,
+    ]  # fmt: skip
+
+
+def test_divide_many():
+    rng = np.random.default_rng(0)
+    messages = rng.integers(0, 256, size=(20, 34), dtype=np.uint8)
+    messages[:5, :3] = 0
+    for degree in (7, 10, 30):
+        generator = GeneratorPolynomial(degree)
+        remainders = generator.divide_many(messages)
+        assert remainders.shape == (20, degree)
+        assert remainders.tolist() == [generator.divide(list(m)) for m in messages]
+
+
+def test_divide_zero_message():
+    assert GeneratorPolynomial(10).divide([0] * 16) == [0] * 10
+
+
+def test_divide_zero_lead_terms():
+    # zero codewords in the message and cancelled lead terms during the division must not xor the generator in
+    for message in ([0, 0, 5, 0, 17, 0, 0, 200], [32, 0, 0, 0, 0, 0, 0, 0, 1]):
+        for degree in (7, 10, 18):
+            assert GeneratorPolynomial(degree).divide(message) == long_divide(
+                message, degree
+            )
+
+
+def test_incremental_encoder():
+    rng = np.random.default_rng(1)
+    base = rng.integers(0, 256, size=123, dtype=np.uint8).tolist()
+    for degree in (7, 22, 30):
+        encoder = IncrementalEncoder(degree, base)
+        assert encoder.encode(base) == GeneratorPolynomial(degree).divide(base)
+
+        for changes in (1, 3, 10, 123):
+            message = list(base)
+            for position in rng.choice(len(base), size=changes, replace=False):
+                message[position] = int(rng.integers(0, 256))
+            # zero codewords, including a zero lead term
+            message[0] = message[changes // 2] = 0
+            assert encoder.encode(message) == GeneratorPolynomial(degree).divide(
+                message
+            )
+
+    with pytest.raises(ValueError):
+        IncrementalEncoder(7, base).encode(base[:-1])
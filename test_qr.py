@@ -1,4 +1,11 @@
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
 import pytest
+from PIL import Image
 
 from encoder import DataEncoder
 from polynomial import GeneratorPolynomial
@@ -6,10 +13,16 @@ from qr import (
     InvalidVersionNumber,
     QrCode,
     InvalidMaskPatternId,
+    MaskStrategies,
+    PatternTemplates,
     PenaltyEvaluator,
+    PlacementIndex,
     choose_qr_version,
     make,
+    make_many,
     encode_data,
+    encode_data_bits,
+    render_bytes,
 )
 
 
@@ -37,6 +50,10 @@ def test_encode_data():
     enc = encode_data("HELLO CC WORLDSSSSSS")
     assert len(enc) == 359
 
+    enc = encode_data_bits("HELLO CC WORLDSSSSSS")
+    assert len(enc) == 359
+    assert enc.to_bitstring() == encode_data("HELLO CC WORLDSSSSSS")
+
 
 def test_generate_base_matrix_with_finder_patterns_and_separators():
     qr = QrCode("HELLO CC WORLD")  # version 2
@@ -74,6 +91,21 @@ def test_generate_base_matrix_with_finder_patterns_and_separators():
     assert grid == qr.matrix
 
 
+def test_pattern_templates_match_drawn_patterns():
+    PatternTemplates.warm(versions=[1, 2, 7, 40])
+    for version in (1, 2, 7, 14, 40):
+        qr = QrCode("", version=version)
+        qr.draw_static_patterns()
+
+        template, function_mask = PatternTemplates.get(version)
+        assert template.tolist() == qr.matrix
+        assert np.array_equal(function_mask, template != QrCode.EMPTY_MODULE)
+
+        qr_from_template = QrCode("", version=version)
+        qr_from_template.add_static_patterns()
+        assert qr_from_template.matrix == qr.matrix
+
+
 def test_get_alignment_center_points():
     # version 2 starts at 15 characters
     alignments = QrCode("HELLO CC WORLD", "H").get_alignment_center_points()
@@ -158,6 +190,36 @@ def test_add_timing_patterns():
     assert grid == qr.matrix
 
 
+def test_placement_index():
+    rows, cols = QrCode("HELLO CC WORLD").get_placement_index()  # version 2
+    assert len(rows) == len(cols) == 359
+    assert list(zip(rows[:6], cols[:6])) == [
+        (24, 24),
+        (24, 23),
+        (23, 24),
+        (23, 23),
+        (22, 24),
+        (22, 23),
+    ]
+    # the first column pair turns downwards below the top right separator
+    assert (rows[31], cols[31]) == (9, 23)
+    assert (rows[32], cols[32]) == (9, 22)
+
+    qr = qrcode_mock_with_data()
+    assert all(row.count(1) == 0 for row in qr.matrix)
+
+
+def test_placement_index_save_and_load(tmp_path):
+    path = tmp_path / "placement.npz"
+    PlacementIndex.save(path, versions=[1, 7])
+    expected = PlacementIndex.get(7)
+
+    PlacementIndex._indexes.clear()
+    PlacementIndex.load(path)
+    assert sorted(PlacementIndex._indexes) == [1, 7]
+    assert all(np.array_equal(a, b) for a, b in zip(PlacementIndex.get(7), expected))
+
+
 def test_apply_mask():
     qr = qrcode_mock_with_data()
     qr.draw()
@@ -191,6 +253,29 @@ def test_penalty_evaluator_privates_i_know_its_bad():
     assert score == 498
 
 
+def test_apply_mask_matches_mask_strategies():
+    for qr in (qrcode_mock_with_data(), make("A" * 500, "H")):
+        for i in range(8):
+            strategy = MaskStrategies().get(i)
+            expected = [row[:] for row in qr.matrix]
+            for r, c in zip(*qr.get_placement_index()):
+                if strategy(r, c) and expected[r][c] != 1:
+                    expected[r][c] = 2 if expected[r][c] == 0 else 0
+
+            assert qr.apply_mask(i) == expected
+
+
+def test_penalty_evaluator_evaluate_many():
+    evaluator = PenaltyEvaluator()
+    qr = qrcode_mock_with_data()
+
+    candidates = [qr.add_format_string(qr.apply_mask(i), "H", i) for i in range(8)]
+    scores = evaluator.evaluate_many(np.array(candidates))
+    assert scores.shape == (8,)
+    assert scores.tolist() == [evaluator.evaluate(m) for m in candidates]
+    assert scores[0] == 498
+
+
 def test_apply_mask_should_error_with_invalid_number():
     qr = qrcode_mock_with_data()
     with pytest.raises(InvalidMaskPatternId):
@@ -255,3 +340,82 @@ def encoded_data_mock() -> str:
         enc + "".join(DataEncoder.get_8bit_binary_numbers_from_list(poly)) + "0000000"
     )
     return data
+
+
+def test_make_many():
+    data = ["HELLO WORLD", "https://aishowcase.io", ("12345", "L"), "A" * 200]
+    expected = [make(d, "H") if isinstance(d, str) else make(*d) for d in data]
+
+    made = list(make_many(data, ecc="H", chunksize=3))
+    assert [qr.matrix for qr in made] == [qr.matrix for qr in expected]
+
+    made = list(make_many(data, ecc="H", workers=2, chunksize=1, with_index=True))
+    assert [index for index, _ in made] == [0, 1, 2, 3]
+    assert [qr.matrix for _, qr in made] == [qr.matrix for qr in expected]
+
+
+def test_save(tmp_path):
+    qr = make(data="https://aishowcase.io", ecc="L")
+    path = tmp_path / "qr.png"
+    qr.save(path, scale=2, border=4, ecc="L")
+
+    matrix = np.array(qr._generate_best_fit("L"))
+    img = np.array(Image.open(path).convert("L"))
+    assert img.shape == ((len(matrix) + 8) * 2,) * 2
+    modules = img[8:-8:2, 8:-8:2]
+    assert np.array_equal(modules == 0, matrix == QrCode.BLACK_MODULE)
+
+
+def test_save_file_object_without_name():
+    qr = make(data="https://aishowcase.io", ecc="L")
+    for image_format in (".svg", ".png"):
+        fp = io.BytesIO()
+        qr.save(fp, ecc="L", image_format=image_format)
+        dark = qr._generate_best_fit_array("L") == QrCode.BLACK_MODULE
+        assert fp.getvalue() == render_bytes(dark, image_format)
+    with pytest.raises(ValueError, match="unknown file extension"):
+        qr.save(io.BytesIO(), ecc="L")
+
+
+def test_save_svg(tmp_path):
+    qr = make(data="https://aishowcase.io", ecc="L")
+    path = tmp_path / "qr.svg"
+    qr.save(path, ecc="L")
+
+    svg = path.read_text()
+    assert svg == qr.to_svg(ecc="L")
+    assert svg.startswith("<?xml")
+    assert svg.count("<path") == 1
+    assert qr.to_eps(ecc="L").startswith("%!PS-Adobe-3.0 EPSF-3.0")
+
+
+IMPORT_BUDGET_SECONDS = 0.5
+
+
+def test_import_budget():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import qr\n"
+        "print(time.perf_counter() - start)\n"
+        "print(sorted(m for m in ('matplotlib', 'PIL') if m in sys.modules))\n"
+    )
+    timings = []
+    for _ in range(3):
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+        assert out[1] == "[]"
+        timings.append(float(out[0]))
+
+    assert min(timings) < IMPORT_BUDGET_SECONDS
+
+
+def test_make_utf8_and_unencodable():
+    assert make("hello ✓", "M").plan.version == 1
+    with pytest.raises(ValueError):
+        make("a\ud800", "M")
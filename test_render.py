@@ -0,0 +1,40 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from render import render_image, save_image, scale_modules
+
+
+def test_scale_modules():
+    dark = np.array([[True, False], [False, True]])
+    pixels = scale_modules(dark, scale=2, border=1)
+    assert pixels.shape == (8, 8)
+    assert pixels.tolist() == [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 1, 1, 0, 0, 0, 0],
+        [0, 0, 1, 1, 0, 0, 0, 0],
+        [0, 0, 0, 0, 1, 1, 0, 0],
+        [0, 0, 0, 0, 1, 1, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+    ]
+
+
+def test_render_image_round_trip():
+    dark = np.zeros((21, 21), dtype=bool)
+    dark[0, :7] = True
+    img = render_image(dark, scale=3, border=4, data_color=(10, 20, 30))
+    assert img.mode == "P"
+    assert img.size == (87, 87)
+
+    fp = io.BytesIO()
+    save_image(img, fp, image_format="PNG", compress_level=1)
+    fp.seek(0)
+    saved = Image.open(fp).convert("RGB")
+    assert saved.getpixel((12, 12)) == (10, 20, 30)
+    assert saved.getpixel((12 + 20, 14)) == (10, 20, 30)
+    assert saved.getpixel((12 + 21, 12)) == (255, 255, 255)
+    assert saved.getpixel((12, 15)) == (255, 255, 255)
+    assert saved.getpixel((0, 0)) == (255, 255, 255)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from scheduler import MicroBatcher, get_version_group
+from serve import (
+    RenderRequest,
+    get_request_group,
+    plan_request,
+    render_request,
+    render_requests,
+)
+
+
+def test_micro_batcher_groups():
+    batches = []
+
+    def batch_func(items):
+        batches.append(items)
+        return [item.upper() for item in items]
+
+    async def main():
+        batcher = MicroBatcher(batch_func, len, window=0.05, max_batch=3)
+        results = await asyncio.gather(
+            *(batcher.submit(item) for item in ("a", "b", "cc", "d", "e", "ff"))
+        )
+        assert results == ["A", "B", "CC", "D", "E", "FF"]
+        return batcher.metrics()
+
+    metrics = asyncio.run(main())
+    # a, b, d fill a batch right away, e waits for the window together with cc and ff
+    assert sorted(map(sorted, batches)) == [["a", "b", "d"], ["cc", "ff"], ["e"]]
+    assert metrics.batches == 3
+    assert metrics.items == 6
+    assert metrics.largest_batch_size == 3
+    assert metrics.queue_depth == 0
+    assert metrics.largest_queue_depth == 3
+
+
+def test_micro_batcher_priority_and_errors():
+    def batch_func(items):
+        if "bad" in items:
+            raise ValueError("bad")
+        return items
+
+    async def main():
+        batcher = MicroBatcher(batch_func, lambda item: 0, window=10)
+        slow = asyncio.ensure_future(batcher.submit("bulk"))
+        # the priority item does not wait for the 10 second window
+        assert (
+            await asyncio.wait_for(batcher.submit("fast", priority=True), 5) == "fast"
+        )
+        assert not slow.done()
+        assert batcher.metrics().queue_depth == 1
+
+        with pytest.raises(ValueError):
+            await asyncio.gather(batcher.submit("bad", priority=True))
+        slow.cancel()
+
+    asyncio.run(main())
+
+
+def test_micro_batcher_retries_failed_batch():
+    batches = []
+
+    def batch_func(items):
+        batches.append(items)
+        if "bad" in items:
+            raise ValueError("bad")
+        return [item.upper() for item in items]
+
+    async def main():
+        batcher = MicroBatcher(batch_func, lambda item: 0, window=0.05, max_inflight=1)
+        results = await asyncio.gather(
+            *(batcher.submit(item) for item in ("a", "bad", "b")),
+            return_exceptions=True,
+        )
+        # the bulk slot was held for the retries and released after them
+        assert batcher._inflight == 0
+        return results, batcher.metrics()
+
+    (a, bad, b), metrics = asyncio.run(main())
+    assert (a, b) == ("A", "B")
+    assert isinstance(bad, ValueError)
+    assert sorted(map(tuple, batches)) == [("a",), ("a", "bad", "b"), ("b",), ("bad",)]
+    assert metrics.batches == 1
+    assert metrics.queue_depth == 0
+
+
+def test_get_version_group():
+    assert get_version_group("HELLO WORLD", "Q") == (1, "Q")
+    assert get_version_group("A" * 100, "Q") == (6, "Q")
+
+
+def test_render_requests_matches_render_request():
+    requests = [
+        RenderRequest(f"https://example.com/{i}", "M", suffix, 3, 2)
+        for i, suffix in enumerate((".png", ".svg", ".png"))
+    ]
+    planned = [plan_request(request) for request in requests]
+    assert {get_request_group(request) for request in planned} == {(2, "M")}
+    assert render_requests(planned) == [render_request(r) for r in requests]
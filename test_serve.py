@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+from urllib.parse import urlencode
+
+from scheduler import MicroBatcher
+from serve import (
+    QrServer,
+    RenderRequest,
+    get_request_group,
+    render_request,
+    render_requests,
+)
+
+
+async def fetch(port: int, target: str, headers: str = ""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET {target} HTTP/1.1\r\n{headers}Connection: close\r\n\r\n".encode()
+    )
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split(" ")[1]), headers, body
+
+
+def run_with_server(server: QrServer, main):
+    async def runner():
+        listener = await server.start("127.0.0.1", 0)
+        async with listener:
+            return await main(listener.sockets[0].getsockname()[1])
+
+    return asyncio.run(runner())
+
+
+def test_serve_png_and_svg():
+    async def main(port):
+        target = "/qr?" + urlencode({"data": "HELLO WORLD", "ecc": "Q"})
+        status, headers, body = await fetch(port, target)
+        assert status == 200
+        assert headers["Content-Type"] == "image/png"
+        assert headers["Cache-Control"] == "public, max-age=86400"
+        assert body == render_request(RenderRequest("HELLO WORLD", "Q", ".png", 10, 4))
+
+        status, revalidated, body = await fetch(
+            port, target, f"If-None-Match: {headers['ETag']}\r\n"
+        )
+        assert status == 304 and body == b""
+        assert revalidated["ETag"] == headers["ETag"]
+
+        status, headers, body = await fetch(port, target + "&format=svg&scale=2")
+        assert status == 200
+        assert headers["Content-Type"] == "image/svg+xml"
+        assert b"<svg" in body
+
+    run_with_server(QrServer(), main)
+
+
+def test_serve_errors():
+    async def main(port):
+        assert (await fetch(port, "/qr"))[0] == 400
+        assert (await fetch(port, "/qr?data=A&ecc=X"))[0] == 400
+        assert (await fetch(port, "/qr?data=A&scale=big"))[0] == 400
+        assert (await fetch(port, "/qr?data=" + "A" * 5000))[0] == 400
+        assert (await fetch(port, "/other"))[0] == 404
+
+        for length in ("x", "-1", "\u00b2"):
+            status, headers, body = await fetch(
+                port, "/qr?data=A", f"Content-Length: {length}\r\n"
+            )
+            assert status == 400 and body == b"bad content-length"
+            assert headers["Connection"] == "close"
+
+        status, headers, body = await fetch(
+            port, "/qr?data=A", "Content-Length: 1000000\r\n"
+        )
+        assert status == 413 and headers["Connection"] == "close"
+
+        # a chunked body is not mistaken for the next request
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            b"GET /qr?data=A HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"a\r\nGET /other \r\n0\r\n\r\n"
+        )
+        response = await reader.read()
+        writer.close()
+        assert response.startswith(b"HTTP/1.1 501 ")
+        assert response.count(b"HTTP/1.1") == 1
+
+    run_with_server(QrServer(), main)
+
+
+def failing_render(request: RenderRequest) -> bytes:
+    if request.data == "bad":
+        raise ValueError("cannot encode")
+    raise RuntimeError("worker crashed")
+
+
+def test_serve_render_errors(capsys):
+    async def main(port):
+        assert await fetch(port, "/qr?data=bad") == (
+            400,
+            {
+                "Content-Type": "text/plain; charset=utf-8",
+                "Content-Length": "13",
+                "Connection": "close",
+            },
+            b"cannot encode",
+        )
+        status, _, body = await fetch(port, "/qr?data=other")
+        assert status == 500 and body == b"rendering failed"
+
+    run_with_server(QrServer(render=failing_render), main)
+    assert "RuntimeError: worker crashed" in capsys.readouterr().err
+
+
+calls = []
+release = threading.Event()
+
+
+def slow_render(request: RenderRequest) -> bytes:
+    calls.append(request)
+    release.wait(5)
+    return request.data.encode()
+
+
+def test_serve_single_flight():
+    server = QrServer(render=slow_render)
+
+    async def main(port):
+        target = "/qr?data=SHARED"
+        fetches = [asyncio.ensure_future(fetch(port, target)) for _ in range(8)]
+        while len(server.single_flight) == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*fetches)
+
+    responses = run_with_server(server, main)
+    assert len(calls) == 1
+    assert all(body == b"SHARED" for _, _, body in responses)
+
+
+def test_serve_micro_batching():
+    scheduler = MicroBatcher(render_requests, get_request_group, window=0.01)
+    server = QrServer(scheduler=scheduler)
+
+    async def main(port):
+        targets = [f"/qr?data=ITEM{i}&ecc=L" for i in range(5)] + [
+            "/qr?data=FAST&priority=1"
+        ]
+        responses = await asyncio.gather(*(fetch(port, target) for target in targets))
+        # rejected while planning, before it reaches a batch
+        assert (await fetch(port, "/qr?data=" + "A" * 5000))[0] == 400
+        _, _, metrics = await fetch(port, "/metrics")
+        return responses, json.loads(metrics)
+
+    responses, metrics = run_with_server(server, main)
+    assert responses[0][2] == render_request(RenderRequest("ITEM0", "L", ".png", 10, 4))
+    assert metrics["items"] == 6
+    assert metrics["priority_items"] == 1
+    assert metrics["batches"] == 2
+    assert metrics["window"] == 0.01
@@ -0,0 +1,91 @@
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from qr import make
+from sinks import (
+    MANIFEST_NAME,
+    SinkError,
+    SinkPosition,
+    TarSink,
+    get_member_name,
+    open_sink,
+)
+
+
+def test_get_member_name():
+    assert get_member_name("a\\b.png") == "a/b.png"
+    for name in ("", "/etc/passwd", "../up.png"):
+        with pytest.raises(SinkError):
+            get_member_name(name)
+
+
+def test_open_sink_kinds(tmp_path):
+    with open_sink(str(tmp_path / "out")) as sink:
+        sink.write("a/b.png", b"png")
+    assert (tmp_path / "out" / "a" / "b.png").read_bytes() == b"png"
+
+    with open_sink(str(tmp_path / "out.zip")) as sink:
+        sink.write("b.png", b"png")
+    with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+        assert archive.read("b.png") == b"png"
+
+    with pytest.raises(SinkError):
+        open_sink(str(tmp_path / "out.zip"), position=SinkPosition(100, 0))
+    with pytest.raises(SinkError):
+        open_sink("-", "dir")
+
+
+def test_tar_sink_resume(tmp_path):
+    path = str(tmp_path / "out.tar")
+    with TarSink.open(path) as sink:
+        sink.write("a.png", b"first")
+        offset = sink.commit()
+        sink.write("b.png", b"lost")
+
+    with TarSink.open(path, offset) as sink:
+        sink.write("c.png", b"second")
+
+    with tarfile.open(path) as tar:
+        assert tar.getnames() == ["a.png", "c.png"]
+        assert tar.extractfile("c.png").read() == b"second"
+
+
+def test_tar_sink_dedupe_manifest(tmp_path):
+    path = str(tmp_path / "out.tar")
+    sink = open_sink(path, dedupe=True)
+    sink.write("a.png", b"same", index=0)
+    sink.write("b.png", b"other", index=1)
+    position = sink.commit()
+    sink.write("lost.png", b"lost")
+    # the job fails, the archive and the manifest are left unfinished
+    sink.abort()
+
+    # resuming reloads the digests written before the checkpoint from the manifest
+    with open_sink(path, position=position, dedupe=True) as sink:
+        sink.write("c.png", b"same", index=2)
+
+    with tarfile.open(path) as tar:
+        assert tar.getnames() == ["a.png", "b.png", "c.png", MANIFEST_NAME]
+        assert tar.getmember("c.png").islnk()
+        assert tar.extractfile("c.png").read() == b"same"
+        manifest = tar.extractfile(MANIFEST_NAME).read().decode().splitlines()
+    entries = [json.loads(line) for line in manifest]
+    assert [entry["index"] for entry in entries] == [0, 1, 2]
+    assert entries[2]["same_as"] == "a.png"
+    assert not (tmp_path / f"out.tar.{MANIFEST_NAME}").exists()
+
+
+def test_zip_sink_save_dedupe(tmp_path):
+    qr = make("HELLO WORLD", "M")
+    with open_sink(str(tmp_path / "out.zip"), dedupe=True) as sink:
+        sink.save("a.svg", qr, ecc="M", data="HELLO WORLD")
+        sink.save("b.svg", qr, ecc="M", data="HELLO WORLD")
+
+    with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+        assert archive.namelist() == ["a.svg", MANIFEST_NAME]
+        assert archive.read("a.svg").startswith(b"<?xml")
+        entries = archive.read(MANIFEST_NAME).decode().splitlines()
+    assert json.loads(entries[1])["same_as"] == "a.svg"
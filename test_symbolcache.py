@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from qr import make, save_matrix
+from symbolcache import CacheInfo, SymbolCache
+
+
+def test_symbol_cache_hit_miss():
+    symbols = SymbolCache(maxsize=2)
+    matrix = symbols.get_matrix("HELLO WORLD", "Q")
+    assert matrix.tolist() == make("HELLO WORLD", "Q")._generate_best_fit("Q")
+    assert symbols.info() == CacheInfo(0, 1, 0, 2, 1)
+
+    assert (symbols.get_matrix("HELLO WORLD", "Q") == matrix).all()
+    # the error correction level is part of the key
+    symbols.get_dark("HELLO WORLD", "L")
+    assert symbols.info() == CacheInfo(1, 2, 0, 2, 2)
+
+
+def test_symbol_cache_eviction():
+    symbols = SymbolCache(maxsize=2)
+    symbols.get_dark("A")
+    symbols.get_dark("B")
+    symbols.get_dark("A")
+    symbols.get_dark("C")
+    # B was the least recently used
+    assert symbols.get(SymbolCache.get_key("B")) is None
+    assert symbols.get(SymbolCache.get_key("A")) is not None
+    assert symbols.info().evictions == 1
+
+    symbols.clear()
+    assert symbols.info() == CacheInfo(0, 0, 0, 2, 0)
+
+    with pytest.raises(ValueError):
+        SymbolCache(maxsize=0)
+
+
+def test_symbol_cache_threads():
+    symbols = SymbolCache(maxsize=8)
+    payloads = [f"https://example.com/{i % 4}" for i in range(64)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        darks = list(pool.map(symbols.get_dark, payloads))
+
+    info = symbols.info()
+    assert info.hits + info.misses == 64
+    assert info.currsize == 4
+    assert all((dark == darks[i % 4]).all() for i, dark in enumerate(darks))
+
+
+def test_save_matrix(tmp_path):
+    symbols = SymbolCache()
+    save_matrix(symbols.get_dark("HELLO WORLD"), tmp_path / "cached.svg")
+    make("HELLO WORLD", "H").save(tmp_path / "made.svg")
+    assert (tmp_path / "cached.svg").read_text() == (tmp_path / "made.svg").read_text()
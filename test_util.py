@@ -1,5 +1,7 @@
-from const import Mode
-from util import choose_qr_version
+import pytest
+
+from const import InvalidErrorCorrectionCode, InvalidErrorCorrectionVersion, Mode
+from util import capacity, choose_qr_version, choose_qr_version_by_bits
 
 
 def test_capacity_table_choose_version():
@@ -45,3 +47,22 @@ def test_capacity_table_choose_version():
     # Exact Capacity Match
     assert choose_qr_version(34, "M", Mode.NUMERIC) == 1
     assert choose_qr_version(14, "M", Mode.ALPHANUMERIC) == 1
+
+
+def test_capacity():
+    assert capacity(1, "M", Mode.NUMERIC) == 34
+    assert capacity(40, "L", Mode.BYTE) == 2953
+    assert capacity(10, "H", Mode.KANJI) == 74
+    with pytest.raises(InvalidErrorCorrectionVersion):
+        capacity(41, "M", Mode.BYTE)
+    with pytest.raises(InvalidErrorCorrectionCode):
+        capacity(1, "X", Mode.BYTE)
+
+
+def test_choose_qr_version_by_bits():
+    # v9-M holds 1456 data bits, v10-M 1728
+    assert choose_qr_version_by_bits(lambda version: 1456, "M") == 9
+    assert choose_qr_version_by_bits(lambda version: 1457, "M") == 10
+    # the wider count indicators from version 10 on can push the data past version 10
+    assert choose_qr_version_by_bits(lambda version: 1728 + (version >= 10), "M") == 11
+    assert choose_qr_version_by_bits(lambda version: 23649, "L") is None
@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+
+from vector import iter_runs, write_eps, write_svg
+
+DARK = np.array(
+    [
+        [1, 1, 0, 1],
+        [0, 0, 0, 0],
+        [1, 1, 1, 1],
+        [0, 1, 1, 0],
+    ],
+    dtype=bool,
+)
+
+
+def test_iter_runs():
+    assert list(iter_runs(DARK)) == [(0, 0, 2), (0, 3, 1), (2, 0, 4), (3, 1, 2)]
+
+
+def test_write_svg():
+    fp = io.StringIO()
+    write_svg(DARK, fp, scale=10, border=1)
+    svg = fp.getvalue()
+    assert 'viewBox="0 0 6 6" width="60" height="60"' in svg
+    assert svg.count("<path") == 1
+    assert 'd="M1 1h2v1h-2zM4 1h1v1h-1zM1 3h4v1h-4zM2 4h2v1h-2z"' in svg
+
+
+def test_write_eps():
+    fp = io.StringIO()
+    write_eps(DARK, fp, scale=10, border=1)
+    eps = fp.getvalue()
+    assert "%%BoundingBox: 0 0 60 60" in eps
+    # rows are flipped, the top row sits at y = 4
+    assert "1 4 2 r\n4 4 1 r\n1 2 4 r\n2 1 2 r\n" in eps
+    assert eps.endswith("%%EOF\n")
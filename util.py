@@ -1,4 +1,64 @@
-from const import CAPACITY_TABLE, Mode
+import os
+from bisect import bisect_left
+from functools import cache
+from typing import Callable, Optional, Tuple
+
+from const import (
+    CAPACITY_TABLE,
+    ECC_BLOCKS,
+    InvalidErrorCorrectionCode,
+    InvalidErrorCorrectionVersion,
+    Mode,
+)
+
+# Version ranges [start, stop) sharing the same character count indicator widths
+COUNT_WIDTH_RANGES: Tuple[Tuple[int, int], ...] = ((1, 10), (10, 27), (27, 41))
+
+
+@cache
+def get_capacities(error_correction_level: str, mode: Mode) -> Tuple[int, ...]:
+    """
+    Character capacities of versions 1 to 40, which never decrease with the version, so they can be searched with
+    `bisect`.
+
+    :param error_correction_level: Error correction level ('L', 'M', 'Q', 'H').
+    :param mode: Type of characters.
+    :return: Tuple of capacities where index 0 is version 1.
+    """
+    if error_correction_level not in CAPACITY_TABLE[1]:
+        raise InvalidErrorCorrectionCode(error_correction_level)
+    return tuple(
+        ec_levels[error_correction_level][mode.value]
+        for _, ec_levels in sorted(CAPACITY_TABLE.items())
+    )
+
+
+@cache
+def get_data_bit_capacities(error_correction_level: str) -> Tuple[int, ...]:
+    """
+    :param error_correction_level: Error correction level ('L', 'M', 'Q', 'H').
+    :return: Tuple of data bits per version where index 0 is version 1.
+    """
+    if error_correction_level not in ECC_BLOCKS[1]:
+        raise InvalidErrorCorrectionCode(error_correction_level)
+    return tuple(
+        ec_levels[error_correction_level][0] * 8
+        for _, ec_levels in sorted(ECC_BLOCKS.items())
+    )
+
+
+def capacity(version: int, error_correction_level: str, mode: Mode) -> int:
+    """
+    Number of characters of a single mode that fit into a version and error correction level.
+
+    :param version: QR code version.
+    :param error_correction_level: Error correction level ('L', 'M', 'Q', 'H').
+    :param mode: Type of characters.
+    :return: Character capacity.
+    """
+    if version not in CAPACITY_TABLE:
+        raise InvalidErrorCorrectionVersion(version)
+    return get_capacities(error_correction_level, mode)[version - 1]
 
 
 def choose_qr_version(char_count: int, error_correction_level: str, mode: Mode):
@@ -14,8 +74,39 @@ def choose_qr_version(char_count: int, error_correction_level: str, mode: Mode):
     if char_count <= 0:
         return None
 
-    for version, ec_levels in CAPACITY_TABLE.items():
-        # Check if the version and error correction level combination can accommodate the character count
-        if ec_levels[error_correction_level][mode.value] >= char_count:
-            return version
+    capacities = get_capacities(error_correction_level, mode)
+    index = bisect_left(capacities, char_count)
+    return index + 1 if index < len(capacities) else None
+
+
+def choose_qr_version_by_bits(
+    get_bit_length: Callable[[int], int], error_correction_level: str
+) -> Optional[int]:
+    """
+    Choose the smallest version whose data codewords hold an exact bit length. The bit length depends on the
+    character count indicator widths, which only change at versions 10 and 27, so `get_bit_length` is called with the
+    first version of each range until one of its versions fits.
+
+    :param get_bit_length: Bit length of the data for a version.
+    :param error_correction_level: Error correction level ('L', 'M', 'Q', 'H').
+    :return: The smallest version number that can accommodate the bits, or None if not possible.
+    """
+    capacities = get_data_bit_capacities(error_correction_level)
+    for start, stop in COUNT_WIDTH_RANGES:
+        index = bisect_left(capacities, get_bit_length(start), start - 1, stop - 1)
+        if index < stop - 1:
+            return index + 1
     return None
+
+
+@cache
+def get_file_mode() -> int:
+    """
+    `tempfile.mkstemp` creates files readable by the owner only. Files renamed into place from one are given this
+    mode, the one `open` would have used under the process umask.
+
+    :return: Permission bits of new files
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
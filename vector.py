@@ -0,0 +1,119 @@
+from typing import Iterator, TextIO, Tuple
+
+import numpy as np
+
+Color = Tuple[int, int, int]
+
+# number of runs written to the file object at once
+RUNS_PER_WRITE = 256
+
+
+def iter_runs(dark: np.ndarray) -> Iterator[Tuple[int, int, int]]:
+    """
+    Merge every horizontal run of dark modules into one rectangle.
+
+    :param dark: (N, N) boolean array which is True for dark modules
+    :return: Generator of (row, column, length) runs, row by row from the top
+    """
+    padded = np.pad(dark, ((0, 0), (1, 1))).view(np.int8)
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    yield from zip(rows.tolist(), starts.tolist(), (ends - starts).tolist())
+
+
+def _hex_color(color: Color) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*color)
+
+
+def _rgb_color(color: Color) -> str:
+    return " ".join(f"{c / 255:.4f}" for c in color)
+
+
+def _write_chunked(fp: TextIO, commands: Iterator[str]):
+    chunk = []
+    for command in commands:
+        chunk.append(command)
+        if len(chunk) >= RUNS_PER_WRITE:
+            fp.write("".join(chunk))
+            chunk.clear()
+    fp.write("".join(chunk))
+
+
+def write_svg(
+    dark: np.ndarray,
+    fp: TextIO,
+    scale: int = 10,
+    border: int = 4,
+    bg_color: Color = (255, 255, 255),
+    data_color: Color = (0, 0, 0),
+):
+    """
+    Stream an SVG with a single `<path>` holding one rectangle per run of dark modules. The path is drawn in
+    module units, `scale` only sets the default width and height.
+
+    :param dark: (N, N) boolean array which is True for dark modules
+    :param fp: Text file object to write to
+    :param scale: Default size of a module in pixels
+    :param border: Width of the quiet zone in modules
+    :param bg_color: RGB colour of the light modules and the quiet zone
+    :param data_color: RGB colour of the dark modules
+    """
+    size = len(dark) + 2 * border
+    fp.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" viewBox="0 0 {size} {size}" '
+        f'width="{size * scale}" height="{size * scale}" shape-rendering="crispEdges">\n'
+        f'<rect width="{size}" height="{size}" fill="{_hex_color(bg_color)}"/>\n'
+        f'<path fill="{_hex_color(data_color)}" d="'
+    )
+    _write_chunked(
+        fp,
+        (
+            f"M{column + border} {row + border}h{length}v1h-{length}z"
+            for row, column, length in iter_runs(dark)
+        ),
+    )
+    fp.write('"/>\n</svg>\n')
+
+
+def write_eps(
+    dark: np.ndarray,
+    fp: TextIO,
+    scale: int = 10,
+    border: int = 4,
+    bg_color: Color = (255, 255, 255),
+    data_color: Color = (0, 0, 0),
+):
+    """
+    Stream an Encapsulated PostScript file with one `rectfill` per run of dark modules.
+
+    :param dark: (N, N) boolean array which is True for dark modules
+    :param fp: Text file object to write to
+    :param scale: Size of a module in points
+    :param border: Width of the quiet zone in modules
+    :param bg_color: RGB colour of the light modules and the quiet zone
+    :param data_color: RGB colour of the dark modules
+    """
+    size = len(dark) + 2 * border
+    top = len(dark) + border - 1
+    fp.write(
+        "%!PS-Adobe-3.0 EPSF-3.0\n"
+        f"%%BoundingBox: 0 0 {size * scale} {size * scale}\n"
+        "%%Creator: qrcodey\n"
+        "%%EndComments\n"
+        "/r { 1 rectfill } bind def\n"
+        f"{scale} {scale} scale\n"
+        f"{_rgb_color(bg_color)} setrgbcolor\n"
+        f"0 0 {size} {size} rectfill\n"
+        f"{_rgb_color(data_color)} setrgbcolor\n"
+    )
+    # PostScript's y axis points up, so rows are flipped
+    _write_chunked(
+        fp,
+        (
+            f"{column + border} {top - row} {length} r\n"
+            for row, column, length in iter_runs(dark)
+        ),
+    )
+    fp.write("showpage\n%%EOF\n")